@@ -0,0 +1,33 @@
+"""Add scan dedup window to system config
+
+Revision ID: a4d8e2f6b1c9
+Revises: f3a9c1d7e5b2
+Create Date: 2026-10-17 15:00:00.000000
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a4d8e2f6b1c9'
+down_revision: Union[str, Sequence[str], None] = 'f3a9c1d7e5b2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+
+    op.add_column(
+        'system_config',
+        sa.Column('scan_dedup_window_ms', sa.Integer(), server_default='1500', nullable=False)
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+
+    op.drop_column('system_config', 'scan_dedup_window_ms')
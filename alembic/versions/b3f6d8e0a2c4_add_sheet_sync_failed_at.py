@@ -0,0 +1,52 @@
+"""Add failed_at to sheet sync outbox
+
+Revision ID: b3f6d8e0a2c4
+Revises: a4d8e2f6b1c9
+Create Date: 2026-10-18 09:00:00.000000
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b3f6d8e0a2c4'
+down_revision: Union[str, Sequence[str], None] = 'a4d8e2f6b1c9'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+
+    op.add_column(
+        'sheet_sync_outbox',
+        sa.Column('failed_at', sa.DateTime(timezone=True), nullable=True)
+    )
+
+    # остаточно невдалі записи не потрапляють в індекс захоплення
+    op.drop_index('ix_sheet_sync_outbox_pending', table_name='sheet_sync_outbox')
+    op.create_index(
+        'ix_sheet_sync_outbox_pending',
+        'sheet_sync_outbox',
+        ['next_attempt_at'],
+        unique=False,
+        postgresql_where=sa.text('synced_at IS NULL AND failed_at IS NULL')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+
+    op.drop_index('ix_sheet_sync_outbox_pending', table_name='sheet_sync_outbox')
+    op.create_index(
+        'ix_sheet_sync_outbox_pending',
+        'sheet_sync_outbox',
+        ['next_attempt_at'],
+        unique=False,
+        postgresql_where=sa.text('synced_at IS NULL')
+    )
+
+    op.drop_column('sheet_sync_outbox', 'failed_at')
@@ -0,0 +1,75 @@
+"""Unique device type per employee
+
+Revision ID: b7e1f2a9c3d4
+Revises: 3789152b9908
+Create Date: 2026-10-17 09:00:00.000000
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b7e1f2a9c3d4'
+down_revision: Union[str, Sequence[str], None] = '3789152b9908'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# Наявні дублікати (працівник має кілька пристроїв одного типу): лишається
+# пристрій з найновішим закріпленням, решта відкріплюється з транзакцією
+# unregistered - інакше унікальний індекс не створиться
+RELEASE_DUPLICATES = """
+WITH last_registered AS (
+    SELECT device_id, max(timestamp) AS registered_at
+    FROM transactions
+    WHERE type = 'registered'
+    GROUP BY device_id
+),
+ranked AS (
+    SELECT
+        devices.id,
+        row_number() OVER (
+            PARTITION BY devices.employee_id, devices.type
+            ORDER BY last_registered.registered_at DESC NULLS LAST, devices.id DESC
+        ) AS position
+    FROM devices
+    LEFT JOIN last_registered ON last_registered.device_id = devices.id
+    WHERE devices.employee_id IS NOT NULL
+),
+released AS (
+    UPDATE devices
+    SET employee_id = NULL
+    FROM ranked
+    WHERE devices.id = ranked.id AND ranked.position > 1
+    RETURNING devices.id
+)
+INSERT INTO transactions (type, device_id, employee_id)
+SELECT 'unregistered', released.id, NULL
+FROM released
+"""
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+
+    op.execute(RELEASE_DUPLICATES)
+
+    op.create_index(
+        'uq_devices_employee_type',
+        'devices',
+        ['employee_id', 'type'],
+        unique=True,
+        postgresql_where=sa.text('employee_id IS NOT NULL')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+
+    op.drop_index(
+        'uq_devices_employee_type',
+        table_name='devices'
+    )
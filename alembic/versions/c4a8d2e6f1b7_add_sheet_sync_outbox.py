@@ -0,0 +1,60 @@
+"""Add sheet sync outbox
+
+Revision ID: c4a8d2e6f1b7
+Revises: b7e1f2a9c3d4
+Create Date: 2026-10-17 10:00:00.000000
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c4a8d2e6f1b7'
+down_revision: Union[str, Sequence[str], None] = 'b7e1f2a9c3d4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+
+    op.create_table(
+        'sheet_sync_outbox',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('device_id', sa.Integer(), nullable=False),
+        sa.Column('notes', sa.Text(), nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.Column('next_attempt_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.Column('attempts', sa.Integer(), server_default='0', nullable=False),
+        sa.Column('last_error', sa.Text(), nullable=True),
+        sa.Column('synced_at', sa.DateTime(timezone=True), nullable=True),
+
+        sa.ForeignKeyConstraint(
+            ['device_id'],
+            ['devices.id'],
+            name='fk_sheet_sync_outbox_device_id',
+            ondelete='CASCADE'
+        ),
+    )
+
+    op.create_index(
+        'ix_sheet_sync_outbox_pending',
+        'sheet_sync_outbox',
+        ['next_attempt_at'],
+        unique=False,
+        postgresql_where=sa.text('synced_at IS NULL')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+
+    op.drop_index(
+        'ix_sheet_sync_outbox_pending',
+        table_name='sheet_sync_outbox'
+    )
+
+    op.drop_table('sheet_sync_outbox')
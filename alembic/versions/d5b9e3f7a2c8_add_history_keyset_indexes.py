@@ -0,0 +1,45 @@
+"""Add history keyset indexes
+
+Revision ID: d5b9e3f7a2c8
+Revises: c4a8d2e6f1b7
+Create Date: 2026-10-17 12:00:00.000000
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd5b9e3f7a2c8'
+down_revision: Union[str, Sequence[str], None] = 'c4a8d2e6f1b7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+
+    op.create_index(
+        'ix_transactions_timestamp_id',
+        'transactions',
+        ['timestamp', 'id']
+    )
+    op.create_index(
+        'ix_device_change_transactions_timestamp_id',
+        'device_change_transactions',
+        ['timestamp', 'id']
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+
+    op.drop_index(
+        'ix_device_change_transactions_timestamp_id',
+        table_name='device_change_transactions'
+    )
+    op.drop_index(
+        'ix_transactions_timestamp_id',
+        table_name='transactions'
+    )
@@ -0,0 +1,94 @@
+"""Add search indexes
+
+Revision ID: e1c7a4b8d9f2
+Revises: d5b9e3f7a2c8
+Create Date: 2026-10-17 13:00:00.000000
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e1c7a4b8d9f2'
+down_revision: Union[str, Sequence[str], None] = 'd5b9e3f7a2c8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+TRIGRAM_INDEXES = [
+    ('ix_employees_first_name_trgm', 'employees', 'first_name'),
+    ('ix_employees_last_name_trgm', 'employees', 'last_name'),
+    ('ix_employees_wms_login_trgm', 'employees', 'wms_login'),
+    ('ix_devices_name_trgm', 'devices', 'name'),
+    ('ix_devices_serial_number_trgm', 'devices', 'serial_number'),
+    ('ix_devices_rfid_trgm', 'devices', 'rfid'),
+]
+
+PREFIX_INDEXES = [
+    ('ix_devices_serial_number_prefix', 'devices', 'serial_number'),
+    ('ix_devices_rfid_prefix', 'devices', 'rfid'),
+]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+
+    # CONCURRENTLY - без блокування записів у transactions (сканування ESP)
+    # на час побудови; поза транзакцією міграції
+    with op.get_context().autocommit_block():
+        for name, table, column in TRIGRAM_INDEXES:
+            op.create_index(
+                name,
+                table,
+                [column],
+                postgresql_using='gin',
+                postgresql_ops={column: 'gin_trgm_ops'},
+                postgresql_concurrently=True
+            )
+
+        for name, table, column in PREFIX_INDEXES:
+            op.create_index(
+                name,
+                table,
+                [sa.text(f'lower({column}) text_pattern_ops')],
+                postgresql_concurrently=True
+            )
+
+        op.create_index(
+            'ix_transactions_employee_id_timestamp',
+            'transactions',
+            ['employee_id', 'timestamp'],
+            postgresql_concurrently=True
+        )
+        op.create_index(
+            'ix_transactions_device_id_timestamp',
+            'transactions',
+            ['device_id', 'timestamp'],
+            postgresql_concurrently=True
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            'ix_transactions_device_id_timestamp',
+            table_name='transactions',
+            postgresql_concurrently=True
+        )
+        op.drop_index(
+            'ix_transactions_employee_id_timestamp',
+            table_name='transactions',
+            postgresql_concurrently=True
+        )
+
+        for name, table, _ in PREFIX_INDEXES + TRIGRAM_INDEXES:
+            op.drop_index(name, table_name=table, postgresql_concurrently=True)
+
+    # розширення pg_trgm залишаємо - ним можуть користуватися інші об'єкти
@@ -0,0 +1,49 @@
+"""Add ESP scan receipts
+
+Revision ID: f3a9c1d7e5b2
+Revises: e1c7a4b8d9f2
+Create Date: 2026-10-17 14:00:00.000000
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f3a9c1d7e5b2'
+down_revision: Union[str, Sequence[str], None] = 'e1c7a4b8d9f2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+
+    op.create_table(
+        'esp_scan_receipts',
+        sa.Column('device_id', sa.String(length=64), nullable=False),
+        sa.Column('scan_id', sa.String(length=64), nullable=False),
+        sa.Column('received_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+
+        sa.PrimaryKeyConstraint('device_id', 'scan_id', name='pk_esp_scan_receipts'),
+    )
+
+    op.create_index(
+        'ix_esp_scan_receipts_device_id_received_at',
+        'esp_scan_receipts',
+        ['device_id', 'received_at'],
+        unique=False
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+
+    op.drop_index(
+        'ix_esp_scan_receipts_device_id_received_at',
+        table_name='esp_scan_receipts'
+    )
+
+    op.drop_table('esp_scan_receipts')
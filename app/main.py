@@ -5,14 +5,23 @@ from fastapi import FastAPI
 from fastapi.staticfiles import StaticFiles
 from contextlib import asynccontextmanager
 
-from config import STATIC_DIR, LOG_CONFIG
+from config import STATIC_DIR, LOG_CONFIG, STATE_BACKEND_URL, ESP_INGEST_QUEUE_ENABLED
 from managers.connection_manager import ConnectionManager
 from managers.device_manager import DeviceManager
 from routers import api, email_agent, pages, websocket, auth
 from fastapi.middleware.cors import CORSMiddleware
 from managers.registration_manager import RegistrationManager
+from managers.esp_access_manager import EspAccessManager
+from managers.expiry_scheduler import ExpiryScheduler
+from managers.ingest_queue import IngestQueue
+from managers.scan_dedup import ScanDeduplicator
+from managers.state_backend import SharedState, create_state_backend
 from managers.auth_manager import auth_manager
 from managers.config_manager import config_manager
+from managers.rfid_index import rfid_index
+from managers.dashboard_stats import dashboard_stats
+from services.sheet_sync import sheet_sync_worker
+from db.session import async_session
 from sqlalchemy.ext.asyncio import AsyncSession
 from pathlib import Path
 import sys
@@ -20,6 +29,7 @@ from routers.admin.api import router as admin_api_router
 from routers.admin.api_users import router as admin_users_api_router
 from routers.admin.device_statuses import router as admin_device_statuses_router
 from routers.admin.api_system_config import router as admin_system_config_router
+from routers.admin.api_metrics import router as admin_metrics_router
 from routers.admin.pages import router as admin_pages_router
 from routers.admin.admin_transactions import router as admin_transactions_router
 from routers.admin.admin_device_transactions import router as admin_device_transactions_router
@@ -36,15 +46,41 @@ logger = logging.getLogger(__name__)
 device_manager = DeviceManager(timeout_minutes=5)
 manager = ConnectionManager(device_manager)
 registration_manager = RegistrationManager(timeout_seconds=7)
-esp_allowed_users: dict[str, set[int]] = {}
+esp_access = EspAccessManager()
+esp_ingest = IngestQueue(api.process_queued_esp32_data)
+scan_dedup = ScanDeduplicator()
+shared_state: SharedState | None = None
+
+# Дедлайни сесій і пристроїв (замість періодичних cleanup-циклів)
+expiry_scheduler = ExpiryScheduler()
+for scheduled_manager in (device_manager, registration_manager):
+    scheduled_manager.attach_scheduler(expiry_scheduler)
 
 ROOT = Path(__file__).resolve().parents[1]
 if str(ROOT) not in sys.path:
     sys.path.insert(0, str(ROOT))
 
 
+def apply_config(config: dict):
+    """Застосувати конфіг до менеджерів (при старті і після кожної зміни, з будь-якого воркера)"""
+    if "device_timeout_minutes" in config:
+        device_manager.update_timeout(config["device_timeout_minutes"])
+
+    if "registration_timeout_seconds" in config:
+        registration_manager.update_timeout(config["registration_timeout_seconds"])
+
+    if "scan_dedup_window_ms" in config:
+        scan_dedup.update_window(config["scan_dedup_window_ms"])
+
+
+config_manager.add_listener(apply_config)
+
+# оновлені лічильники дашборду - відкритим адмін-панелям
+dashboard_stats.add_listener(manager.broadcast_dashboard)
+
+
 async def load_config_on_startup():
-    """Завантажити конфіги з БД при старті та оновити менеджери"""
+    """Завантажити конфіги з БД при старті (менеджери оновить apply_config)"""
     try:
         from db.session import engine
         from sqlalchemy.ext.asyncio import async_sessionmaker
@@ -52,21 +88,52 @@ async def load_config_on_startup():
         async_session_factory = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
         
         async with async_session_factory() as db:
-            config = await config_manager.get_config(db)
-            
-            # Оновити менеджери з конфігами з БД
-            if "device_timeout_minutes" in config:
-                device_manager.update_timeout(config["device_timeout_minutes"])
-                logger.info(f"Device timeout set to {config['device_timeout_minutes']} minutes")
-            
-            if "registration_timeout_seconds" in config:
-                registration_manager.update_timeout(config["registration_timeout_seconds"])
-                logger.info(f"Registration timeout set to {config['registration_timeout_seconds']} seconds")
-            
-            logger.info("Configuration loaded from database successfully")
+            await config_manager.get_config(db)
     except Exception as e:
         logger.warning(f"Could not load config from database on startup: {e}")
-        logger.info("Using default configuration values")
+
+    if config_manager.loaded:
+        logger.info("Configuration loaded from database successfully")
+    else:
+        logger.info("Using default configuration values until the database is reachable")
+
+
+async def load_rfid_index_on_startup():
+    """Прогріти індекс RFID, щоб сканування не ходили в БД"""
+    try:
+        from db.session import engine
+        from sqlalchemy.ext.asyncio import async_sessionmaker
+
+        async_session_factory = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+        async with async_session_factory() as db:
+            await rfid_index.load(db)
+    except Exception as e:
+        logger.warning(f"Could not load RFID index on startup: {e}")
+        logger.info("RFID lookups will fall back to the database")
+
+
+async def start_shared_state():
+    """
+    Кілька воркерів (STATE_BACKEND_URL=redis://...): менеджери реплікують
+    свої зміни через pub/sub. memory:// - один процес, реплікація не потрібна.
+    """
+    global shared_state
+
+    backend = create_state_backend(STATE_BACKEND_URL)
+    if not backend.shared:
+        return
+
+    shared_state = SharedState(backend)
+    # device_manager перед manager - спершу оновити пристрій, потім дельту списку
+    for state_manager in (
+        device_manager, manager, registration_manager, auth_manager, esp_access, config_manager,
+        rfid_index, dashboard_stats
+    ):
+        state_manager.attach_shared_state(shared_state)
+
+    await shared_state.start()
+    logger.info("Shared state enabled (worker %s)", shared_state.worker_id)
 
 
 @asynccontextmanager
@@ -75,103 +142,79 @@ async def lifespan(app: FastAPI):
     
     # Завантажити конфіги з БД при старті
     await load_config_on_startup()
+    await load_rfid_index_on_startup()
+    await start_shared_state()
     
-    cleanup_task = asyncio.create_task(cleanup_offline_devices())
-    auth_cleanup_task = asyncio.create_task(cleanup_auth_sessions())
-    registration_cleanup_task = asyncio.create_task(cleanup_registration_sessions())
+    expiry_task = asyncio.create_task(expiry_scheduler.run())
+    sheet_sync_task = asyncio.create_task(sheet_sync_worker.run())
+    # старт без БД - повторює завантаження конфігу, далі перечитує раз на TTL
+    config_task = asyncio.create_task(config_manager.run(async_session))
+
+    if ESP_INGEST_QUEUE_ENABLED:
+        esp_ingest.start()
+
+    background_tasks = [
+        expiry_task,
+        sheet_sync_task,
+        config_task,
+    ]
     
     yield
-    
-    for task in [cleanup_task, auth_cleanup_task, registration_cleanup_task]:
+
+    # спершу дообробити скани з черг, поки менеджери ще працюють
+    await esp_ingest.shutdown()
+
+    for task in background_tasks:
         task.cancel()
     
-    for task in [cleanup_task, auth_cleanup_task, registration_cleanup_task]:
+    for task in background_tasks:
         try:
             await task
         except asyncio.CancelledError:
             pass
 
+    sheet_sync_worker.shutdown()
+    auth_manager.hasher.shutdown()
+    await manager.shutdown()
+    if shared_state:
+        await shared_state.close()
+
     logger.info("ESP32 Multi-Device Monitor stopped")
 
 
-async def cleanup_offline_devices():
-    """Фонова задача для очищення офлайн пристроїв"""
-    from db.session import engine
-    from sqlalchemy.ext.asyncio import async_sessionmaker
-    
-    async_session_factory = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
-    
-    while True:
-        try:
-            # Брати інтервал з БД через конфіг-менеджер (з кешуванням на 5 хвилин)
-            async with async_session_factory() as db:
-                config = await config_manager.get_config(db)
-                interval = config.get("device_cleanup_interval_seconds", 300)
-            
-            await asyncio.sleep(interval)
-            offline_devices = device_manager.cleanup_offline_devices()
-            if offline_devices:
-                # Сповістити клієнтів про зміни статусу
-                await manager.broadcast_device_list()
-        except Exception as exc:
-            logger.error("Error in cleanup task: %s", exc)
-
-
-async def cleanup_auth_sessions():
-    from db.session import engine
-    from sqlalchemy.ext.asyncio import async_sessionmaker
-    
-    async_session_factory = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
-    
-    while True:
-        try:
-            # Брати інтервал з БД через конфіг-менеджер (з кешуванням на 5 хвилин)
-            async with async_session_factory() as db:
-                config = await config_manager.get_config(db)
-                interval = config.get("auth_cleanup_interval_seconds", 3600)
-            
-            await asyncio.sleep(interval)
-            auth_manager.cleanup_expired_sessions()
-        except Exception as exc:
-            logger.error("Error in auth cleanup task: %s", exc)
-
-
-async def cleanup_registration_sessions():
-    logger.info("Registration cleanup task started")
-    
-    while True:
-        try:
-            await asyncio.sleep(60)  # інтервал
-            
-            deleted = registration_manager.cleanup_expired()
-            
-            if deleted:
-                logger.info(f"Removed {deleted} expired sessions")
-                
-        except Exception as exc:
-            logger.error("Error in registration cleanup task: %s", exc)
+# ===============================
+# EXPIRY EVENTS
+# ===============================
+def on_registration_expired(esp_id: str):
+    """Сесія реєстрації закінчилась - сказати UI, не чекаючи наступного скану"""
+    manager.notify_local_subscribers(esp_id, {
+        "type": "registration_status",
+        "status": "info",
+        "message": "Sesja rejestracji wygasła",
+        "session": None
+    })
+
+
+async def on_device_offline(device_id: str):
+    manager.notify_local_subscribers(device_id, {
+        "type": "device_offline",
+        "device_id": device_id
+    })
+    await manager.broadcast_device_list()
+
+
+expiry_scheduler.register("registration", on_registration_expired)
+expiry_scheduler.register("device", on_device_offline)
 
 # ===============================
 # CLEANUP USER ESP ACCESS
 # ===============================
 def remove_user_from_all_esps(user_id: int):
-    global esp_allowed_users
-
-    for esp_id in list(esp_allowed_users.keys()):
-        esp_allowed_users[esp_id].discard(user_id)
-
-        if not esp_allowed_users[esp_id]:
-            esp_allowed_users.pop(esp_id)
+    esp_access.revoke_user(user_id)
 
 
 def remove_user_ws_subscriptions(user_id: int):
-    from app.main import manager
-
-    for ws in list(manager.connections.keys()):
-        # websocket не знає user_id напряму
-        # але можна зберегти його в ws.state
-        if hasattr(ws, "user_id") and ws.user_id == user_id:
-            manager.unsubscribe(ws)
+    manager.unsubscribe_user(user_id)
 
 # Ініціалізація додатку
 app = FastAPI(
@@ -197,6 +240,7 @@ app.include_router(admin_api_router)
 app.include_router(admin_device_statuses_router)
 app.include_router(admin_users_api_router)
 app.include_router(admin_system_config_router)
+app.include_router(admin_metrics_router)
 app.include_router(admin_pages_router)
 app.include_router(admin_transactions_router)
 app.include_router(admin_device_transactions_router)
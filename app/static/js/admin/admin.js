@@ -131,6 +131,50 @@ async function api(url, options = {}) {
 async function loadDashboard() {
     console.log("🚀 Dashboard init");
 
+    if (!document.getElementById("scannerDevices")) {
+        console.warn("❌ Dashboard elements missing");
+        return;
+    }
+
+    try {
+        const data = await api("/admin/api/dashboard");
+        console.log("📊 DATA:", data);
+        renderDashboard(data);
+    } catch (err) {
+        console.error("❌ Dashboard error:", err);
+
+        const tbody = document.querySelector("#deptTable tbody");
+        if (tbody) {
+            tbody.innerHTML = `<tr><td colspan="5">Błąd ładowania</td></tr>`;
+        }
+    }
+
+    watchDashboard();
+}
+
+/* === Оновлення лічильників наживо (WebSocket) === */
+function watchDashboard() {
+    const wsProtocol = location.protocol === "https:" ? "wss" : "ws";
+    const ws = new WebSocket(`${wsProtocol}://${location.host}/ws`);
+
+    ws.onopen = () => {
+        ws.send(JSON.stringify({ command: "watch_dashboard" }));
+    };
+
+    ws.onmessage = (e) => {
+        const msg = JSON.parse(e.data);
+        if (msg.type === "dashboard_stats") {
+            renderDashboard(msg.data);
+        }
+    };
+
+    ws.onclose = () => {
+        console.warn("Dashboard WebSocket disconnected");
+        setTimeout(watchDashboard, 5000);
+    };
+}
+
+function renderDashboard(data) {
     const scannerEl = document.getElementById("scannerDevices");
     const printerEl = document.getElementById("printerDevices");
     const disabledScannerEl = document.getElementById("disabledScannerDevices");
@@ -143,71 +187,58 @@ async function loadDashboard() {
     const tbody = document.querySelector("#deptTable tbody");
 
     if (!scannerEl || !printerEl || !disabledScannerEl || !disabledPrinterEl) {
-        console.warn("❌ Dashboard elements missing");
         return;
     }
 
-    try {
-        const data = await api("/admin/api/dashboard");
-        console.log("📊 DATA:", data);
-
-        // =========================
-        // DEVICE COUNTS
-        // =========================
-        const enabledScanners = data.devices?.by_type?.scanner ?? 0;
-        const enabledPrinters = data.devices?.by_type?.printer ?? 0;
-        const disabledScanners = data.devices?.disabled_by_type?.scanner ?? 0;
-        const disabledPrinters = data.devices?.disabled_by_type?.printer ?? 0;
-
-        // Populate cells
-        scannerEl.textContent = enabledScanners;
-        printerEl.textContent = enabledPrinters;
-        disabledScannerEl.textContent = disabledScanners;
-        disabledPrinterEl.textContent = disabledPrinters;
-
-        // Calculate totals
-        const totalAvailable = enabledScanners + enabledPrinters;
-        const totalDisabled = disabledScanners + disabledPrinters;
-        const grandTotal = totalAvailable + totalDisabled;
-
-        if (totalScannersEl) totalScannersEl.textContent = enabledScanners + disabledScanners;
-        if (totalPrintersEl) totalPrintersEl.textContent = enabledPrinters + disabledPrinters;
-        if (totalAvailableEl) totalAvailableEl.textContent = totalAvailable;
-        if (totalDisabledEl) totalDisabledEl.textContent = totalDisabled;
-        if (grandTotalEl) grandTotalEl.textContent = grandTotal;
-
-        // =========================
-        // DEPARTMENTS
-        // =========================
-        if (!tbody) return;
-
-        tbody.innerHTML = "";
-
-        if (!data.departments || data.departments.length === 0) {
-            tbody.innerHTML = `<tr><td colspan="5">Brak danych</td></tr>`;
-            return;
-        }
+    // =========================
+    // DEVICE COUNTS
+    // =========================
+    const enabledScanners = data.devices?.by_type?.scanner ?? 0;
+    const enabledPrinters = data.devices?.by_type?.printer ?? 0;
+    const disabledScanners = data.devices?.disabled_by_type?.scanner ?? 0;
+    const disabledPrinters = data.devices?.disabled_by_type?.printer ?? 0;
+
+    // Populate cells
+    scannerEl.textContent = enabledScanners;
+    printerEl.textContent = enabledPrinters;
+    disabledScannerEl.textContent = disabledScanners;
+    disabledPrinterEl.textContent = disabledPrinters;
+
+    // Calculate totals
+    const totalAvailable = enabledScanners + enabledPrinters;
+    const totalDisabled = disabledScanners + disabledPrinters;
+    const grandTotal = totalAvailable + totalDisabled;
+
+    if (totalScannersEl) totalScannersEl.textContent = enabledScanners + disabledScanners;
+    if (totalPrintersEl) totalPrintersEl.textContent = enabledPrinters + disabledPrinters;
+    if (totalAvailableEl) totalAvailableEl.textContent = totalAvailable;
+    if (totalDisabledEl) totalDisabledEl.textContent = totalDisabled;
+    if (grandTotalEl) grandTotalEl.textContent = grandTotal;
+
+    // =========================
+    // DEPARTMENTS
+    // =========================
+    if (!tbody) return;
 
-        for (const d of data.departments) {
-            const tr = document.createElement("tr");
+    tbody.innerHTML = "";
 
-            tr.innerHTML = `
-                <td>${d.department ?? "Brak"}</td>
-                <td>${d.employees ?? 0}</td>
-                <td>${d.devices ?? 0}</td>
-                <td>${d.scanners ?? 0}</td>
-                <td>${d.printers ?? 0}</td>
-            `;
+    if (!data.departments || data.departments.length === 0) {
+        tbody.innerHTML = `<tr><td colspan="5">Brak danych</td></tr>`;
+        return;
+    }
 
-            tbody.appendChild(tr);
-        }
+    for (const d of data.departments) {
+        const tr = document.createElement("tr");
 
-    } catch (err) {
-        console.error("❌ Dashboard error:", err);
+        tr.innerHTML = `
+            <td>${d.department ?? "Brak"}</td>
+            <td>${d.employees ?? 0}</td>
+            <td>${d.devices ?? 0}</td>
+            <td>${d.scanners ?? 0}</td>
+            <td>${d.printers ?? 0}</td>
+        `;
 
-        if (tbody) {
-            tbody.innerHTML = `<tr><td colspan="5">Błąd ładowania</td></tr>`;
-        }
+        tbody.appendChild(tr);
     }
 }
 
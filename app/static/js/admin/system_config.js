@@ -35,6 +35,7 @@ function fillForm(config) {
     document.getElementById('authCleanupInterval').value = config.auth_cleanup_interval_seconds;
     document.getElementById('deviceNotReturnedHours').value = config.device_not_returned_hours;
     document.getElementById('allowRegistrationWithoutLogin').checked = config.allow_registration_without_login;
+    document.getElementById('scanDedupWindow').value = config.scan_dedup_window_ms;
 }
 
 // Оновити час останньої оновації
@@ -76,7 +77,7 @@ document.getElementById('configForm').addEventListener('submit', async (e) => {
     
     for (const [key, value] of formData.entries()) {
         // Перетворити числа на числа
-        if (key.includes('minutes') || key.includes('seconds') || key.includes('hours')) {
+        if (key.includes('minutes') || key.includes('seconds') || key.includes('hours') || key.endsWith('_ms')) {
             updates[key] = parseInt(value, 10);
         } else {
             updates[key] = value;
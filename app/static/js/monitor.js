@@ -3,6 +3,7 @@ const wsProtocol = location.protocol === "https:" ? "wss" : "ws";
 const ws = new WebSocket(`${wsProtocol}://${location.host}/ws`);
 
 let devicesCache = {};
+let devicesVersion = null;
 let activeDevice = null;
 
 let countdownInterval = null;
@@ -27,15 +28,21 @@ ws.onmessage = (e) => {
 
     if (msg.type === "device_list") {
         devicesCache = msg.data.devices;
+        devicesVersion = msg.version;
+        onDevicesChanged();
+    }
 
-        if (activeDevice && !devicesCache[activeDevice]) {
-            activeDevice = null;
-            const outputEl = document.getElementById("output");
-            if (outputEl) outputEl.textContent = "Device disconnected";
-            endBtn.disabled = true;
+    if (msg.type === "device_list_delta") {
+        // пропущена дельта - просимо повний список
+        if (msg.base_version !== devicesVersion) {
+            ws.send(JSON.stringify({ command: "device_list" }));
+            return;
         }
 
-        renderDevices();
+        Object.assign(devicesCache, msg.data.changed);
+        msg.data.removed.forEach(id => delete devicesCache[id]);
+        devicesVersion = msg.version;
+        onDevicesChanged();
     }
 
     if (msg.type === "esp32_data") {
@@ -47,6 +54,13 @@ ws.onmessage = (e) => {
         }
     }
 
+    if (msg.type === "device_offline") {
+        if (msg.device_id === activeDevice) {
+            showStatus("error", `Czytnik ${msg.device_id} jest offline`);
+            stopCountdown();
+        }
+    }
+
     if (msg.type === "registration_status") {
         showStatus(msg.status, msg.message);
         if (msg.session) {
@@ -57,6 +71,17 @@ ws.onmessage = (e) => {
     }
 };
 
+function onDevicesChanged() {
+    if (activeDevice && !devicesCache[activeDevice]) {
+        activeDevice = null;
+        const outputEl = document.getElementById("output");
+        if (outputEl) outputEl.textContent = "Device disconnected";
+        endBtn.disabled = true;
+    }
+
+    renderDevices();
+}
+
 function startCountdown(timeoutSeconds) {
     stopCountdown();
 
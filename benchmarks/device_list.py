@@ -0,0 +1,120 @@
+"""
+Вартість device_list для N зчитувачів: як було (Device.to_dict() з
+pydantic model_dump для latest_data + json.dumps на кожен знімок) проти
+склеювання кешованих фрагментів Device.entry_json().
+
+    python -m benchmarks.device_list --readers 500 --changed 25
+"""
+import argparse
+import json
+import time
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from pydantic import BaseModel
+
+from managers.device_manager import DeviceManager
+
+
+class LegacyDeviceData(BaseModel):
+    """Попередній DeviceData: pydantic-модель на кожен POST"""
+    timestamp: datetime
+    data: Dict[str, Any]
+
+    def dict(self, **kwargs):
+        d = super().model_dump(**kwargs)
+        d["timestamp"] = self.timestamp.isoformat()
+        return d
+
+
+class LegacyDevice:
+    """Попередній Device: datetime-поля і to_dict() на кожен знімок"""
+
+    def __init__(self, device_id: str):
+        self.id = device_id
+        self.name = f"ESP32-{device_id[-6:]}"
+        self.latest_data: Optional[LegacyDeviceData] = None
+        self.connected_at: Optional[datetime] = None
+        self.last_seen: Optional[datetime] = None
+        self.is_online = False
+
+    def update_data(self, data: Dict[str, Any]):
+        self.latest_data = LegacyDeviceData(timestamp=datetime.now(), data=data)
+        self.last_seen = datetime.now()
+        self.is_online = True
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "name": self.name,
+            "is_online": self.is_online,
+            "connected_at": self.connected_at.isoformat() if self.connected_at else None,
+            "last_seen": self.last_seen.isoformat() if self.last_seen else None,
+            "latest_data": self.latest_data.dict() if self.latest_data else None
+        }
+
+
+def legacy_device_list(devices: Dict[str, LegacyDevice]) -> str:
+    """Попередній device_list: get_all_devices_status() + ws.send_json"""
+    online = sum(1 for device in devices.values() if device.is_online)
+    return json.dumps({
+        "type": "device_list",
+        "data": {
+            "total_devices": len(devices),
+            "online_devices": online,
+            "offline_devices": len(devices) - online,
+            "devices": {did: device.to_dict() for did, device in devices.items()},
+        },
+    })
+
+
+def timed(name: str, runs: int, func) -> float:
+    started = time.perf_counter()
+    for _ in range(runs):
+        func()
+    per_run = (time.perf_counter() - started) / runs * 1e6
+    print(f"{name:<34} {per_run:10.1f} us")
+    return per_run
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--readers", type=int, default=500)
+    parser.add_argument("--changed", type=int, default=25, help="скільки зчитувачів змінюється між знімками")
+    parser.add_argument("--runs", type=int, default=200)
+    args = parser.parse_args()
+
+    devices = DeviceManager()
+    legacy_devices: Dict[str, LegacyDevice] = {}
+    for n in range(args.readers):
+        device_id = f"esp-{n:04d}"
+        data = {"rfid": f"{n:08X}", "rssi": -60}
+        devices.update_device_data(device_id, data)
+        legacy_devices[device_id] = LegacyDevice(device_id)
+        legacy_devices[device_id].update_data(data)
+
+    changed = [f"esp-{n:04d}" for n in range(args.changed)]
+    assert json.loads(devices.get_device_list_json()) == devices.get_device_list_snapshot()
+
+    print(f"device_list, {args.readers} readers")
+    legacy = timed("to_dict + model_dump + json.dumps", args.runs, lambda: legacy_device_list(legacy_devices))
+    cached = timed("cached fragments (no changes)", args.runs, devices.get_device_list_json)
+
+    def with_changes():
+        for device_id in changed:
+            devices.get_device(device_id).touch()
+        devices.get_device_list_json()
+
+    timed(f"cached fragments ({args.changed} changed)", args.runs, with_changes)
+    print(f"speed-up without changes: x{legacy / cached:.1f}")
+
+    print("\nupdate_data, per scan")
+    timed("pydantic DeviceData + 2x now()", args.runs * 50, lambda: (
+        LegacyDeviceData(timestamp=datetime.now(), data={"rfid": "0000ABCD"}), datetime.now()
+    ))
+    device = devices.get_device(changed[0] if changed else "esp-0000")
+    timed("slotted Device.update_data", args.runs * 50, lambda: device.update_data({"rfid": "0000ABCD"}))
+
+
+if __name__ == "__main__":
+    main()
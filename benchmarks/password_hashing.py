@@ -0,0 +1,74 @@
+"""
+Затримка циклу подій під час одночасних входів: хешування в циклі
+(як було) проти пулу PasswordHasher.
+
+    python -m benchmarks.password_hashing --logins 20 --rounds 29000
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+from passlib.context import CryptContext
+
+from managers.auth_manager import PasswordHasher
+
+
+async def measure_loop_lag(stop: asyncio.Event, interval: float = 0.005) -> list[float]:
+    """Наскільки пізніше за план прокидається задача (мс) - так само чекали б скани ESP"""
+    lags = []
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        lags.append((time.perf_counter() - started - interval) * 1000)
+    return lags
+
+
+async def run_scenario(name: str, verify, logins: int):
+    stop = asyncio.Event()
+    ticker = asyncio.create_task(measure_loop_lag(stop))
+    await asyncio.sleep(0.05)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(verify() for _ in range(logins)))
+    elapsed = time.perf_counter() - started
+
+    stop.set()
+    lags = await ticker
+    lags.sort()
+
+    print(
+        f"{name:<8} logins={logins} total={elapsed:.2f}s "
+        f"loop lag p50={statistics.median(lags):.1f}ms "
+        f"p99={lags[int(len(lags) * 0.99) - 1]:.1f}ms max={lags[-1]:.1f}ms"
+    )
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--logins", type=int, default=20)
+    parser.add_argument("--rounds", type=int, default=29000)
+    parser.add_argument("--workers", type=int, default=2)
+    args = parser.parse_args()
+
+    context = CryptContext(schemes=["pbkdf2_sha256"], pbkdf2_sha256__rounds=args.rounds)
+    password = "benchmark-password"
+    hashed = context.hash(password)
+
+    async def inline_verify():
+        # старий шлях: verify прямо в async обробнику
+        await asyncio.sleep(0)
+        context.verify(password, hashed)
+
+    hasher = PasswordHasher(context, max_workers=args.workers, max_pending=args.logins, wait_seconds=60)
+
+    async def pooled_verify():
+        await hasher.verify_and_update(password, hashed)
+
+    await run_scenario("inline", inline_verify, args.logins)
+    await run_scenario("pool", pooled_verify, args.logins)
+    hasher.shutdown()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,4 +1,5 @@
 """Конфігурація додатку"""
+import os
 from pathlib import Path
 from dotenv import load_dotenv
 from fastapi.templating import Jinja2Templates
@@ -31,8 +32,111 @@ REGISTRATION_TIMEOUT_SECONDS = 7  # таймаут реєстрації прис
 DEVICE_CLEANUP_INTERVAL_SECONDS = 300  # як часто перевіряти офлайн пристрої (5 хвилин)
 AUTH_CLEANUP_INTERVAL_SECONDS = 3600  # як часто очищувати застарілі сесії (1 година)
 
+# Завантаження конфігу з БД у фоні (якщо БД ще не готова при старті)
+CONFIG_LOAD_RETRY_SECONDS = 2  # перша затримка повтору
+CONFIG_LOAD_RETRY_MAX_SECONDS = 60  # максимальна затримка повтору
+
 # Довгі таймаути (вплив на UI - email оповіщення)
 DEVICE_NOT_RETURNED_HOURS = 12  # скільки годин перед оповіщенням про не повернення
 
 # Настройки реєстрації
 ALLOW_REGISTRATION_WITHOUT_LOGIN = False  # дозволити реєстрацію користувачів без входу в систему
+SCAN_DEDUP_WINDOW_MS = 1500  # повтор скану (зчитувач, rfid, nonce) у цьому вікні - відповідь з кешу; 0 - вимкнено
+SCAN_DEDUP_MAX_ENTRIES = 10000  # максимум запам'ятованих сканів
+RFID_MISS_CACHE_SIZE = 5000  # скільки невідомих карток пам'ятати без повторного запиту до БД
+RFID_MISS_CACHE_SECONDS = 300  # як довго довіряти промаху (картка могла з'явитися в обхід додатку)
+
+# Синхронізація з Google Sheets (фоновий воркер)
+SHEET_SYNC_POLL_SECONDS = 30  # як часто перевіряти чергу, якщо не було сповіщень
+SHEET_SYNC_BATCH_SIZE = 200  # скільки записів черги брати за один прохід
+SHEET_SYNC_RETRY_BASE_SECONDS = 5  # початкова затримка повтору після помилки
+SHEET_SYNC_RETRY_MAX_SECONDS = 900  # максимальна затримка повтору (15 хвилин)
+SHEET_SYNC_MAX_ATTEMPTS = 10  # після стількох невдалих спроб запис черги позначається як failed
+SHEET_SYNC_LEASE_SECONDS = 300  # на скільки захоплена пачка зникає з черги (довше за виклик Sheets)
+SHEET_ROW_INDEX_TTL_SECONDS = 600  # як довго довіряти кешу позицій рядків аркуша
+SHEETS_READ_MAX_WORKERS = 4  # скільки аркушів читати з Google Sheets одночасно
+
+# Історія транзакцій
+TRANSACTIONS_PAGE_SIZE = 10  # розмір сторінки за замовчуванням
+TRANSACTIONS_MAX_PAGE_SIZE = 200  # максимальний page_size з запиту
+TRANSACTIONS_COUNT_CACHE_SECONDS = 30  # як довго кешувати total для однакових фільтрів
+TRANSACTIONS_COUNT_CACHE_SIZE = 256  # скільки різних наборів фільтрів тримати в кеші
+
+# WebSocket розсилка
+WS_SEND_TIMEOUT_SECONDS = 5  # скільки чекати на відправку одному клієнту перед відключенням
+WS_SEND_QUEUE_SIZE = 100  # максимум повідомлень в черзі одного клієнта
+DEVICE_LIST_DEBOUNCE_SECONDS = 0.5  # вікно, за яке зміни списку пристроїв збираються в одну дельту
+DASHBOARD_PUSH_DEBOUNCE_SECONDS = 1  # як часто (максимум) розсилати оновлені лічильники дашборду
+
+# Черги даних ESP32 (відповідь ESP одразу, обробка у фоні по порядку)
+ESP_INGEST_QUEUE_ENABLED = os.getenv("ESP_INGEST_QUEUE_ENABLED", "true").lower() == "true"
+ESP_INGEST_QUEUE_SIZE = 50  # скільки сканів одного зчитувача може чекати на обробку
+ESP_INGEST_WORKER_IDLE_SECONDS = 60  # через скільки секунд тиші зупинити воркер зчитувача
+ESP_INGEST_SHUTDOWN_SECONDS = 5  # скільки чекати на дообробку черг при зупинці
+ESP_BATCH_MAX_SCANS = 500  # максимум сканів в одній пачці з буфера SD
+ESP_SCAN_RECEIPT_HOURS = 24  # як довго пам'ятати ключі сканів (повтори пачок)
+
+# Постійне WebSocket-з'єднання зчитувачів (/ws/esp/{device_id})
+ESP_READER_TOKEN = os.getenv("ESP_READER_TOKEN")  # спільний токен зчитувачів; не задано - без перевірки, як /api/data
+ESP_WS_HEARTBEAT_SECONDS = 15  # як часто зчитувач шле heartbeat
+ESP_WS_IDLE_SECONDS = 45  # тиша довша за це - з'єднання закривається, зчитувач офлайн
+
+# Кеш перевірених JWT
+AUTH_TOKEN_CACHE_SIZE = 10000  # максимум токенів у кеші (LRU)
+AUTH_TOKEN_CACHE_SECONDS = 900  # як часто перевіряти користувача в БД повторно
+
+# Хешування паролів (окремий пул потоків)
+PASSWORD_PBKDF2_ROUNDS = int(os.getenv("PASSWORD_PBKDF2_ROUNDS", 29000))  # робочий фактор pbkdf2_sha256
+PASSWORD_BCRYPT_ROUNDS = int(os.getenv("PASSWORD_BCRYPT_ROUNDS", 12))  # робочий фактор bcrypt
+PASSWORD_HASH_MAX_WORKERS = 2  # скільки хешів рахувати одночасно
+PASSWORD_HASH_MAX_PENDING = 32  # скільки входів може чекати на пул
+PASSWORD_HASH_WAIT_SECONDS = 10  # скільки чекати на місце в пулі, потім 503
+
+# Профілі рушія БД (DB_ENGINE_PROFILE). Окремі значення перекриваються змінними
+# середовища DB_ECHO, DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT,
+# DB_STATEMENT_CACHE_SIZE, DB_PREPARED_STATEMENT_CACHE_SIZE
+DB_ENGINE_PROFILE = os.getenv("DB_ENGINE_PROFILE", "default")
+DB_ENGINE_PROFILES = {
+    # звичайна робота: без логування SQL, пул під пачки сканувань
+    "default": {
+        "echo": False,
+        "pool_size": 10,
+        "max_overflow": 10,
+        "pool_timeout": 10,
+        "statement_cache_size": 100,  # кеш prepared statements asyncpg на з'єднання
+        "prepared_statement_cache_size": 100,  # кеш SQLAlchemy поверх asyncpg
+    },
+    # локальна розробка: кожен запит у лог
+    "debug": {
+        "echo": True,
+        "pool_size": 5,
+        "max_overflow": 5,
+        "pool_timeout": 30,
+        "statement_cache_size": 100,
+        "prepared_statement_cache_size": 100,
+    },
+    # за pgbouncer у режимі transaction - prepared statements вимкнені
+    "pgbouncer": {
+        "echo": False,
+        "pool_size": 10,
+        "max_overflow": 10,
+        "pool_timeout": 10,
+        "statement_cache_size": 0,
+        "prepared_statement_cache_size": 0,
+    },
+}
+
+# Окремий пул для фонових задач (експорти, імпорти, Google Sheets),
+# щоб довгі запити не забирали з'єднання в обробників сканувань
+DB_BACKGROUND_POOL_SIZE = int(os.getenv("DB_BACKGROUND_POOL_SIZE", 3))
+DB_BACKGROUND_MAX_OVERFLOW = int(os.getenv("DB_BACKGROUND_MAX_OVERFLOW", 2))
+
+# Спільний стан між воркерами: memory:// - один воркер,
+# redis://host:6379/0 (або fakeredis:// локально) - кілька воркерів uvicorn
+STATE_BACKEND_URL = os.getenv("STATE_BACKEND_URL", "memory://")
+STATE_OUTBOX_SIZE = 10000  # скільки змін може чекати на публікацію, поки backend недоступний
+STATE_CLOSE_TIMEOUT_SECONDS = 5  # скільки чекати на публікацію змін при зупинці
+STATE_HEARTBEAT_SECONDS = 5  # як часто воркер звітує іншим, що живий
+STATE_PEER_TTL_SECONDS = 15  # воркер без heartbeat довше за це вважається впалим
+STATE_RECONNECT_MIN_SECONDS = 0.5  # перша затримка перепідключення до pub/sub
+STATE_RECONNECT_MAX_SECONDS = 30  # максимальна затримка перепідключення
@@ -1,11 +1,21 @@
 import os
 import ssl
+import threading
+import time
 import urllib.parse
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 from dotenv import load_dotenv
 from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 
+from config import (
+    DB_BACKGROUND_MAX_OVERFLOW,
+    DB_BACKGROUND_POOL_SIZE,
+    DB_ENGINE_PROFILE,
+    DB_ENGINE_PROFILES,
+)
+
 
 load_dotenv()
 
@@ -22,16 +32,142 @@ if "sslmode" in query_args and query_args["sslmode"][0] == "require":
     connect_args["ssl"] = ssl_context
 
 
-engine = create_async_engine(
-    url_without_params.replace("postgresql://", "postgresql+asyncpg://"),
-    echo=True,
-    connect_args=connect_args,
-    pool_pre_ping=True,
-    pool_recycle=1800
+def engine_profile(name: str = DB_ENGINE_PROFILE) -> dict:
+    """Профіль з config.DB_ENGINE_PROFILES з перекриттями зі змінних середовища"""
+    if name not in DB_ENGINE_PROFILES:
+        raise ValueError(f"Unknown DB_ENGINE_PROFILE: {name}")
+
+    profile = dict(DB_ENGINE_PROFILES[name])
+
+    echo = os.getenv("DB_ECHO")
+    if echo is not None:
+        # "debug" - ще й рядки результатів
+        profile["echo"] = "debug" if echo == "debug" else echo.lower() in ("1", "true", "yes")
+
+    for key in (
+        "pool_size",
+        "max_overflow",
+        "pool_timeout",
+        "statement_cache_size",
+        "prepared_statement_cache_size",
+    ):
+        value = os.getenv(f"DB_{key.upper()}")
+        if value is not None:
+            profile[key] = int(value)
+
+    return profile
+
+
+class PoolStats:
+    """Скільки обробники чекають на з'єднання з пулу (checkout)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.slow_checkouts = 0  # довше за 100 мс
+
+    def record(self, wait: float, timed_out: bool = False):
+        with self._lock:
+            if timed_out:
+                self.timeouts += 1
+                return
+            self.checkouts += 1
+            self.total_wait += wait
+            self.max_wait = max(self.max_wait, wait)
+            if wait > 0.1:
+                self.slow_checkouts += 1
+
+    def as_dict(self) -> dict:
+        with self._lock:
+            return {
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "avg_wait_ms": round(self.total_wait / self.checkouts * 1000, 3) if self.checkouts else None,
+                "max_wait_ms": round(self.max_wait * 1000, 3),
+                "slow_checkouts": self.slow_checkouts,
+            }
+
+
+class TimedAsyncAdaptedQueuePool(AsyncAdaptedQueuePool):
+    """
+    AsyncAdaptedQueuePool, що міряє час очікування на з'єднання
+    (разом з відкриттям нового, якщо пул ще росте)
+    """
+
+    stats = PoolStats()
+
+    def recreate(self):
+        pool = super().recreate()
+        pool.stats = self.stats
+        return pool
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except Exception:
+            self.stats.record(time.perf_counter() - started, timed_out=True)
+            raise
+        self.stats.record(time.perf_counter() - started)
+        return connection
+
+
+pool_stats: dict[str, PoolStats] = {}
+
+
+def create_engine_for_role(role: str, **overrides):
+    """
+    Рушій з власним пулом для ролі: "api" - запити обробників,
+    "background" - експорти, імпорти, синхронізація.
+    """
+    profile = {**engine_profile(), **overrides}
+
+    role_engine = create_async_engine(
+        url_without_params.replace("postgresql://", "postgresql+asyncpg://")
+        + f"?prepared_statement_cache_size={profile['prepared_statement_cache_size']}",
+        echo=profile["echo"],
+        connect_args={
+            **connect_args,
+            "statement_cache_size": profile["statement_cache_size"],
+        },
+        poolclass=TimedAsyncAdaptedQueuePool,
+        pool_size=profile["pool_size"],
+        max_overflow=profile["max_overflow"],
+        pool_timeout=profile["pool_timeout"],
+        pool_pre_ping=True,
+        pool_recycle=1800,
+    )
+
+    role_engine.pool.stats = pool_stats.setdefault(role, PoolStats())
+    return role_engine
+
+
+engine = create_engine_for_role("api")
+background_engine = create_engine_for_role(
+    "background",
+    pool_size=DB_BACKGROUND_POOL_SIZE,
+    max_overflow=DB_BACKGROUND_MAX_OVERFLOW,
 )
 
 async_session = async_sessionmaker(engine, expire_on_commit=False)
+background_session = async_sessionmaker(background_engine, expire_on_commit=False)
+
+
+def pool_metrics() -> dict:
+    """Стан пулів і час очікування checkout для /admin/api/metrics"""
+    return {
+        role: {
+            "status": pool_engine.pool.status(),
+            "checked_out": pool_engine.pool.checkedout(),
+            **pool_stats[role].as_dict(),
+        }
+        for role, pool_engine in (("api", engine), ("background", background_engine))
+    }
+
 
 async def get_db():
     async with async_session() as session:
-        yield session
\ No newline at end of file
+        yield session
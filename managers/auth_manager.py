@@ -1,12 +1,26 @@
 """Менеджер автентифікації та сесій"""
+import asyncio
+import hashlib
 import logging
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import Optional, Dict
+from typing import Optional, Dict, Set, Tuple
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 from models.db_user import UserDB
+from config import (
+    AUTH_TOKEN_CACHE_SECONDS,
+    AUTH_TOKEN_CACHE_SIZE,
+    PASSWORD_BCRYPT_ROUNDS,
+    PASSWORD_HASH_MAX_PENDING,
+    PASSWORD_HASH_MAX_WORKERS,
+    PASSWORD_HASH_WAIT_SECONDS,
+    PASSWORD_PBKDF2_ROUNDS,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -18,27 +32,227 @@ ACCESS_TOKEN_EXPIRE_MINUTES = 30
 # Використовуємо pbkdf2_sha256 щоб уникнути проблем з bcrypt
 pwd_context = CryptContext(
     schemes=["pbkdf2_sha256", "bcrypt"],  # pbkdf2_sha256 буде першим за замовчуванням
-    deprecated="auto"
+    deprecated="auto",
+    pbkdf2_sha256__rounds=PASSWORD_PBKDF2_ROUNDS,
+    bcrypt__rounds=PASSWORD_BCRYPT_ROUNDS,
 )
 
 
-class AuthManager:
-    def __init__(self):
-        self.active_sessions: Dict[str, dict] = {}  # token -> user_data
-    
-    def verify_password(self, plain_password: str, hashed_password: str) -> bool:
-        """Перевірка пароля"""
+class PasswordHasherBusy(Exception):
+    """Забагато одночасних хешувань - клієнт має повторити пізніше"""
+
+
+class PasswordHasher:
+    """
+    Хешування і перевірка паролів у власному пулі потоків.
+
+    hashlib.pbkdf2_hmac і bcrypt відпускають GIL, тому цикл подій
+    (скани ESP, WebSocket) не стоїть, поки рахується хеш. Семафор
+    обмежує кількість запитів у пулі разом з чергою; якщо місця немає
+    довше wait_seconds - PasswordHasherBusy.
+    """
+
+    def __init__(self, context: CryptContext, max_workers: int, max_pending: int, wait_seconds: float):
+        self.context = context
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.wait_seconds = wait_seconds
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._slots = asyncio.Semaphore(max_pending)
+
+        self.in_flight = 0
+        self.completed = 0
+        self.rejected = 0
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.max_workers,
+                thread_name_prefix="password-hash"
+            )
+        return self._executor
+
+    async def _run(self, fn, *args):
+        try:
+            await asyncio.wait_for(self._slots.acquire(), timeout=self.wait_seconds)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            raise PasswordHasherBusy()
+
+        self.in_flight += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._get_executor(), fn, *args)
+        finally:
+            self.in_flight -= 1
+            self.completed += 1
+            self._slots.release()
+
+    async def hash(self, password: str) -> str:
+        return await self._run(self.context.hash, password)
+
+    async def verify_and_update(self, password: str, hashed: str) -> Tuple[bool, Optional[str]]:
+        """(пароль вірний, новий хеш якщо збережений має застарілі параметри)"""
+        return await self._run(self._verify_and_update, password, hashed)
+
+    def _verify_and_update(self, password: str, hashed: str) -> Tuple[bool, Optional[str]]:
+        """
+        Новий хеш - лише в межах тієї ж схеми (змінились rounds pbkdf2_sha256).
+        bcrypt-хеші не переписуються на pbkdf2 мовчки при вході.
+        """
         try:
-            # Перевіряємо з pbkdf2_sha256 (або іншим алгоритмом)
-            return pwd_context.verify(plain_password, hashed_password)
+            verified, new_hash = self.context.verify_and_update(password, hashed)
         except Exception as e:
             logger.warning(f"Password verification failed: {e}")
-            return False
+            return False, None
+
+        if new_hash and self.context.identify(hashed) != self.context.default_scheme():
+            new_hash = None
+        return verified, new_hash
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "max_workers": self.max_workers,
+            "max_pending": self.max_pending,
+            "in_flight": self.in_flight,
+            "completed": self.completed,
+            "rejected": self.rejected,
+        }
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+
+class TokenCache:
+    """
+    Кеш перевірених токенів: sha256(token) -> дані користувача.
+
+    Обмежений LRU (max_entries) - пам'ять не росте з кількістю входів.
+    Запис живе до exp токена, але не довше ttl_seconds - після цього
+    користувач знову перевіряється в БД. revoke_user прибирає всі токени
+    користувача (деактивація, зміна ролі чи пароля).
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: int):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, tuple[dict, float]]" = OrderedDict()
+        self._by_user: Dict[int, Set[str]] = {}
+
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evicted = 0
+        self.revoked = 0
+
+    @staticmethod
+    def key_for(token: str) -> str:
+        return hashlib.sha256(token.encode()).hexdigest()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key: str) -> Optional[dict]:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        user, expires_at = entry
+        if time.time() >= expires_at:
+            self._discard(key)
+            self.expired += 1
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return user
+
+    def put(self, key: str, user: dict, exp: Optional[float] = None):
+        expires_at = time.time() + self.ttl_seconds
+        if exp is not None:
+            expires_at = min(expires_at, exp)
+
+        self._discard(key)
+        self._entries[key] = (user, expires_at)
+        self._by_user.setdefault(user["id"], set()).add(key)
+
+        while len(self._entries) > self.max_entries:
+            self._discard(next(iter(self._entries)))
+            self.evicted += 1
+
+    def remove(self, key: str):
+        self._discard(key)
+
+    def revoke_user(self, user_id: int) -> int:
+        keys = self._by_user.pop(user_id, set())
+        for key in keys:
+            self._entries.pop(key, None)
+        self.revoked += len(keys)
+        return len(keys)
+
+    def _discard(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+
+        keys = self._by_user.get(entry[0]["id"])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._by_user[entry[0]["id"]]
+
+    def stats(self) -> Dict[str, int]:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else None,
+            "expired": self.expired,
+            "evicted": self.evicted,
+            "revoked": self.revoked,
+        }
+
+
+class AuthManager:
+    def __init__(self):
+        self.sessions = TokenCache(
+            max_entries=AUTH_TOKEN_CACHE_SIZE,
+            ttl_seconds=AUTH_TOKEN_CACHE_SECONDS
+        )
+        self.shared_state = None
+        self.hasher = PasswordHasher(
+            pwd_context,
+            max_workers=PASSWORD_HASH_MAX_WORKERS,
+            max_pending=PASSWORD_HASH_MAX_PENDING,
+            wait_seconds=PASSWORD_HASH_WAIT_SECONDS
+        )
+
+    def attach_shared_state(self, shared_state):
+        """Ділити сесії з іншими воркерами (передається лише хеш токена)"""
+        self.shared_state = shared_state
+        shared_state.register("auth", self._apply_remote)
+
+    def _replicate(self, op: str, **data):
+        if self.shared_state:
+            self.shared_state.publish("auth", op, **data)
+
+    def _apply_remote(self, op: str, data: dict, origin: str):
+        if op == "add":
+            self.sessions.put(data["key"], data["user"], data["exp"])
+        elif op == "remove":
+            self.sessions.remove(data["key"])
+        elif op == "revoke_user":
+            self.sessions.revoke_user(data["user_id"])
     
-    def get_password_hash(self, password: str) -> str:
-        """Хешування пароля"""
-        # Використовуємо pbkdf2_sha256 за замовчуванням
-        return pwd_context.hash(password)
+    async def hash_password(self, password: str) -> str:
+        """Хеш пароля (pbkdf2_sha256) у пулі хешування"""
+        return await self.hasher.hash(password)
     
     def create_access_token(self, data: dict, expires_delta: Optional[timedelta] = None):
         to_encode = data.copy()
@@ -72,9 +286,16 @@ class AuthManager:
         logger.info(f"Authenticating user: {username}")
         logger.info(f"Password hash in DB: {user.password_hash[:50]}...")
         
-        if not self.verify_password(password, user.password_hash):
+        verified, new_hash = await self.hasher.verify_and_update(password, user.password_hash)
+        if not verified:
             logger.warning(f"Password verification failed for user: {username}")
             return None
+
+        if new_hash:
+            # змінились rounds pbkdf2_sha256 - перехешовуємо при вході
+            user.password_hash = new_hash
+            await db.commit()
+            logger.info(f"Password hash upgraded for user: {username}")
         
         if not user.is_active:
             logger.warning(f"User {username} is not active")
@@ -83,28 +304,30 @@ class AuthManager:
         logger.info(f"User {username} authenticated successfully")
         return user
     
-    def add_session(self, token: str, user_data: dict):
-        self.active_sessions[token] = {
-            "user": user_data,
-            "created_at": datetime.now()
-        }
+    def add_session(self, token: str, user_data: dict, exp: Optional[float] = None):
+        """Запам'ятати перевірений токен; exp - з payload (інакше читається з токена)"""
+        if exp is None:
+            try:
+                exp = jwt.get_unverified_claims(token).get("exp")
+            except JWTError:
+                return
+
+        key = TokenCache.key_for(token)
+        self.sessions.put(key, user_data, exp)
+        self._replicate("add", key=key, user=user_data, exp=exp)
     
     def remove_session(self, token: str):
-        self.active_sessions.pop(token, None)
-    
+        key = TokenCache.key_for(token)
+        self.sessions.remove(key)
+        self._replicate("remove", key=key)
+
+    def revoke_user(self, user_id: int):
+        """Скинути всі закешовані токени користувача (на всіх воркерах)"""
+        self.sessions.revoke_user(user_id)
+        self._replicate("revoke_user", user_id=user_id)
+
     def get_user_from_token(self, token: str) -> Optional[dict]:
-        if token in self.active_sessions:
-            return self.active_sessions[token]["user"]
-        return None
-    
-    def cleanup_expired_sessions(self):
-        expired = []
-        for token, session in self.active_sessions.items():
-            if datetime.now() - session["created_at"] > timedelta(hours=24):
-                expired.append(token)
-        
-        for token in expired:
-            self.active_sessions.pop(token, None)
+        return self.sessions.get(TokenCache.key_for(token))
 
 
 auth_manager = AuthManager()
\ No newline at end of file
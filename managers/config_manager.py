@@ -1,6 +1,6 @@
 """Менеджер системної конфігурації"""
 import logging
-from typing import Optional, Dict, Any
+from typing import Callable, List, Optional, Dict, Any
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 from datetime import datetime
@@ -13,13 +13,65 @@ logger = logging.getLogger(__name__)
 
 
 class ConfigManager:
-    """Менеджер для завантаження конфігів з БД з кешуванням"""
+    """
+    Менеджер для завантаження конфігів з БД з кешуванням.
+
+    _cache - знімок конфігу: словник ніколи не змінюється на місці, при
+    оновленні підміняється цілком, тому snapshot читається без блокування.
+    Зміни з інших воркерів приходять через shared_state (без чекання TTL).
+
+    Гарячі шляхи не ходять у БД, тому знімок тримає актуальним фонова
+    задача run(): поки БД недоступна - повторює завантаження, далі
+    перечитує конфіг раз на TTL (ручні зміни в таблиці system_config).
+    Невдале читання ніколи не кешується як дефолти.
+    """
     
     def __init__(self):
         self._cache: Optional[Dict[str, Any]] = None
         self._cache_time: Optional[datetime] = None
         self._cache_ttl_seconds = 300  # 5 хвилин
         self._lock = asyncio.Lock()
+        self._defaults = self._get_default_config_dict()
+        self._listeners: List[Callable[[Dict[str, Any]], None]] = []
+        self.shared_state = None
+
+    @property
+    def snapshot(self) -> Dict[str, Any]:
+        """Поточний конфіг для гарячих шляхів: без сесії БД і без await"""
+        return self._cache or self._defaults
+
+    @property
+    def loaded(self) -> bool:
+        """Знімок прочитано з БД (інакше гарячі шляхи бачать дефолти)"""
+        return self._cache is not None
+
+    def add_listener(self, callback: Callable[[Dict[str, Any]], None]):
+        """callback(config) - після кожної зміни знімка (і з інших воркерів)"""
+        self._listeners.append(callback)
+
+    def attach_shared_state(self, shared_state):
+        self.shared_state = shared_state
+        shared_state.register("config", self._apply_remote)
+
+    def _apply_remote(self, op: str, data: dict, origin: str):
+        if op == "changed":
+            self._set_snapshot(data["config"])
+
+    def _publish(self, config_dict: Dict[str, Any]):
+        if self.shared_state:
+            self.shared_state.publish("config", "changed", config=config_dict)
+
+    def _set_snapshot(self, config_dict: Dict[str, Any]):
+        changed = config_dict != self._cache
+        self._cache = config_dict
+        self._cache_time = datetime.utcnow()
+
+        if changed:
+            for listener in self._listeners:
+                try:
+                    listener(config_dict)
+                except Exception as e:
+                    logger.error(f"Config listener failed: {e}")
     
     async def get_config(self, db: AsyncSession) -> Dict[str, Any]:
         """
@@ -35,33 +87,77 @@ class ConfigManager:
             # Подвійна перевірка після блокування
             if self._cache and self._is_cache_valid():
                 return self._cache
-            
-            # Завантажуємо з БД
+
             try:
-                stmt = select(SystemConfigDB).limit(1)
-                result = await db.execute(stmt)
-                db_config = result.scalar_one_or_none()
-                
-                if db_config:
-                    config_dict = db_config.to_dict()
-                    logger.debug("Loaded config from database")
-                else:
-                    # Якщо в БД нічого немає - створюємо дефолт
-                    config_dict = self._get_default_config_dict()
-                    logger.info("No config in database, using defaults")
-                    
-                    # Зберігаємо дефолт в БД
-                    db_config = SystemConfigDB(**config_dict)
-                    db.add(db_config)
-                    await db.commit()
-                    logger.info("Default config saved to database")
+                config_dict = await self._load(db)
             except Exception as e:
+                # не кешуємо: наступний виклик (або run) спробує ще раз
                 logger.error(f"Error loading config from database: {e}")
-                config_dict = self._get_default_config_dict()
-            
-            self._cache = config_dict
-            self._cache_time = datetime.utcnow()
+                return self.snapshot
+
+            self._set_snapshot(config_dict)
+            return config_dict
+
+    async def run(
+        self,
+        session_factory,
+        retry_seconds: float = default_config.CONFIG_LOAD_RETRY_SECONDS,
+        retry_max_seconds: float = default_config.CONFIG_LOAD_RETRY_MAX_SECONDS,
+    ):
+        """
+        Фонова задача: завантажити конфіг, щойно БД стане доступною
+        (повтори з наростаючою затримкою), потім перечитувати раз на TTL.
+        """
+        delay = retry_seconds
+
+        while True:
+            if self.loaded:
+                await asyncio.sleep(self._cache_ttl_seconds)
+
+            try:
+                async with session_factory() as db:
+                    async with self._lock:
+                        self._set_snapshot(await self._load(db))
+            except Exception as e:
+                logger.warning(f"Could not load config from database, retrying in {delay}s: {e}")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, retry_max_seconds)
+                continue
+
+            delay = retry_seconds
+
+    async def reload(self, db: AsyncSession) -> Dict[str, Any]:
+        """Перечитати БД (напр. після ручної зміни) і розіслати іншим воркерам"""
+        async with self._lock:
+            config_dict = await self._load(db)
+            self._set_snapshot(config_dict)
+            self._publish(config_dict)
             return config_dict
+
+    async def _load(self, db: AsyncSession) -> Dict[str, Any]:
+        """
+        Конфіг з БД; якщо в БД немає - дефолти з config.py (і зберегти їх).
+        Помилка БД піднімається - викликач вирішує, що робити.
+        """
+        stmt = select(SystemConfigDB).limit(1)
+        result = await db.execute(stmt)
+        db_config = result.scalar_one_or_none()
+
+        if db_config:
+            config_dict = db_config.to_dict()
+            logger.debug("Loaded config from database")
+        else:
+            # Якщо в БД нічого немає - створюємо дефолт
+            config_dict = self._get_default_config_dict()
+            logger.info("No config in database, using defaults")
+
+            # Зберігаємо дефолт в БД
+            db_config = SystemConfigDB(**config_dict)
+            db.add(db_config)
+            await db.commit()
+            logger.info("Default config saved to database")
+
+        return config_dict
     
     async def update_config(self, db: AsyncSession, updates: Dict[str, Any]) -> Dict[str, Any]:
         """
@@ -87,12 +183,13 @@ class ConfigManager:
                 db.add(db_config)
                 await db.commit()
                 
-                # Інвалідуємо кеш
-                self._cache = None
-                self._cache_time = None
+                # Новий знімок - одразу тут і на інших воркерах
+                config_dict = db_config.to_dict()
+                self._set_snapshot(config_dict)
+                self._publish(config_dict)
                 
                 logger.info(f"Config updated: {updates}")
-                return db_config.to_dict()
+                return config_dict
                 
             except Exception as e:
                 logger.error(f"Error updating config: {e}")
@@ -116,11 +213,14 @@ class ConfigManager:
             "auth_cleanup_interval_seconds": default_config.AUTH_CLEANUP_INTERVAL_SECONDS,
             "device_not_returned_hours": default_config.DEVICE_NOT_RETURNED_HOURS,
             "allow_registration_without_login": default_config.ALLOW_REGISTRATION_WITHOUT_LOGIN,
+            "scan_dedup_window_ms": default_config.SCAN_DEDUP_WINDOW_MS,
         }
     
     def invalidate_cache(self):
-        """Инвалідувати кеш"""
-        self._cache = None
+        """
+        Инвалідувати кеш: наступний get_config перечитає БД.
+        Знімок лишається до перечитування, щоб гарячі шляхи не бачили дефолтів.
+        """
         self._cache_time = None
 
 
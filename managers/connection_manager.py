@@ -1,61 +1,339 @@
+import asyncio
+import json
 import logging
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Iterable, Optional, Set
 from fastapi import WebSocket
 
+from config import DEVICE_LIST_DEBOUNCE_SECONDS, WS_SEND_QUEUE_SIZE, WS_SEND_TIMEOUT_SECONDS
+
 logger = logging.getLogger(__name__)
 
 
+def serialize(payload: Dict[str, Any]) -> str:
+    """Серіалізувати повідомлення один раз для всіх отримувачів"""
+    return json.dumps(payload, ensure_ascii=False, separators=(",", ":"))
+
+
 class ConnectionManager:
-    def __init__(self, device_manager):
+    def __init__(
+        self,
+        device_manager,
+        queue_size: int = WS_SEND_QUEUE_SIZE,
+        send_timeout: float = WS_SEND_TIMEOUT_SECONDS,
+        device_list_debounce: float = DEVICE_LIST_DEBOUNCE_SECONDS
+    ):
         self.device_manager = device_manager
         self.connections: Dict[WebSocket, Optional[str]] = {}
+        # зворотний індекс: device_id -> websockets, підписані на цей ESP
+        self._subscribers: Dict[str, Set[WebSocket]] = {}
+
+        # Кожне з'єднання має власну обмежену чергу і задачу-відправника:
+        # broadcast лише кладе текст у черги і ніколи не чекає на браузер
+        self.queue_size = queue_size
+        self.send_timeout = send_timeout
+        self._queues: Dict[WebSocket, asyncio.Queue] = {}
+        self._senders: Dict[WebSocket, asyncio.Task] = {}
+
+        # зміни списку пристроїв збираються за вікно і йдуть однією дельтою
+        self.device_list_debounce = device_list_debounce
+        self._device_list_task: Optional[asyncio.Task] = None
+
+        # Кілька воркерів: WebSocket-и живуть у своєму процесі, тому розсилки
+        # публікуються, а підписки інших воркерів рахуються тут
+        # (device_id -> worker -> кількість)
+        self.shared_state = None
+        self._remote_subscribers: Dict[str, Dict[str, int]] = {}
+
+        # адмін-панелі, що слухають лічильники дашборду
+        self._dashboard_watchers: Set[WebSocket] = set()
+
+        # постійні з'єднання зчитувачів ESP: device_id -> websocket
+        self.readers: Dict[str, WebSocket] = {}
+
+    def attach_shared_state(self, shared_state):
+        self.shared_state = shared_state
+        shared_state.register("ws", self._apply_remote)
+        # дані ESP, прийняті іншим воркером, змінюють і наш список пристроїв
+        shared_state.register("devices", lambda op, data, origin: self._schedule_device_list())
+        # повні лічильники підписок з кожним heartbeat: записи впалого воркера
+        # зникають за TTL, втрачені subscribed/unsubscribed - виправляються
+        shared_state.register_heartbeat("ws", self._subscriber_counts)
+        shared_state.on_worker_down(self._drop_worker)
+
+    def _replicate(self, op: str, **data):
+        if self.shared_state:
+            self.shared_state.publish("ws", op, **data)
+
+    def _apply_remote(self, op: str, data: dict, origin: str):
+        if op == "device_data":
+            self._enqueue_all(self._subscribers.get(data["device_id"], ()), data["text"])
+        elif op == "all":
+            self._enqueue_all(self.connections.keys(), data["text"])
+        elif op == "subscribed":
+            counts = self._remote_subscribers.setdefault(data["device_id"], {})
+            counts[origin] = counts.get(origin, 0) + 1
+        elif op == "unsubscribed":
+            counts = self._remote_subscribers.get(data["device_id"], {})
+            if counts.get(origin, 0) > 1:
+                counts[origin] -= 1
+            else:
+                counts.pop(origin, None)
+                if not counts:
+                    self._remote_subscribers.pop(data["device_id"], None)
+        elif op == "unsubscribe_user":
+            self._unsubscribe_user(data["user_id"])
+        elif op == "heartbeat":
+            self._drop_worker(origin)
+            for device_id, count in data["subscribers"].items():
+                self._remote_subscribers.setdefault(device_id, {})[origin] = count
+
+    def _subscriber_counts(self) -> Dict[str, Any]:
+        return {
+            "subscribers": {
+                device_id: len(sockets) for device_id, sockets in self._subscribers.items()
+            }
+        }
+
+    def _drop_worker(self, origin: str):
+        """Забути підписки воркера (завершився або не шле heartbeat)"""
+        for device_id in list(self._remote_subscribers):
+            counts = self._remote_subscribers[device_id]
+            counts.pop(origin, None)
+            if not counts:
+                del self._remote_subscribers[device_id]
 
     async def connect(self, websocket: WebSocket):
         await websocket.accept()
         self.connections[websocket] = None
+        self._queues[websocket] = asyncio.Queue(maxsize=self.queue_size)
+        self._senders[websocket] = asyncio.create_task(self._sender(websocket))
 
     def disconnect(self, websocket: WebSocket):
-        self.connections.pop(websocket, None)
+        self._remove_subscriber(websocket, self.connections.pop(websocket, None))
+        self._dashboard_watchers.discard(websocket)
+        self._queues.pop(websocket, None)
+
+        sender = self._senders.pop(websocket, None)
+        if sender and sender is not asyncio.current_task():
+            sender.cancel()
 
     def subscribe(self, websocket: WebSocket, device_id: str):
+        self._remove_subscriber(websocket, self.connections.get(websocket))
         self.connections[websocket] = device_id
+        self._subscribers.setdefault(device_id, set()).add(websocket)
+        self._replicate("subscribed", device_id=device_id)
         logger.info("Subscribed to %s", device_id)
 
     def unsubscribe(self, websocket: WebSocket):
+        if websocket not in self.connections:
+            return
+        self._remove_subscriber(websocket, self.connections[websocket])
         self.connections[websocket] = None
         logger.info("Unsubscribed")
 
+    def _remove_subscriber(self, websocket: WebSocket, device_id: Optional[str]):
+        if device_id is None:
+            return
+        subscribers = self._subscribers.get(device_id)
+        if subscribers is not None and websocket in subscribers:
+            subscribers.discard(websocket)
+            if not subscribers:
+                del self._subscribers[device_id]
+            self._replicate("unsubscribed", device_id=device_id)
+
+    def unsubscribe_user(self, user_id: int):
+        """Відписати всі WebSocket-и користувача (на всіх воркерах)"""
+        self._unsubscribe_user(user_id)
+        self._replicate("unsubscribe_user", user_id=user_id)
+
+    def _unsubscribe_user(self, user_id: int):
+        for ws in list(self.connections.keys()):
+            # websocket не знає user_id напряму
+            # але можна зберегти його в ws.state
+            if getattr(ws, "user_id", None) == user_id:
+                self.unsubscribe(ws)
+
+    def subscribers(self, device_id: str) -> Set[WebSocket]:
+        """WebSocket-и, підписані на ESP (без перебору всіх з'єднань)"""
+        return self._subscribers.get(device_id, set())
+
+    def has_subscribers(self, device_id: str) -> bool:
+        """Чи слухає ESP хтось на цьому або іншому воркері"""
+        return bool(self._subscribers.get(device_id) or self._remote_subscribers.get(device_id))
+
+    # ===============================
+    # SENDING
+    # ===============================
+
+    async def _sender(self, websocket: WebSocket):
+        queue = self._queues[websocket]
+
+        try:
+            while True:
+                text = await queue.get()
+                await asyncio.wait_for(
+                    websocket.send_text(text),
+                    timeout=self.send_timeout
+                )
+        except asyncio.CancelledError:
+            raise
+        except Exception as exc:
+            # таймаут або мертве з'єднання
+            logger.warning("WebSocket send failed, removing connection: %r", exc)
+            await self._evict(websocket)
+
+    async def _evict(self, websocket: WebSocket):
+        self.disconnect(websocket)
+        try:
+            await asyncio.wait_for(websocket.close(), timeout=self.send_timeout)
+        except Exception:
+            pass
+
+    def _enqueue(self, websocket: WebSocket, text: str):
+        queue = self._queues.get(websocket)
+        if queue is None:
+            return
+
+        try:
+            queue.put_nowait(text)
+        except asyncio.QueueFull:
+            # клієнт не встигає читати - відключаємо, щоб не тримати пам'ять
+            logger.warning("WebSocket send queue full, removing slow connection")
+            self.disconnect(websocket)
+            asyncio.create_task(self._evict(websocket))
+
+    def _enqueue_all(self, websockets: Iterable[WebSocket], text: str):
+        for ws in list(websockets):
+            self._enqueue(ws, text)
+
+    def _fan_out(self, websockets: Iterable[WebSocket], payload: Dict[str, Any]) -> str:
+        text = serialize(payload)
+        self._enqueue_all(websockets, text)
+        return text
+
     async def send_json(self, websocket: WebSocket, payload: Dict[str, Any]):
-        await websocket.send_json(payload)
+        self._enqueue(websocket, serialize(payload))
+
+    # ===============================
+    # DEVICE LIST
+    # ===============================
+
+    async def send_device_list(self, websocket: WebSocket):
+        """Повний знімок списку пристроїв одному клієнту (з кешованих фрагментів)"""
+        self._enqueue(websocket, (
+            f'{{"type":"device_list","version":{self.device_manager.version},'
+            f'"data":{self.device_manager.get_device_list_json()}}}'
+        ))
 
     async def broadcast_device_list(self):
-        payload = {
-            "type": "device_list",
-            "data": self.device_manager.get_all_devices_status(),
-        }
-        for ws in list(self.connections.keys()):
-            await ws.send_json(payload)
+        """Запланувати дельту списку пристроїв (не частіше ніж раз за вікно)"""
+        self._schedule_device_list()
+
+    def _schedule_device_list(self):
+        # кожен воркер будує дельти зі своєї копії DeviceManager
+        if self._device_list_task is None or self._device_list_task.done():
+            self._device_list_task = asyncio.create_task(self._flush_device_list_later())
+
+    async def _flush_device_list_later(self):
+        await asyncio.sleep(self.device_list_debounce)
+        # зміни під час відправки заплановують наступну дельту
+        self._device_list_task = None
+        self.flush_device_list()
+
+    def flush_device_list(self):
+        delta = self.device_manager.pop_changes()
+        if delta is None:
+            return
+
+        # панелі дашборду отримують лише лічильники
+        self._fan_out(
+            (ws for ws in self.connections if ws not in self._dashboard_watchers),
+            {"type": "device_list_delta", **delta}
+        )
 
     async def broadcast_device_data(self, device_id: str, payload: Dict[str, Any]):
-        for ws, subscribed in self.connections.items():
-            if subscribed == device_id:
-                await ws.send_json(payload)
+        subscribers = self._subscribers.get(device_id)
+        remote = self._remote_subscribers.get(device_id)
+        if not subscribers and not remote:
+            return
+
+        text = self._fan_out(subscribers or (), payload)
+        if remote:
+            self._replicate("device_data", device_id=device_id, text=text)
+
+    def notify_local_subscribers(self, device_id: str, payload: Dict[str, Any]):
+        """
+        Лише WebSocket-и цього воркера: події дедлайнів кожен воркер
+        генерує сам зі своєї копії стану, тому вони не публікуються.
+        """
+        subscribers = self._subscribers.get(device_id)
+        if subscribers:
+            self._fan_out(subscribers, payload)
 
     async def broadcast_to_all(self, message_type: str, data: Dict[str, Any]):
         payload = {
             "type": message_type,
             "data": data
         }
+        text = self._fan_out(self.connections.keys(), payload)
+        self._replicate("all", text=text)
 
-        disconnected = []
+    # ===============================
+    # DASHBOARD
+    # ===============================
 
-        for ws in list(self.connections.keys()):
+    def watch_dashboard(self, websocket: WebSocket):
+        if websocket in self.connections:
+            self._dashboard_watchers.add(websocket)
+
+    def broadcast_dashboard(self, snapshot: Dict[str, Any]):
+        """
+        Слухач DashboardStats: нові лічильники панелям цього воркера.
+        Кожен воркер розсилає власний знімок (після перечитування з БД).
+        """
+        self._fan_out(self._dashboard_watchers, {"type": "dashboard_stats", "data": snapshot})
+
+    # ===============================
+    # READERS (ESP32)
+    # ===============================
+
+    async def connect_reader(self, device_id: str, websocket: WebSocket):
+        """Нове з'єднання зчитувача витісняє попереднє (перепідключення після обриву)"""
+        await websocket.accept()
+        previous = self.readers.get(device_id)
+        self.readers[device_id] = websocket
+        if previous is not None:
+            try:
+                await previous.close()
+            except RuntimeError:
+                pass
+
+    def disconnect_reader(self, device_id: str, websocket: WebSocket) -> bool:
+        """False - з'єднання вже витіснене новим, пристрій лишається онлайн"""
+        if self.readers.get(device_id) is not websocket:
+            return False
+        del self.readers[device_id]
+        return True
+
+    async def send_to_reader(self, device_id: str, payload: Dict[str, Any]) -> bool:
+        websocket = self.readers.get(device_id)
+        if websocket is None:
+            return False
+        try:
+            await asyncio.wait_for(websocket.send_text(serialize(payload)), timeout=self.send_timeout)
+        except Exception:
+            return False
+        return True
+
+    async def shutdown(self):
+        """Зупинити відправників (завершення додатку)"""
+        if self._device_list_task:
+            self._device_list_task.cancel()
+        for websocket in list(self.connections):
+            self.disconnect(websocket)
+        for websocket in list(self.readers.values()):
             try:
-                await ws.send_json(payload)
-            except Exception as exc:
-                logger.warning("WebSocket error, removing connection: %s", exc)
-                disconnected.append(ws)
-
-        # Очистка мертвих з'єднань
-        for ws in disconnected:
-            self.disconnect(ws)
\ No newline at end of file
+                await websocket.close()
+            except RuntimeError:
+                pass
+        self.readers.clear()
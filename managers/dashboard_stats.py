@@ -0,0 +1,289 @@
+"""Лічильники дашборду, що оновлюються інкрементально"""
+import asyncio
+import logging
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from config import DASHBOARD_PUSH_DEBOUNCE_SECONDS
+from managers.rfid_index import rfid_index
+from models.db_device import DeviceDB, DeviceType
+from models.db_employee import EmployeeDB
+
+logger = logging.getLogger(__name__)
+
+# Внесок пристрою в лічильники: (type, enabled, employee_id, department)
+Contribution = Tuple[str, bool, Optional[int], Optional[str]]
+
+
+class DashboardStats:
+    """
+    Матеріалізовані агрегати дашборду.
+
+    Кожен пристрій дає внесок у лічильники (тип / enabled / відділ власника).
+    Зміна пристрою чи працівника в rfid_index забирає старий внесок і додає
+    новий - без перерахунку по всій таблиці. Після змін слухачі отримують
+    новий знімок (не частіше ніж раз за debounce_seconds).
+
+    Кілька воркерів: воркер, на якому сталася зміна, публікує "changed";
+    інші перечитують лічильники з БД (одним запитом за вікно debounce),
+    тож розбіжність з індексом іншого воркера не накопичується.
+    """
+
+    def __init__(self, index=rfid_index, debounce_seconds: float = DASHBOARD_PUSH_DEBOUNCE_SECONDS):
+        self.index = index
+        self.debounce_seconds = debounce_seconds
+        self.loaded = False
+
+        self._contributions: Dict[int, Contribution] = {}
+        self._counts: Dict[Tuple[bool, str], int] = {}
+        self._departments: Dict[Optional[str], Dict[str, int]] = {}
+        # відділ -> працівник -> кількість його пристроїв (для distinct працівників)
+        self._department_employees: Dict[Optional[str], Dict[int, int]] = {}
+
+        self._listeners: List[Callable[[Dict[str, Any]], None]] = []
+        self._push_task: Optional[asyncio.Task] = None
+        self._local_change = False
+        self._reload_task: Optional[asyncio.Task] = None
+        self.shared_state = None
+
+    def attach_shared_state(self, shared_state):
+        """Зміни на інших воркерах - перечитування лічильників з БД"""
+        self.shared_state = shared_state
+        shared_state.register("dashboard", self._apply_remote)
+        shared_state.on_reconnect(self.schedule_reload)
+
+    def _apply_remote(self, op: str, data: dict, origin: str):
+        if op == "changed":
+            self.schedule_reload()
+
+    def schedule_reload(self):
+        """Перечитати лічильники з БД (зміни за debounce_seconds - одним запитом)"""
+        if self._reload_task is not None and not self._reload_task.done():
+            return
+
+        try:
+            self._reload_task = asyncio.get_running_loop().create_task(self._reload_later())
+        except RuntimeError:
+            self.loaded = False
+
+    async def _reload_later(self):
+        from db.session import async_session
+
+        await asyncio.sleep(self.debounce_seconds)
+        self._reload_task = None
+        try:
+            async with async_session() as db:
+                await self.load(db)
+        except Exception:
+            logger.exception("Dashboard reload failed")
+            # наступний get_snapshot спробує ще раз
+            self.loaded = False
+            return
+
+        self._notify_listeners()
+
+    # ===============================
+    # LOADING
+    # ===============================
+    async def load(self, db: AsyncSession):
+        """Один запит: усі пристрої з відділом власника"""
+        result = await db.execute(
+            select(
+                DeviceDB.id, DeviceDB.type, DeviceDB.enabled,
+                DeviceDB.employee_id, EmployeeDB.department
+            )
+            .outerjoin(EmployeeDB, EmployeeDB.id == DeviceDB.employee_id)
+        )
+        self._rebuild(
+            (device_id, (device_type.value, enabled, employee_id, department if employee_id else None))
+            for device_id, device_type, enabled, employee_id, department in result
+        )
+
+    async def get_snapshot(self, db: AsyncSession) -> Dict[str, Any]:
+        if not self.loaded:
+            await self.load(db)
+        return self.snapshot()
+
+    def _rebuild_from_index(self):
+        if not self.index.loaded:
+            self._rebuild(())
+            self.loaded = False
+            return
+
+        self._rebuild(
+            (device_id, self._contribution_from_index(device_id))
+            for device_id in list(self.index._devices_by_id)
+        )
+
+    def _rebuild(self, contributions):
+        self._contributions.clear()
+        self._counts.clear()
+        self._departments.clear()
+        self._department_employees.clear()
+
+        for device_id, contribution in contributions:
+            self._set(device_id, contribution)
+
+        self.loaded = True
+
+    # ===============================
+    # INCREMENTAL UPDATES
+    # ===============================
+    def on_index_change(self, kind: str, key: Optional[int]):
+        """Слухач rfid_index"""
+        if kind == "loaded":
+            # перезавантаження індексу (старт, імпорт інвентаря): індекси
+            # інших воркерів перезавантажуються самі, публікувати нічого
+            self._rebuild_from_index()
+            self._schedule_push()
+            return
+
+        if not self.index.applying_remote:
+            # зміна з цього воркера - іншим воркерам треба перечитати лічильники
+            self._local_change = True
+
+        if not self.loaded:
+            return
+
+        if kind == "device":
+            self._set(key, self._contribution_from_index(key))
+        elif kind == "employee":
+            for device in self.index.devices_of(key):
+                self._set(device.id, self._contribution_from_index(device.id))
+        else:
+            return
+
+        self._schedule_push()
+
+    def _contribution_from_index(self, device_id: int) -> Optional[Contribution]:
+        device = self.index.get_device(device_id)
+        if device is None:
+            return None
+
+        department = None
+        if device.employee_id is not None:
+            employee = self.index.get_employee(device.employee_id)
+            if employee is not None:
+                department = employee.department
+            else:
+                # працівника ще немає в індексі - лишаємо відомий відділ
+                previous = self._contributions.get(device_id)
+                department = previous[3] if previous else None
+
+        return (DeviceType(device.type).value, bool(device.enabled), device.employee_id, department)
+
+    def _set(self, device_id: int, contribution: Optional[Contribution]):
+        previous = self._contributions.pop(device_id, None)
+        if previous == contribution:
+            if contribution is not None:
+                self._contributions[device_id] = contribution
+            return
+
+        if previous is not None:
+            self._apply(previous, -1)
+        if contribution is not None:
+            self._contributions[device_id] = contribution
+            self._apply(contribution, 1)
+
+    def _apply(self, contribution: Contribution, delta: int):
+        device_type, enabled, employee_id, department = contribution
+
+        key = (enabled, device_type)
+        self._counts[key] = self._counts.get(key, 0) + delta
+
+        # відділи - лише активні пристрої, закріплені за працівником
+        if not enabled or employee_id is None:
+            return
+
+        counters = self._departments.setdefault(
+            department, {"devices": 0, "scanners": 0, "printers": 0}
+        )
+        counters["devices"] += delta
+        counters[f"{device_type}s"] += delta
+
+        employees = self._department_employees.setdefault(department, {})
+        employees[employee_id] = employees.get(employee_id, 0) + delta
+        if employees[employee_id] <= 0:
+            del employees[employee_id]
+
+        if counters["devices"] <= 0:
+            del self._departments[department]
+            self._department_employees.pop(department, None)
+
+    # ===============================
+    # SNAPSHOT
+    # ===============================
+    def snapshot(self) -> Dict[str, Any]:
+        """Та сама форма, що й відповідь /admin/api/dashboard"""
+
+        def by_type(enabled: bool) -> Dict[str, int]:
+            return {
+                device_type.value: self._counts.get((enabled, device_type.value), 0)
+                for device_type in DeviceType
+            }
+
+        types = by_type(True)
+        disabled_types = by_type(False)
+
+        return {
+            "devices": {
+                "available": sum(types.values()),
+                "disabled": sum(disabled_types.values()),
+                "by_type": types,
+                "disabled_by_type": disabled_types
+            },
+            "departments": [
+                {
+                    "department": department or "Brak",
+                    "employees": len(self._department_employees.get(department, {})),
+                    "devices": counters["devices"],
+                    "scanners": counters["scanners"],
+                    "printers": counters["printers"],
+                }
+                for department, counters in sorted(
+                    self._departments.items(), key=lambda item: item[0] or ""
+                )
+            ]
+        }
+
+    # ===============================
+    # PUSH
+    # ===============================
+    def add_listener(self, callback: Callable[[Dict[str, Any]], None]):
+        """callback(snapshot) - після змін (з debounce)"""
+        self._listeners.append(callback)
+
+    def _schedule_push(self):
+        if self._push_task is not None and not self._push_task.done():
+            return
+
+        try:
+            self._push_task = asyncio.get_running_loop().create_task(self._push_later())
+        except RuntimeError:
+            # поза циклом подій (скрипти, тести) - нема кому відправляти
+            pass
+
+    async def _push_later(self):
+        await asyncio.sleep(self.debounce_seconds)
+        self._push_task = None
+
+        self._notify_listeners()
+
+        if self._local_change and self.shared_state is not None:
+            self.shared_state.publish("dashboard", "changed")
+        self._local_change = False
+
+    def _notify_listeners(self):
+        snapshot = self.snapshot()
+        for listener in self._listeners:
+            try:
+                listener(snapshot)
+            except Exception:
+                logger.exception("Dashboard listener failed")
+
+
+# Глобальний екземпляр
+dashboard_stats = DashboardStats()
+rfid_index.add_listener(dashboard_stats.on_index_change)
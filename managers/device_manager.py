@@ -1,7 +1,7 @@
 """Менеджер пристроїв ESP32"""
 import logging
-from typing import Any, Dict, Optional
-from datetime import datetime, timedelta
+import time
+from typing import Any, Dict, Optional, Set
 from models.device import Device
 
 logger = logging.getLogger(__name__)
@@ -13,36 +13,122 @@ class DeviceManager:
     def __init__(self, timeout_minutes: int = 5):
         self.devices: Dict[str, Device] = {}
         self.timeout_minutes = timeout_minutes
+
+        # Версія списку пристроїв і зміни з моменту останньої дельти
+        self.version = 0
+        self._changed: Set[str] = set()
+        self._removed: Set[str] = set()
+        self.shared_state = None
+        self.scheduler = None
+
+    def attach_scheduler(self, scheduler):
+        """Пристрій зникає рівно через timeout_minutes після останніх даних"""
+        self.scheduler = scheduler
+        scheduler.register("device", self._remove_offline)
+
+    def _schedule(self, device: Device):
+        if self.scheduler is not None and device.seen_monotonic is not None:
+            left = device.seen_monotonic + self.timeout_minutes * 60 - time.monotonic()
+            self.scheduler.schedule("device", device.id, left)
+
+    def attach_shared_state(self, shared_state):
+        """Отримувати дані ESP, які прийняли інші воркери"""
+        self.shared_state = shared_state
+        shared_state.register("devices", self._apply_remote)
+        shared_state.register_snapshot("devices", self._snapshot)
+
+    def _snapshot(self) -> Dict[str, Any]:
+        """Онлайн-пристрої з останніми даними (для нового воркера)"""
+        return {
+            "devices": {
+                device_id: device.latest_data.data if device.latest_data else None
+                for device_id, device in self.devices.items()
+                if device.is_online
+            }
+        }
+
+    def _apply_remote(self, op: str, data: dict, origin: str):
+        if op == "data":
+            self._update_local(data["device_id"], data["data"])
+        elif op == "touch":
+            self._touch_local(data["device_id"])
+        elif op == "offline":
+            self._remove_offline(data["device_id"])
+        elif op == "snapshot":
+            # час активності - момент знімка: дедлайн офлайну трохи зсувається
+            for device_id, latest in data["devices"].items():
+                if device_id in self.devices:
+                    continue
+                if latest is None:
+                    self._touch_local(device_id)
+                else:
+                    self._update_local(device_id, latest)
     
     def update_timeout(self, timeout_minutes: int):
         """Оновити таймаут для пристроїв"""
         self.timeout_minutes = timeout_minutes
+        for device in self.devices.values():
+            self._schedule(device)
         logger.info(f"Device timeout updated to {timeout_minutes} minutes")
         
     def register_device(self, device_id: str, name: Optional[str] = None) -> Device:
         """Зареєструвати новий пристрій"""
         if device_id not in self.devices:
             device = Device(device_id, name)
-            device.connected_at = datetime.now()
+            device.mark_connected()
             self.devices[device_id] = device
+            self._removed.discard(device_id)
             logger.info("Device registered: %s (%s)", device_id, device.name)
         else:
             device = self.devices[device_id]
-            device.is_online = True
-            device.connected_at = datetime.now()
-            
+            device.mark_connected()
+
+        self._changed.add(device_id)
         return device
     
     def update_device_data(self, device_id: str, data: dict) -> Device:
         """Оновити дані пристрою"""
+        device = self._update_local(device_id, data)
+        if self.shared_state:
+            self.shared_state.publish("devices", "data", device_id=device_id, data=data)
+        return device
+
+    def _update_local(self, device_id: str, data: dict) -> Device:
         if device_id not in self.devices:
             device = self.register_device(device_id)
         else:
             device = self.devices[device_id]
             
         device.update_data(data)
+        self._changed.add(device_id)
+        self._schedule(device)
         return device
     
+    def touch(self, device_id: str) -> Device:
+        """Heartbeat зчитувача: онлайн і новий дедлайн без зміни даних"""
+        device = self._touch_local(device_id)
+        if self.shared_state:
+            self.shared_state.publish("devices", "touch", device_id=device_id)
+        return device
+
+    def _touch_local(self, device_id: str) -> Device:
+        device = self.devices.get(device_id)
+        if device is None:
+            device = self.register_device(device_id)
+        elif not device.is_online:
+            self._changed.add(device_id)
+
+        device.touch()
+        self._schedule(device)
+        return device
+
+    def disconnect(self, device_id: str) -> Optional[Device]:
+        """Зчитувач закрив постійне з'єднання - офлайн одразу, без таймауту"""
+        device = self._remove_offline(device_id)
+        if device is not None and self.shared_state:
+            self.shared_state.publish("devices", "offline", device_id=device_id)
+        return device
+
     def get_device(self, device_id: str) -> Optional[Device]:
         """Отримати пристрій за ID"""
         return self.devices.get(device_id)
@@ -55,17 +141,17 @@ class DeviceManager:
         """Отримати тільки онлайн пристрої"""
         return {did: device for did, device in self.devices.items() if device.is_online}
     
-    def cleanup_offline_devices(self) -> Dict[str, Device]:
-        """Видалити пристрої, які не подавали ознак життя"""
-        offline_devices = {}
-        cutoff_time = datetime.now() - timedelta(minutes=self.timeout_minutes)
-        
-        for device_id, device in list(self.devices.items()):
-            if device.last_seen and device.last_seen < cutoff_time:
-                offline_devices[device_id] = self.devices.pop(device_id)
-                logger.info("Device removed (offline): %s", device_id)
-                
-        return offline_devices
+    def _remove_offline(self, device_id: str) -> Optional[Device]:
+        device = self.devices.pop(device_id, None)
+        if device is None:
+            return None
+
+        if self.scheduler is not None:
+            self.scheduler.cancel("device", device_id)
+        self._changed.discard(device_id)
+        self._removed.add(device_id)
+        logger.info("Device removed (offline): %s", device_id)
+        return device
     
     def get_device_status(self, device_id: str) -> Dict[str, Any]:
         """Отримати статус пристрою"""
@@ -87,4 +173,64 @@ class DeviceManager:
             "online_devices": online,
             "offline_devices": total - online,
             "devices": {did: device.to_dict() for did, device in self.devices.items()}
-        }
\ No newline at end of file
+        }
+
+    def get_device_list_snapshot(self) -> Dict[str, Any]:
+        """Повний список пристроїв для device_list (без latest_data)"""
+        online = len(self.get_online_devices())
+        total = len(self.devices)
+
+        return {
+            "total_devices": total,
+            "online_devices": online,
+            "offline_devices": total - online,
+            "devices": {did: device.to_summary() for did, device in self.devices.items()}
+        }
+
+    def get_device_list_json(self) -> str:
+        """
+        get_device_list_snapshot одразу JSON-текстом: незмінені пристрої
+        віддають кешований фрагмент, тож це лише склеювання рядків.
+        """
+        online = len(self.get_online_devices())
+        total = len(self.devices)
+        entries = ",".join([device.entry_json() for device in self.devices.values()])
+
+        return (
+            f'{{"total_devices":{total},"online_devices":{online},'
+            f'"offline_devices":{total - online},"devices":{{{entries}}}}}'
+        )
+
+    def pop_changes(self) -> Optional[Dict[str, Any]]:
+        """
+        Зміни списку з попередньої дельти; збільшує версію.
+        None - якщо нічого не змінилось.
+        """
+        if not self._changed and not self._removed:
+            return None
+
+        base_version = self.version
+        self.version += 1
+
+        online = len(self.get_online_devices())
+        total = len(self.devices)
+
+        delta = {
+            "base_version": base_version,
+            "version": self.version,
+            "data": {
+                "total_devices": total,
+                "online_devices": online,
+                "offline_devices": total - online,
+                "changed": {
+                    did: self.devices[did].to_summary()
+                    for did in self._changed
+                    if did in self.devices
+                },
+                "removed": sorted(self._removed),
+            }
+        }
+
+        self._changed.clear()
+        self._removed.clear()
+        return delta
@@ -0,0 +1,66 @@
+"""Хто з користувачів дозволив реєстрацію на якому ESP"""
+import logging
+from typing import Dict, Set
+
+logger = logging.getLogger(__name__)
+
+
+class EspAccessManager:
+    def __init__(self):
+        self.allowed: Dict[str, Set[int]] = {}  # esp_id -> user_id
+        self.shared_state = None
+
+    def attach_shared_state(self, shared_state):
+        """Ділити дозволи з іншими воркерами"""
+        self.shared_state = shared_state
+        shared_state.register("esp_access", self._apply_remote)
+        shared_state.register_snapshot(
+            "esp_access",
+            lambda: {"allowed": {esp_id: sorted(users) for esp_id, users in self.allowed.items()}}
+        )
+
+    def _replicate(self, op: str, **data):
+        if self.shared_state:
+            self.shared_state.publish("esp_access", op, **data)
+
+    def _apply_remote(self, op: str, data: dict, origin: str):
+        if op == "allow":
+            self._allow(data["esp_id"], data["user_id"])
+        elif op == "revoke":
+            self._revoke(data["esp_id"], data["user_id"])
+        elif op == "revoke_user":
+            self._revoke_user(data["user_id"])
+        elif op == "snapshot":
+            for esp_id, user_ids in data["allowed"].items():
+                for user_id in user_ids:
+                    self._allow(esp_id, user_id)
+
+    def users(self, esp_id: str) -> Set[int]:
+        return self.allowed.get(esp_id, set())
+
+    def allow(self, esp_id: str, user_id: int):
+        self._allow(esp_id, user_id)
+        self._replicate("allow", esp_id=esp_id, user_id=user_id)
+
+    def revoke(self, esp_id: str, user_id: int):
+        self._revoke(esp_id, user_id)
+        self._replicate("revoke", esp_id=esp_id, user_id=user_id)
+
+    def revoke_user(self, user_id: int):
+        """Прибрати користувача з усіх ESP (вихід із системи)"""
+        self._revoke_user(user_id)
+        self._replicate("revoke_user", user_id=user_id)
+
+    def _allow(self, esp_id: str, user_id: int):
+        self.allowed.setdefault(esp_id, set()).add(user_id)
+
+    def _revoke(self, esp_id: str, user_id: int):
+        users = self.allowed.get(esp_id)
+        if users is not None:
+            users.discard(user_id)
+            if not users:
+                self.allowed.pop(esp_id)
+
+    def _revoke_user(self, user_id: int):
+        for esp_id in list(self.allowed):
+            self._revoke(esp_id, user_id)
@@ -0,0 +1,99 @@
+"""Планувальник дедлайнів (сесії реєстрації, пристрої, сесії входу)"""
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple, Union
+
+logger = logging.getLogger(__name__)
+
+ExpiryCallback = Callable[[str], Union[None, Awaitable[None]]]
+
+
+class ExpiryScheduler:
+    """
+    Точні дедлайни для ключів замість періодичного перебору словників.
+
+    Купа (deadline, seq, namespace, key); перепланування не шукає старий
+    запис у купі - він просто стає застарілим і пропускається, коли дійде
+    до вершини (актуальний seq зберігається в _entries).
+    Час - time.monotonic().
+    """
+
+    def __init__(self):
+        self._heap: List[Tuple[float, int, str, str]] = []
+        self._entries: Dict[Tuple[str, str], Tuple[float, int]] = {}
+        self._callbacks: Dict[str, List[ExpiryCallback]] = {}
+        self._seq = itertools.count()
+        self._wakeup = asyncio.Event()
+
+    def register(self, namespace: str, callback: ExpiryCallback):
+        """callback(key) викликається, коли дедлайн ключа настав"""
+        self._callbacks.setdefault(namespace, []).append(callback)
+
+    def schedule(self, namespace: str, key: str, delay_seconds: float):
+        """Поставити (або перенести) дедлайн ключа через delay_seconds"""
+        deadline = time.monotonic() + max(0.0, delay_seconds)
+        seq = next(self._seq)
+        self._entries[(namespace, key)] = (deadline, seq)
+
+        wake = not self._heap or deadline < self._heap[0][0]
+        heapq.heappush(self._heap, (deadline, seq, namespace, key))
+        self._compact()
+        if wake:
+            self._wakeup.set()
+
+    def cancel(self, namespace: str, key: str):
+        self._entries.pop((namespace, key), None)
+
+    def time_left(self, namespace: str, key: str) -> Optional[float]:
+        entry = self._entries.get((namespace, key))
+        if entry is None:
+            return None
+        return max(0.0, entry[0] - time.monotonic())
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _pop_due(self, now: float) -> List[Tuple[str, str]]:
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            deadline, seq, namespace, key = heapq.heappop(self._heap)
+            if self._entries.get((namespace, key)) == (deadline, seq):
+                del self._entries[(namespace, key)]
+                due.append((namespace, key))
+        return due
+
+    def _compact(self):
+        # застарілих записів (перенесені дедлайни) значно більше, ніж живих -
+        # перебудувати купу; амортизовано O(1) на schedule
+        if len(self._heap) > 2 * len(self._entries) + 64:
+            self._heap = [
+                (deadline, seq, namespace, key)
+                for (namespace, key), (deadline, seq) in self._entries.items()
+            ]
+            heapq.heapify(self._heap)
+
+    async def _fire(self, namespace: str, key: str):
+        for callback in self._callbacks.get(namespace, ()):
+            try:
+                result = callback(key)
+                if asyncio.iscoroutine(result):
+                    await result
+            except Exception:
+                logger.exception("Expiry callback failed for %s/%s", namespace, key)
+
+    async def run(self):
+        """Фонова задача: спить до найближчого дедлайну"""
+        while True:
+            self._wakeup.clear()
+
+            for namespace, key in self._pop_due(time.monotonic()):
+                await self._fire(namespace, key)
+
+            timeout = self._heap[0][0] - time.monotonic() if self._heap else None
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
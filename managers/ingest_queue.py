@@ -0,0 +1,133 @@
+"""Черги даних ESP32: відповідь одразу, обробка - фоном і по порядку"""
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict
+
+from config import (
+    ESP_INGEST_QUEUE_SIZE,
+    ESP_INGEST_WORKER_IDLE_SECONDS,
+    ESP_INGEST_SHUTDOWN_SECONDS,
+)
+
+logger = logging.getLogger(__name__)
+
+IngestHandler = Callable[[str, Dict[str, Any]], Awaitable[None]]
+
+
+class IngestQueueFull(Exception):
+    """Черга зчитувача заповнена - ESP має повторити пізніше"""
+
+
+class IngestQueue:
+    """
+    Обмежена черга asyncio на кожен зчитувач і один воркер на чергу:
+    скани одного ESP обробляються строго по черзі, повільна БД
+    не тримає HTTP-запит ESP. Воркер завершується після
+    idle_seconds без даних і з'являється знову з першим сканом.
+
+    Черги - локальні для воркера uvicorn (не реплікуються через
+    SharedState): порядок гарантовано для сканів, що прийшли на цей воркер.
+    """
+
+    def __init__(
+        self,
+        handler: IngestHandler,
+        queue_size: int = ESP_INGEST_QUEUE_SIZE,
+        idle_seconds: float = ESP_INGEST_WORKER_IDLE_SECONDS,
+    ):
+        self.handler = handler
+        self.queue_size = queue_size
+        self.idle_seconds = idle_seconds
+        self.running = False
+
+        self._queues: Dict[str, asyncio.Queue] = {}
+        self._workers: Dict[str, asyncio.Task] = {}
+
+        self.processed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.max_depth = 0
+
+    def start(self):
+        self.running = True
+
+    def submit(self, device_id: str, data: Dict[str, Any]):
+        """Поставити дані в чергу зчитувача (без очікування)"""
+        queue = self._queues.get(device_id)
+        if queue is None:
+            queue = self._queues[device_id] = asyncio.Queue(maxsize=self.queue_size)
+
+        try:
+            queue.put_nowait(data)
+        except asyncio.QueueFull:
+            self.rejected += 1
+            raise IngestQueueFull(device_id)
+
+        self.max_depth = max(self.max_depth, queue.qsize())
+
+        worker = self._workers.get(device_id)
+        if worker is None or worker.done():
+            self._workers[device_id] = asyncio.create_task(self._worker(device_id, queue))
+
+    async def _worker(self, device_id: str, queue: asyncio.Queue):
+        while True:
+            try:
+                data = await asyncio.wait_for(queue.get(), timeout=self.idle_seconds)
+            except asyncio.TimeoutError:
+                if queue.empty():
+                    # зчитувач мовчить - звільнити задачу і чергу
+                    self._workers.pop(device_id, None)
+                    self._queues.pop(device_id, None)
+                    return
+                continue
+
+            try:
+                await self.handler(device_id, data)
+                self.processed += 1
+            except Exception:
+                self.failed += 1
+                logger.exception("ESP data processing failed for %s", device_id)
+            finally:
+                queue.task_done()
+
+    async def join(self, device_id: str):
+        """Дочекатися обробки всього, що вже стоїть у черзі зчитувача"""
+        queue = self._queues.get(device_id)
+        if queue is not None:
+            await queue.join()
+
+    def depth(self) -> int:
+        return sum(queue.qsize() for queue in self._queues.values())
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "running": self.running,
+            "readers": len(self._workers),
+            "depth": self.depth(),
+            "max_depth": self.max_depth,
+            "queue_size": self.queue_size,
+            "by_reader": {
+                device_id: queue.qsize()
+                for device_id, queue in self._queues.items()
+                if queue.qsize()
+            },
+            "processed": self.processed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+        }
+
+    async def shutdown(self, timeout: float = ESP_INGEST_SHUTDOWN_SECONDS):
+        """Дообробити те, що вже в чергах (не довше timeout), і зупинити воркери"""
+        self.running = False
+
+        pending = [queue.join() for queue in self._queues.values()]
+        if pending:
+            try:
+                await asyncio.wait_for(asyncio.gather(*pending), timeout=timeout)
+            except asyncio.TimeoutError:
+                logger.warning("ESP ingest queues not drained: %s items dropped", self.depth())
+
+        for worker in self._workers.values():
+            worker.cancel()
+        self._workers.clear()
+        self._queues.clear()
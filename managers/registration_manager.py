@@ -1,55 +1,146 @@
 from datetime import datetime, timedelta, timezone
 import logging
+from typing import Optional
+
+from managers.rfid_index import EmployeeEntry
 
 logger = logging.getLogger(__name__)
 
 class RegistrationSession:
-    def __init__(self, employee):
+    def __init__(self, employee, started_at: Optional[datetime] = None):
         self.employee = employee
-        self.started_at = datetime.now(timezone.utc)
+        self.started_at = started_at or datetime.now(timezone.utc)
 
-    def touch(self):
-        self.started_at = datetime.now(timezone.utc)
+    def touch(self, at: Optional[datetime] = None):
+        self.started_at = at or datetime.now(timezone.utc)
 
 class RegistrationManager:
     def __init__(self, timeout_seconds: int = 7):
         self.sessions: dict[str, RegistrationSession] = {}
         self.timeout = timedelta(seconds=timeout_seconds)
+        self.shared_state = None
+        self.scheduler = None
+
+    def attach_scheduler(self, scheduler):
+        """Точний дедлайн кожної сесії (ExpiryScheduler)"""
+        self.scheduler = scheduler
+        scheduler.register("registration", self._expire)
+
+    def _schedule(self, esp_id: str, session: RegistrationSession):
+        if self.scheduler is not None:
+            left = session.started_at + self.timeout - datetime.now(timezone.utc)
+            self.scheduler.schedule("registration", esp_id, left.total_seconds())
+
+    def _expire(self, esp_id: str):
+        self.sessions.pop(esp_id, None)
+
+    def attach_shared_state(self, shared_state):
+        """Ділити сесії з іншими воркерами (ESP може потрапити на будь-який)"""
+        self.shared_state = shared_state
+        shared_state.register("registration", self._apply_remote)
+        # новий воркер отримує вже відкриті сесії
+        shared_state.register_snapshot("registration", self._snapshot)
+
+    def _replicate(self, op: str, **data):
+        if self.shared_state:
+            self.shared_state.publish("registration", op, **data)
+
+    def _snapshot(self) -> dict:
+        return {
+            "sessions": [
+                self._session_data(esp_id, session)
+                for esp_id, session in list(self.sessions.items())
+                if self.get(esp_id) is not None
+            ]
+        }
+
+    def _apply_remote(self, op: str, data: dict, origin: str):
+        if op == "snapshot":
+            for item in data["sessions"]:
+                local = self.sessions.get(item["esp_id"])
+                if local is None or local.started_at < datetime.fromisoformat(item["started_at"]):
+                    self._apply_remote("start", item, origin)
+            return
+
+        esp_id = data["esp_id"]
+
+        if op == "start":
+            session = RegistrationSession(EmployeeEntry(**data["employee"]))
+            session.started_at = datetime.fromisoformat(data["started_at"])
+            self.sessions[esp_id] = session
+            self._schedule(esp_id, session)
+        elif op == "touch":
+            session = self.sessions.get(esp_id)
+            if session:
+                session.started_at = datetime.fromisoformat(data["started_at"])
+                self._schedule(esp_id, session)
+        elif op == "end":
+            self._end_local(esp_id)
 
     def update_timeout(self, timeout_seconds: int):
         """Оновити таймаут для реєстрації"""
         self.timeout = timedelta(seconds=timeout_seconds)
+        for esp_id, session in self.sessions.items():
+            self._schedule(esp_id, session)
         logger.info(f"Registration timeout updated to {timeout_seconds} seconds")
 
-    def start_or_replace(self, esp_id: str, employee):
-        self.sessions[esp_id] = RegistrationSession(employee)
+    def start_or_replace(self, esp_id: str, employee, at: Optional[datetime] = None):
+        """at - час скану з буфера ESP (сесія відкрита тоді, а не зараз)"""
+        self._start(esp_id, RegistrationSession(employee, at))
+
+    def restore(self, esp_id: str, employee, started_at: datetime):
+        """Повернути попередню сесію (відкат пачки сканів)"""
+        self._start(esp_id, RegistrationSession(employee, started_at))
+
+    def _start(self, esp_id: str, session: RegistrationSession):
+        self.sessions[esp_id] = session
+        self._schedule(esp_id, session)
+        self._replicate("start", **self._session_data(esp_id, session))
 
-    def get(self, esp_id: str):
+    @staticmethod
+    def _session_data(esp_id: str, session: RegistrationSession) -> dict:
+        employee = session.employee
+        return {
+            "esp_id": esp_id,
+            "employee": {
+                "id": employee.id,
+                "rfid": employee.rfid,
+                "first_name": employee.first_name,
+                "last_name": employee.last_name,
+                "wms_login": employee.wms_login,
+                "department": employee.department,
+            },
+            "started_at": session.started_at.isoformat(),
+        }
+
+    def get(self, esp_id: str, at: Optional[datetime] = None):
+        """
+        Сесія, відкрита в момент at (за замовчуванням - зараз).
+        Скани з буфера ESP перевіряються на свій час: сесія, відкрита
+        пізніше за скан, для нього не існує.
+        """
         session = self.sessions.get(esp_id)
         if not session:
             return None
-        if datetime.now(timezone.utc) - session.started_at > self.timeout:
+        if at is not None and at < session.started_at:
+            return None
+        if (at or datetime.now(timezone.utc)) - session.started_at > self.timeout:
             self.sessions.pop(esp_id, None)
             return None
         return session
 
-    def refresh(self, esp_id: str):
+    def refresh(self, esp_id: str, at: Optional[datetime] = None):
         session = self.sessions.get(esp_id)
         if session:
-            session.touch()
+            session.touch(at)
+            self._schedule(esp_id, session)
+            self._replicate("touch", esp_id=esp_id, started_at=session.started_at.isoformat())
 
     def end(self, esp_id: str):
-        self.sessions.pop(esp_id, None)
-
-    def cleanup_expired(self) -> int:
-        now = datetime.now(timezone.utc)
-        expired_keys = [
-            esp_id
-            for esp_id, session in self.sessions.items()
-            if now - session.started_at > self.timeout + timedelta(seconds=1)
-        ]
+        self._end_local(esp_id)
+        self._replicate("end", esp_id=esp_id)
 
-        for esp_id in expired_keys:
-            self.sessions.pop(esp_id, None)
-
-        return len(expired_keys)
\ No newline at end of file
+    def _end_local(self, esp_id: str):
+        self.sessions.pop(esp_id, None)
+        if self.scheduler is not None:
+            self.scheduler.cancel("registration", esp_id)
@@ -0,0 +1,494 @@
+"""Індекс RFID для миттєвого розпізнавання карток з ESP32"""
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Set, Union
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+
+from models.db_employee import EmployeeDB
+from models.db_device import DeviceDB, DeviceType
+from models.db_guest import DBGuest
+from config import RFID_MISS_CACHE_SIZE, RFID_MISS_CACHE_SECONDS
+
+logger = logging.getLogger(__name__)
+
+
+class EmployeeEntry:
+    """Проєкція працівника, достатня для обробки сканування"""
+    kind = "employee"
+
+    def __init__(self, id: int, rfid: str, first_name: str, last_name: str,
+                 wms_login: Optional[str], department: Optional[str]):
+        self.id = id
+        self.rfid = rfid
+        self.first_name = first_name
+        self.last_name = last_name
+        self.wms_login = wms_login
+        self.department = department
+
+
+class DeviceEntry:
+    """Проєкція пристрою (сканер / принтер)"""
+    kind = "device"
+
+    def __init__(self, id: int, rfid: str, name: str, type: DeviceType,
+                 employee_id: Optional[int], enabled: bool = True):
+        self.id = id
+        self.rfid = rfid
+        self.name = name
+        self.type = type
+        self.employee_id = employee_id
+        self.enabled = enabled
+
+
+class GuestEntry:
+    """Проєкція гостьової картки"""
+    kind = "guest"
+
+    def __init__(self, id: int, rfid: Optional[str], name: str, used: bool):
+        self.id = id
+        self.rfid = rfid
+        self.name = name
+        self.used = used
+
+
+RfidEntry = Union[EmployeeEntry, DeviceEntry, GuestEntry]
+
+
+class RfidIndex:
+    """
+    Процесний індекс rfid -> (тип, id, проєкція).
+
+    Прогрівається при старті, підтримується адмінськими CRUD-маршрутами.
+    Промах індексу не є остаточним - виконується запит до БД і результат
+    кешується (на випадок змін, зроблених в обхід цього процесу).
+    Невідомі картки теж запам'ятовуються (обмежений LRU з TTL), тож
+    повторні прикладання незареєстрованої картки не йдуть у БД;
+    put_* для цього rfid скидає промах.
+
+    Кілька воркерів: put_*/remove_*/set_device_owner реплікуються через
+    shared_state, reload() перечитує індекс з БД на всіх воркерах
+    (масові імпорти, відкат пачки), після обриву pub/sub - теж з БД.
+    Заповнення з БД при промаху не реплікуються - інші воркери
+    так само прочитають ці дані самі.
+    """
+
+    def __init__(self, miss_cache_size: int = RFID_MISS_CACHE_SIZE,
+                 miss_cache_seconds: float = RFID_MISS_CACHE_SECONDS):
+        self.employees: Dict[str, EmployeeEntry] = {}
+        self.devices: Dict[str, DeviceEntry] = {}
+        self.guests: Dict[str, GuestEntry] = {}
+
+        self._employees_by_id: Dict[int, EmployeeEntry] = {}
+        self._devices_by_id: Dict[int, DeviceEntry] = {}
+        self._guests_by_id: Dict[int, GuestEntry] = {}
+        self._devices_by_owner: Dict[int, Set[int]] = {}
+
+        # rfid -> time.monotonic() промаху в БД
+        self._misses: "OrderedDict[str, float]" = OrderedDict()
+        self.miss_cache_size = miss_cache_size
+        self.miss_cache_seconds = miss_cache_seconds
+
+        self.loaded = False
+
+        self.shared_state = None
+        # True, поки застосовується зміна з іншого воркера (слухачі не пересилають її далі)
+        self.applying_remote = False
+        self._reload_task: Optional[asyncio.Task] = None
+        self._reload_requested = False
+
+        # слухачі змін: callback(kind, id) - "device", "employee" або "loaded" (id=None)
+        self._listeners: List[Callable[[str, Optional[int]], None]] = []
+
+    def add_listener(self, callback: Callable[[str, Optional[int]], None]):
+        self._listeners.append(callback)
+
+    def _notify(self, kind: str, key: Optional[int] = None):
+        for listener in self._listeners:
+            try:
+                listener(kind, key)
+            except Exception:
+                logger.exception("RFID index listener failed")
+
+    # ===============================
+    # REPLICATION
+    # ===============================
+    def attach_shared_state(self, shared_state):
+        """Зміни індексу на одному воркері - на всі воркери"""
+        self.shared_state = shared_state
+        shared_state.register("rfid_index", self._apply_remote)
+        # повідомлення за час обриву втрачені - перечитати з БД
+        shared_state.on_reconnect(self.schedule_reload)
+
+    def _replicate(self, op: str, **data):
+        if self.shared_state:
+            self.shared_state.publish("rfid_index", op, **data)
+
+    def _apply_remote(self, op: str, data: dict, origin: str):
+        self.applying_remote = True
+        try:
+            self._apply_remote_op(op, data)
+        finally:
+            self.applying_remote = False
+
+    def _apply_remote_op(self, op: str, data: dict):
+        if op == "employee":
+            self._fill_employee(EmployeeEntry(**data))
+        elif op == "device":
+            self._fill_device(DeviceEntry(**{**data, "type": DeviceType(data["type"])}))
+        elif op == "guest":
+            self._fill_guest(GuestEntry(**data))
+        elif op == "owner":
+            self._set_device_owner(data["device_id"], data["employee_id"])
+        elif op == "remove_employee":
+            self._remove_employee(data["employee_id"])
+        elif op == "remove_device":
+            self._remove_device(data["device_id"])
+        elif op == "remove_guest":
+            self._remove_guest(data["guest_id"])
+        elif op == "reload":
+            self.schedule_reload()
+
+    def schedule_reload(self):
+        """Перечитати індекс з БД у фоні (повтори зливаються в одне перечитування)"""
+        self._reload_requested = True
+        if self._reload_task is not None and not self._reload_task.done():
+            return
+
+        try:
+            self._reload_task = asyncio.get_running_loop().create_task(self._reload_loop())
+        except RuntimeError:
+            # поза циклом подій - перечитає наступний старт
+            pass
+
+    async def _reload_loop(self):
+        from db.session import async_session
+
+        while self._reload_requested:
+            self._reload_requested = False
+            try:
+                async with async_session() as db:
+                    await self.load(db)
+            except Exception:
+                logger.exception("RFID index reload failed")
+                return
+
+    # ===============================
+    # WARM-UP
+    # ===============================
+    async def load(self, db: AsyncSession):
+        """Повністю перебудувати індекс з БД"""
+        employees = await db.execute(
+            select(
+                EmployeeDB.id, EmployeeDB.rfid, EmployeeDB.first_name,
+                EmployeeDB.last_name, EmployeeDB.wms_login, EmployeeDB.department
+            )
+        )
+        devices = await db.execute(
+            select(
+                DeviceDB.id, DeviceDB.rfid, DeviceDB.name, DeviceDB.type,
+                DeviceDB.employee_id, DeviceDB.enabled
+            )
+        )
+        guests = await db.execute(
+            select(DBGuest.id, DBGuest.rfid, DBGuest.name, DBGuest.used)
+        )
+
+        self.clear()
+
+        for row in employees:
+            self._put_employee_entry(EmployeeEntry(*row))
+        for row in devices:
+            self._put_device_entry(DeviceEntry(*row))
+        for row in guests:
+            self._put_guest_entry(GuestEntry(*row))
+
+        self.loaded = True
+        self._notify("loaded")
+        logger.info(
+            "RFID index loaded: %s employees, %s devices, %s guests",
+            len(self._employees_by_id), len(self._devices_by_id), len(self._guests_by_id)
+        )
+
+    async def reload(self, db: AsyncSession):
+        """Перечитати індекс тут і на інших воркерах (після масових змін)"""
+        await self.load(db)
+        self._replicate("reload")
+
+    def clear(self):
+        self.employees.clear()
+        self.devices.clear()
+        self.guests.clear()
+        self._employees_by_id.clear()
+        self._devices_by_id.clear()
+        self._guests_by_id.clear()
+        self._devices_by_owner.clear()
+        self._misses.clear()
+        self.loaded = False
+        self._notify("loaded")
+
+    # ===============================
+    # LOOKUP
+    # ===============================
+    def resolve(self, rfid: str) -> Optional[RfidEntry]:
+        """
+        Знайти rfid в індексі.
+        Пріоритет як у receive_esp32_data: працівник -> пристрій -> гість.
+        """
+        return (
+            self.employees.get(rfid)
+            or self.devices.get(rfid)
+            or self.guests.get(rfid)
+        )
+
+    async def resolve_or_fetch(self, db: AsyncSession, rfid: str) -> Optional[RfidEntry]:
+        """Знайти rfid в індексі, а при промаху - в БД (з кешуванням результату)"""
+        entry = self.resolve(rfid)
+        if entry:
+            return entry
+
+        if self._is_known_miss(rfid):
+            return None
+
+        result = await db.execute(
+            select(EmployeeDB)
+            .options(selectinload(EmployeeDB.devices))
+            .where(EmployeeDB.rfid == rfid)
+        )
+        employee = result.scalar_one_or_none()
+        if employee:
+            for device in employee.devices:
+                self._fill_device(self._device_entry(device))
+            return self._fill_employee(self._employee_entry(employee))
+
+        result = await db.execute(
+            select(DeviceDB).where(DeviceDB.rfid == rfid)
+        )
+        device = result.scalar_one_or_none()
+        if device:
+            return self._fill_device(self._device_entry(device))
+
+        result = await db.execute(
+            select(DBGuest).where(DBGuest.rfid == rfid)
+        )
+        guest = result.scalar_one_or_none()
+        if guest:
+            return self._fill_guest(self._guest_entry(guest))
+
+        self._remember_miss(rfid)
+        return None
+
+    def _is_known_miss(self, rfid: str) -> bool:
+        missed_at = self._misses.get(rfid)
+        if missed_at is None:
+            return False
+        if time.monotonic() - missed_at >= self.miss_cache_seconds:
+            del self._misses[rfid]
+            return False
+        self._misses.move_to_end(rfid)
+        return True
+
+    def _remember_miss(self, rfid: str):
+        if self.miss_cache_size <= 0:
+            return
+        self._misses[rfid] = time.monotonic()
+        self._misses.move_to_end(rfid)
+        while len(self._misses) > self.miss_cache_size:
+            self._misses.popitem(last=False)
+
+    def forget_miss(self, rfid: Optional[str]):
+        """Картку з цим rfid щойно створено/змінено - промах більше не дійсний"""
+        if rfid:
+            self._misses.pop(rfid, None)
+
+    def get_employee(self, employee_id: int) -> Optional[EmployeeEntry]:
+        return self._employees_by_id.get(employee_id)
+
+    async def get_employee_or_fetch(self, db: AsyncSession, employee_id: int) -> Optional[EmployeeEntry]:
+        entry = self.get_employee(employee_id)
+        if entry:
+            return entry
+
+        result = await db.execute(
+            select(EmployeeDB).where(EmployeeDB.id == employee_id)
+        )
+        employee = result.scalar_one_or_none()
+        return self._fill_employee(self._employee_entry(employee)) if employee else None
+
+    def get_device(self, device_id: int) -> Optional[DeviceEntry]:
+        return self._devices_by_id.get(device_id)
+
+    def devices_of(self, employee_id: int) -> List[DeviceEntry]:
+        """Пристрої, закріплені за працівником"""
+        return [
+            self._devices_by_id[device_id]
+            for device_id in self._devices_by_owner.get(employee_id, ())
+        ]
+
+    # ===============================
+    # UPDATES (з адмінських маршрутів)
+    # ===============================
+    def put_employee(self, employee) -> EmployeeEntry:
+        entry = self._fill_employee(self._employee_entry(employee))
+        self._replicate("employee", **vars(entry))
+        return entry
+
+    def put_device(self, device) -> DeviceEntry:
+        entry = self._fill_device(self._device_entry(device))
+        self._replicate("device", **{**vars(entry), "type": DeviceType(entry.type).value})
+        return entry
+
+    def put_guest(self, guest) -> GuestEntry:
+        entry = self._fill_guest(self._guest_entry(guest))
+        self._replicate("guest", **vars(entry))
+        return entry
+
+    def set_device_owner(self, device_id: int, employee_id: Optional[int]):
+        """Оновити власника пристрою після (роз)реєстрації"""
+        self._set_device_owner(device_id, employee_id)
+        self._replicate("owner", device_id=device_id, employee_id=employee_id)
+
+    def remove_employee(self, employee_id: int):
+        self._remove_employee(employee_id)
+        self._replicate("remove_employee", employee_id=employee_id)
+
+    def remove_device(self, device_id: int):
+        self._remove_device(device_id)
+        self._replicate("remove_device", device_id=device_id)
+
+    def remove_guest(self, guest_id: int):
+        self._remove_guest(guest_id)
+        self._replicate("remove_guest", guest_id=guest_id)
+
+    # ===============================
+    # LOCAL UPDATES (без реплікації)
+    # ===============================
+    @staticmethod
+    def _employee_entry(employee) -> EmployeeEntry:
+        return EmployeeEntry(
+            id=employee.id,
+            rfid=employee.rfid,
+            first_name=employee.first_name,
+            last_name=employee.last_name,
+            wms_login=employee.wms_login,
+            department=employee.department,
+        )
+
+    @staticmethod
+    def _device_entry(device) -> DeviceEntry:
+        return DeviceEntry(
+            id=device.id,
+            rfid=device.rfid,
+            name=device.name,
+            type=device.type,
+            employee_id=device.employee_id,
+            enabled=device.enabled,
+        )
+
+    @staticmethod
+    def _guest_entry(guest) -> GuestEntry:
+        return GuestEntry(
+            id=guest.id,
+            rfid=guest.rfid,
+            name=guest.name,
+            used=guest.used,
+        )
+
+    def _fill_employee(self, entry: EmployeeEntry) -> EmployeeEntry:
+        self._put_employee_entry(entry)
+        self._notify("employee", entry.id)
+        return entry
+
+    def _fill_device(self, entry: DeviceEntry) -> DeviceEntry:
+        self._put_device_entry(entry)
+        self._notify("device", entry.id)
+        return entry
+
+    def _fill_guest(self, entry: GuestEntry) -> GuestEntry:
+        self._put_guest_entry(entry)
+        return entry
+
+    def _set_device_owner(self, device_id: int, employee_id: Optional[int]):
+        entry = self._devices_by_id.get(device_id)
+        if not entry:
+            return
+
+        self._unlink_owner(entry)
+        entry.employee_id = employee_id
+        self._link_owner(entry)
+        self._notify("device", device_id)
+
+    def _remove_employee(self, employee_id: int):
+        self._drop_employee_entry(employee_id)
+
+        # EmployeeDB.devices має cascade="all, delete-orphan"
+        for device_id in list(self._devices_by_owner.get(employee_id, ())):
+            self._remove_device(device_id)
+
+    def _remove_device(self, device_id: int):
+        if self._drop_device_entry(device_id):
+            self._notify("device", device_id)
+
+    def _remove_guest(self, guest_id: int):
+        entry = self._guests_by_id.pop(guest_id, None)
+        if entry and entry.rfid and self.guests.get(entry.rfid) is entry:
+            self.guests.pop(entry.rfid, None)
+
+    # ===============================
+    # INTERNALS
+    # ===============================
+    def _put_employee_entry(self, entry: EmployeeEntry):
+        self._drop_employee_entry(entry.id)
+        self._employees_by_id[entry.id] = entry
+        self.employees[entry.rfid] = entry
+        self.forget_miss(entry.rfid)
+
+    def _drop_employee_entry(self, employee_id: int):
+        """Прибрати запис працівника, не чіпаючи його пристрої"""
+        old = self._employees_by_id.pop(employee_id, None)
+        if old and self.employees.get(old.rfid) is old:
+            self.employees.pop(old.rfid, None)
+
+    def _drop_device_entry(self, device_id: int) -> bool:
+        entry = self._devices_by_id.pop(device_id, None)
+        if not entry:
+            return False
+        self._unlink_owner(entry)
+        if self.devices.get(entry.rfid) is entry:
+            self.devices.pop(entry.rfid, None)
+        return True
+
+    def _put_device_entry(self, entry: DeviceEntry):
+        self._drop_device_entry(entry.id)
+        self._devices_by_id[entry.id] = entry
+        self.devices[entry.rfid] = entry
+        self.forget_miss(entry.rfid)
+        self._link_owner(entry)
+
+    def _put_guest_entry(self, entry: GuestEntry):
+        self._remove_guest(entry.id)
+        self._guests_by_id[entry.id] = entry
+        if entry.rfid:
+            self.guests[entry.rfid] = entry
+            self.forget_miss(entry.rfid)
+
+    def _link_owner(self, entry: DeviceEntry):
+        if entry.employee_id is not None:
+            self._devices_by_owner.setdefault(entry.employee_id, set()).add(entry.id)
+
+    def _unlink_owner(self, entry: DeviceEntry):
+        if entry.employee_id is None:
+            return
+        owned = self._devices_by_owner.get(entry.employee_id)
+        if owned is not None:
+            owned.discard(entry.id)
+            if not owned:
+                self._devices_by_owner.pop(entry.employee_id, None)
+
+
+# Глобальний екземпляр індексу
+rfid_index = RfidIndex()
@@ -0,0 +1,98 @@
+"""Вікно дедуплікації сканів: повтор того ж скану - відповідь з кешу"""
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+from config import SCAN_DEDUP_MAX_ENTRIES, SCAN_DEDUP_WINDOW_MS
+
+logger = logging.getLogger(__name__)
+
+
+class ScanDeduplicator:
+    """
+    Ключ (зчитувач, rfid, nonce): повтор після таймауту ESP або подвійне
+    зчитування картки в межах вікна не проходить конвеєр ще раз (без БД,
+    без TransactionDB) - отримує результат першого скану. Одночасний
+    дублікат чекає на перший скан замість паралельної обробки.
+
+    Вікно (мс) - з SystemConfigDB.scan_dedup_window_ms; 0 вимикає.
+
+    Кеш - локальний для воркера uvicorn (не реплікується через
+    SharedState): повтор, що потрапив на інший воркер, обробляється знову.
+    """
+
+    def __init__(self, window_ms: int = SCAN_DEDUP_WINDOW_MS, max_entries: int = SCAN_DEDUP_MAX_ENTRIES):
+        self.window = window_ms / 1000
+        self.max_entries = max_entries
+
+        # ключ -> (час першого скану, результат); порядок = порядок вставки
+        self._results: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._pending: Dict[Hashable, asyncio.Event] = {}
+
+        self.hits = 0
+        self.misses = 0
+
+    def update_window(self, window_ms: int):
+        self.window = max(0, window_ms) / 1000
+        if not self.window:
+            self._results.clear()
+
+    @staticmethod
+    def key(device_id: str, rfid: str, nonce: Optional[str] = None) -> Hashable:
+        return (device_id, rfid, nonce)
+
+    async def run(
+        self,
+        key: Hashable,
+        process: Callable[[], Awaitable[Any]],
+        on_duplicate: Optional[Callable[[], None]] = None,
+    ) -> Any:
+        """Обробити скан або повернути результат попереднього в межах вікна"""
+        if not self.window:
+            return await process()
+
+        while key in self._pending:
+            await self._pending[key].wait()
+
+        started = time.monotonic()
+        cached = self._results.get(key)
+        if cached is not None and started - cached[0] < self.window:
+            self.hits += 1
+            if on_duplicate is not None:
+                on_duplicate()
+            return cached[1]
+
+        self.misses += 1
+        event = self._pending[key] = asyncio.Event()
+        try:
+            result = await process()
+            self._store(key, started, result)
+            return result
+        finally:
+            # помилка - без кешу: дублікат, що чекав, обробить скан сам
+            del self._pending[key]
+            event.set()
+
+    def _store(self, key: Hashable, started: float, result: Any):
+        self._results.pop(key, None)
+        self._results[key] = (started, result)
+
+        # найстаріші - спереду: прострочені і понад ліміт
+        while self._results:
+            oldest_key, (oldest, _) = next(iter(self._results.items()))
+            if len(self._results) <= self.max_entries and started - oldest < self.window:
+                break
+            del self._results[oldest_key]
+
+    def clear(self):
+        self._results.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "window_ms": int(self.window * 1000),
+            "size": len(self._results),
+            "hits": self.hits,
+            "misses": self.misses,
+        }
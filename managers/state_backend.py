@@ -0,0 +1,432 @@
+"""Спільний стан менеджерів між воркерами (pub/sub)"""
+import asyncio
+import json
+import logging
+import time
+import uuid
+from abc import ABC, abstractmethod
+from typing import Any, Callable, Dict, List, Optional
+
+from config import (
+    STATE_OUTBOX_SIZE,
+    STATE_CLOSE_TIMEOUT_SECONDS,
+    STATE_HEARTBEAT_SECONDS,
+    STATE_PEER_TTL_SECONDS,
+    STATE_RECONNECT_MIN_SECONDS,
+    STATE_RECONNECT_MAX_SECONDS,
+)
+
+logger = logging.getLogger(__name__)
+
+# Канал, через який воркери обмінюються змінами стану
+STATE_CHANNEL = "pinokio:state"
+
+# Службова тема SharedState (запит знімка стану)
+SYNC_TOPIC = "_state"
+
+
+class StateBackendError(Exception):
+    """Backend стану недоступний або неправильно налаштований"""
+
+
+class StateBackend(ABC):
+    """
+    Транспорт подій між воркерами.
+
+    shared = False - стан живе в одному процесі, реплікація не потрібна.
+    """
+
+    shared = False
+
+    def __init__(self):
+        self._handlers: Dict[str, List[Callable[[dict], None]]] = {}
+        # викликається після перепідключення (повідомлення за час обриву втрачені)
+        self.on_reconnect: Optional[Callable[[], None]] = None
+
+    def subscribe(self, channel: str, handler: Callable[[dict], None]):
+        self._handlers.setdefault(channel, []).append(handler)
+
+    def _dispatch(self, channel: str, message: dict):
+        for handler in self._handlers.get(channel, ()):
+            try:
+                handler(message)
+            except Exception:
+                logger.exception("State handler failed on %s", channel)
+
+    @abstractmethod
+    async def publish(self, channel: str, message: dict):
+        """Доставити повідомлення підписникам каналу (на всіх воркерах)"""
+
+    @abstractmethod
+    async def start(self):
+        """Почати отримувати повідомлення підписаних каналів"""
+
+    @abstractmethod
+    async def close(self):
+        """Зупинити отримання і звільнити з'єднання"""
+
+
+class InMemoryStateBackend(StateBackend):
+    """Один процес: повідомлення доставляються підписникам цього ж процесу"""
+
+    async def publish(self, channel: str, message: dict):
+        self._dispatch(channel, message)
+
+    async def start(self):
+        pass
+
+    async def close(self):
+        pass
+
+
+# Один FakeServer на процес - усі fakeredis:// клієнти бачать одні й ті самі канали
+_fake_server = None
+
+
+def _redis_client(url: str):
+    global _fake_server
+
+    # redis / fakeredis (requirements.txt) імпортуються лише для кількох воркерів
+    if url.startswith("fakeredis://"):
+        try:
+            from fakeredis import FakeServer
+            from fakeredis.aioredis import FakeRedis
+        except ImportError:
+            raise StateBackendError("STATE_BACKEND_URL=fakeredis:// wymaga pakietu fakeredis")
+
+        if _fake_server is None:
+            _fake_server = FakeServer()
+        return FakeRedis(server=_fake_server)
+
+    try:
+        import redis.asyncio as redis
+    except ImportError:
+        raise StateBackendError("STATE_BACKEND_URL=redis:// wymaga pakietu redis")
+
+    return redis.from_url(url)
+
+
+class RedisStateBackend(StateBackend):
+    """
+    Redis pub/sub: кожен воркер слухає канали у фоновій задачі.
+
+    Задача-наглядач перезапускає слухача після будь-якої помилки
+    чи обриву з'єднання (з логом і експоненційною затримкою)
+    і повідомляє on_reconnect - пропущені зміни треба надолужити.
+    """
+
+    shared = True
+
+    def __init__(self, url: Optional[str] = None, client=None):
+        super().__init__()
+        self._client = client if client is not None else _redis_client(url)
+        self._pubsub = None
+        self._listener: Optional[asyncio.Task] = None
+        self.reconnects = 0
+
+    async def publish(self, channel: str, message: dict):
+        await self._client.publish(
+            channel,
+            json.dumps(message, ensure_ascii=False, separators=(",", ":"))
+        )
+
+    async def start(self):
+        await self._subscribe()
+        self._listener = asyncio.create_task(self._supervise())
+
+    async def _subscribe(self):
+        if self._pubsub is not None:
+            try:
+                await self._pubsub.aclose()
+            except Exception:
+                pass
+
+        self._pubsub = self._client.pubsub()
+        await self._pubsub.subscribe(*self._handlers)
+
+    async def _supervise(self):
+        while True:
+            try:
+                await self._listen()
+                logger.warning("State listener stopped, resubscribing")
+            except Exception:
+                logger.exception("State listener failed, resubscribing")
+
+            await self._reconnect()
+            self.reconnects += 1
+
+            if self.on_reconnect is not None:
+                try:
+                    self.on_reconnect()
+                except Exception:
+                    logger.exception("State reconnect handler failed")
+
+    async def _reconnect(self):
+        delay = STATE_RECONNECT_MIN_SECONDS
+        while True:
+            await asyncio.sleep(delay)
+            try:
+                await self._subscribe()
+            except Exception as exc:
+                logger.warning("State resubscribe failed: %r", exc)
+                delay = min(delay * 2, STATE_RECONNECT_MAX_SECONDS)
+            else:
+                logger.info("State listener resubscribed")
+                return
+
+    async def _listen(self):
+        async for item in self._pubsub.listen():
+            if item["type"] != "message":
+                continue
+
+            channel = item["channel"]
+            if isinstance(channel, bytes):
+                channel = channel.decode()
+
+            try:
+                message = json.loads(item["data"])
+            except ValueError:
+                logger.warning("Invalid state message on %s", channel)
+                continue
+
+            self._dispatch(channel, message)
+
+    async def close(self):
+        if self._listener:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+
+        if self._pubsub is not None:
+            await self._pubsub.aclose()
+        await self._client.aclose()
+
+
+def create_state_backend(url: str) -> StateBackend:
+    """memory:// - один воркер; redis://... або fakeredis:// - кілька воркерів"""
+    if not url or url.startswith("memory://"):
+        return InMemoryStateBackend()
+    return RedisStateBackend(url)
+
+
+class SharedState:
+    """
+    Реплікація стану менеджерів між воркерами.
+
+    Менеджери змінюють свої локальні копії синхронно (гарячий шлях без
+    мережі) і публікують зміну; інші воркери застосовують її у своїх копіях.
+    Власні повідомлення воркер ігнорує. Публікація йде через одну чергу,
+    тому зміни одного воркера доходять до інших у тому ж порядку.
+
+    Живі повідомлення - не все:
+    - новий воркер (і воркер після перепідключення) просить знімок стану,
+      інші відповідають йому провайдерами register_snapshot;
+    - кожен воркер раз на heartbeat_seconds публікує register_heartbeat-дані
+      (напр. кількість своїх підписок); воркер, що мовчить довше за
+      peer_ttl_seconds, вважається впалим - слухачі on_worker_down
+      прибирають його записи (kill -9 / OOM не встигає надіслати worker_down);
+    - on_reconnect - для кешів, які простіше перечитати з БД.
+
+    Не реплікуються (стан лише свого воркера): черги IngestQueue і вікно
+    ScanDeduplicator. Обидва прив'язані до запитів, що прийшли на цей
+    воркер; повтор скану через інший воркер захищають ключі пачок
+    (scan_receipts) і умови UPDATE у device_assignment.
+    """
+
+    def __init__(
+        self,
+        backend: StateBackend,
+        worker_id: Optional[str] = None,
+        heartbeat_seconds: float = STATE_HEARTBEAT_SECONDS,
+        peer_ttl_seconds: float = STATE_PEER_TTL_SECONDS,
+    ):
+        self.backend = backend
+        self.worker_id = worker_id or uuid.uuid4().hex
+        self.heartbeat_seconds = heartbeat_seconds
+        self.peer_ttl_seconds = peer_ttl_seconds
+
+        self._handlers: Dict[str, List[Callable[[str, Dict[str, Any], str], None]]] = {}
+        self._snapshots: Dict[str, Callable[[], Dict[str, Any]]] = {}
+        self._heartbeats: Dict[str, Callable[[], Dict[str, Any]]] = {}
+        self._worker_down_listeners: List[Callable[[str], None]] = []
+        self._reconnect_listeners: List[Callable[[], None]] = []
+
+        # інші воркери: worker_id -> time.monotonic() останнього повідомлення
+        self.peers: Dict[str, float] = {}
+
+        self._outbox: Optional[asyncio.Queue] = None
+        self._publisher: Optional[asyncio.Task] = None
+        self._heartbeat: Optional[asyncio.Task] = None
+
+        backend.subscribe(STATE_CHANNEL, self._on_message)
+        backend.on_reconnect = self._on_reconnect
+
+    def register(self, topic: str, handler: Callable[[str, Dict[str, Any], str], None]):
+        """handler(op, data, origin) - зміна від іншого воркера"""
+        self._handlers.setdefault(topic, []).append(handler)
+
+    def register_snapshot(self, topic: str, provider: Callable[[], Dict[str, Any]]):
+        """provider() - стан для нового воркера (приходить йому як op "snapshot")"""
+        self._snapshots[topic] = provider
+
+    def register_heartbeat(self, topic: str, provider: Callable[[], Dict[str, Any]]):
+        """provider() - дані, що публікуються з кожним heartbeat (op "heartbeat")"""
+        self._heartbeats[topic] = provider
+
+    def on_worker_down(self, callback: Callable[[str], None]):
+        """callback(worker_id) - воркер завершився або перестав слати heartbeat"""
+        self._worker_down_listeners.append(callback)
+
+    def on_reconnect(self, callback: Callable[[], None]):
+        """callback() - з'єднання з backend відновлено, частину змін могло бути втрачено"""
+        self._reconnect_listeners.append(callback)
+
+    def publish(self, topic: str, op: str, **data):
+        self._send({"topic": topic, "op": op, "data": data})
+
+    def _send(self, message: dict):
+        if self._outbox is None:
+            return
+
+        message["origin"] = self.worker_id
+        try:
+            self._outbox.put_nowait(message)
+        except asyncio.QueueFull:
+            logger.warning("State outbox full, dropping %s/%s", message["topic"], message["op"])
+
+    async def _publish_loop(self):
+        while True:
+            message = await self._outbox.get()
+            try:
+                await self.backend.publish(STATE_CHANNEL, message)
+            except Exception as exc:
+                logger.warning("State publish failed: %r", exc)
+            finally:
+                self._outbox.task_done()
+
+    def _on_message(self, message: dict):
+        origin = message.get("origin")
+        if origin == self.worker_id:
+            return
+
+        # адресне повідомлення (знімок) - лише для свого воркера
+        target = message.get("target")
+        if target is not None and target != self.worker_id:
+            return
+
+        if origin is not None:
+            self.peers[origin] = time.monotonic()
+
+        topic = message.get("topic")
+        op = message.get("op")
+        data = message.get("data") or {}
+
+        if topic == SYNC_TOPIC:
+            if op == "sync_request":
+                self._send_snapshots(origin)
+                self._publish_heartbeats()
+            elif op == "worker_down":
+                self._drop_peer(origin)
+            return
+
+        for handler in self._handlers.get(topic, ()):
+            handler(op, data, origin)
+
+    # ===============================
+    # SNAPSHOTS / HEARTBEAT
+    # ===============================
+    def request_snapshot(self):
+        """Попросити інші воркери надіслати свій стан"""
+        self._send({"topic": SYNC_TOPIC, "op": "sync_request", "data": {}})
+
+    def _send_snapshots(self, target: str):
+        for topic, provider in self._snapshots.items():
+            try:
+                data = provider()
+            except Exception:
+                logger.exception("State snapshot failed for %s", topic)
+                continue
+            self._send({"topic": topic, "op": "snapshot", "data": data, "target": target})
+
+    def _publish_heartbeats(self):
+        sent = False
+        for topic, provider in self._heartbeats.items():
+            try:
+                self.publish(topic, "heartbeat", **provider())
+                sent = True
+            except Exception:
+                logger.exception("State heartbeat failed for %s", topic)
+
+        if not sent:
+            self._send({"topic": SYNC_TOPIC, "op": "alive", "data": {}})
+
+    async def _heartbeat_loop(self):
+        while True:
+            await asyncio.sleep(self.heartbeat_seconds)
+            self._publish_heartbeats()
+            self.expire_peers()
+
+    def expire_peers(self):
+        """Прибрати воркери, від яких давно нічого не було"""
+        cutoff = time.monotonic() - self.peer_ttl_seconds
+        for worker_id, seen in list(self.peers.items()):
+            if seen < cutoff:
+                logger.warning("Worker %s missed heartbeats, dropping its state", worker_id)
+                self._drop_peer(worker_id)
+
+    def _drop_peer(self, worker_id: str):
+        self.peers.pop(worker_id, None)
+        for callback in self._worker_down_listeners:
+            try:
+                callback(worker_id)
+            except Exception:
+                logger.exception("Worker down handler failed")
+
+    def _on_reconnect(self):
+        for callback in self._reconnect_listeners:
+            try:
+                callback()
+            except Exception:
+                logger.exception("State reconnect handler failed")
+
+        self.request_snapshot()
+        self._publish_heartbeats()
+
+    # ===============================
+    # LIFECYCLE
+    # ===============================
+    async def start(self):
+        self._outbox = asyncio.Queue(maxsize=STATE_OUTBOX_SIZE)
+        self._publisher = asyncio.create_task(self._publish_loop())
+        await self.backend.start()
+
+        # стан, що вже є в інших воркерах, - не чекаючи наступних змін
+        self.request_snapshot()
+        self._publish_heartbeats()
+        self._heartbeat = asyncio.create_task(self._heartbeat_loop())
+
+    async def close(self):
+        if self._heartbeat:
+            self._heartbeat.cancel()
+
+        # інші воркери одразу прибирають наш стан, не чекаючи TTL
+        self._send({"topic": SYNC_TOPIC, "op": "worker_down", "data": {}})
+
+        # дочекатися вже запланованих змін, потім зупинити публікацію
+        if self._outbox is not None:
+            try:
+                await asyncio.wait_for(self._outbox.join(), timeout=STATE_CLOSE_TIMEOUT_SECONDS)
+            except asyncio.TimeoutError:
+                logger.warning("State outbox not flushed on shutdown")
+
+        if self._publisher:
+            self._publisher.cancel()
+            try:
+                await self._publisher
+            except asyncio.CancelledError:
+                pass
+
+        self._outbox = None
+        await self.backend.close()
@@ -9,4 +9,6 @@ from .db_user import UserDB
 from .db_transaction import TransactionType
 from .db_department_manager import DepartmentManagerDB
 from .db_system_config import SystemConfigDB
-from .db_guest import DBGuest
\ No newline at end of file
+from .db_guest import DBGuest
+from .db_sheet_sync import SheetSyncOutboxDB
+from .db_esp_scan import EspScanReceiptDB
\ No newline at end of file
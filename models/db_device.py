@@ -1,4 +1,4 @@
-from sqlalchemy import String, Enum, ForeignKey
+from sqlalchemy import String, Enum, ForeignKey, Index, text
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from db.base import Base
 import enum
@@ -16,6 +16,23 @@ class SiteType(enum.Enum):
 
 class DeviceDB(Base):
     __tablename__ = "devices"
+    __table_args__ = (
+        # працівник може мати щонайбільше один пристрій кожного типу
+        Index(
+            "uq_devices_employee_type",
+            "employee_id",
+            "type",
+            unique=True,
+            postgresql_where=text("employee_id IS NOT NULL")
+        ),
+        # пошук ILIKE '%q%' (pg_trgm)
+        Index("ix_devices_name_trgm", "name", postgresql_using="gin", postgresql_ops={"name": "gin_trgm_ops"}),
+        Index("ix_devices_serial_number_trgm", "serial_number", postgresql_using="gin", postgresql_ops={"serial_number": "gin_trgm_ops"}),
+        Index("ix_devices_rfid_trgm", "rfid", postgresql_using="gin", postgresql_ops={"rfid": "gin_trgm_ops"}),
+        # пошук за префіксом lower(col) LIKE 'q%'
+        Index("ix_devices_serial_number_prefix", text("lower(serial_number) text_pattern_ops")),
+        Index("ix_devices_rfid_prefix", text("lower(rfid) text_pattern_ops")),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True)
     name: Mapped[str] = mapped_column(String, unique=True)
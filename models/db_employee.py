@@ -1,8 +1,15 @@
+from sqlalchemy import Index
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from db.base import Base
 
 class EmployeeDB(Base):
     __tablename__ = "employees"
+    __table_args__ = (
+        # пошук ILIKE '%q%' (pg_trgm)
+        Index("ix_employees_first_name_trgm", "first_name", postgresql_using="gin", postgresql_ops={"first_name": "gin_trgm_ops"}),
+        Index("ix_employees_last_name_trgm", "last_name", postgresql_using="gin", postgresql_ops={"last_name": "gin_trgm_ops"}),
+        Index("ix_employees_wms_login_trgm", "wms_login", postgresql_using="gin", postgresql_ops={"wms_login": "gin_trgm_ops"}),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True)
     last_name: Mapped[str]
@@ -0,0 +1,20 @@
+from sqlalchemy import DateTime, Index, String
+from sqlalchemy.orm import Mapped, mapped_column
+from sqlalchemy.sql import func
+from db.base import Base
+from datetime import datetime
+
+
+class EspScanReceiptDB(Base):
+    """Ключі ідемпотентності сканів з пачок ESP (повтор після обриву WiFi)"""
+    __tablename__ = "esp_scan_receipts"
+    __table_args__ = (
+        # очищення старих ключів одного зчитувача
+        Index("ix_esp_scan_receipts_device_id_received_at", "device_id", "received_at"),
+    )
+
+    device_id: Mapped[str] = mapped_column(String(64), primary_key=True)
+    scan_id: Mapped[str] = mapped_column(String(64), primary_key=True)
+    received_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now()
+    )
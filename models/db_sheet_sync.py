@@ -0,0 +1,39 @@
+from sqlalchemy import ForeignKey, DateTime, Index, Text, text
+from sqlalchemy.orm import Mapped, mapped_column
+from sqlalchemy.sql import func
+from db.base import Base
+from datetime import datetime
+
+
+class SheetSyncOutboxDB(Base):
+    """Черга змін пристроїв, які ще треба перенести в Google Sheets"""
+    __tablename__ = "sheet_sync_outbox"
+    __table_args__ = (
+        Index(
+            "ix_sheet_sync_outbox_pending",
+            "next_attempt_at",
+            postgresql_where=text("synced_at IS NULL AND failed_at IS NULL")
+        ),
+    )
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    device_id: Mapped[int] = mapped_column(
+        ForeignKey("devices.id", ondelete="CASCADE"), nullable=False
+    )
+    notes: Mapped[str] = mapped_column(Text, nullable=False)
+
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now()
+    )
+    next_attempt_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now()
+    )
+    attempts: Mapped[int] = mapped_column(default=0, server_default="0")
+    last_error: Mapped[str | None] = mapped_column(Text, nullable=True)
+    synced_at: Mapped[datetime | None] = mapped_column(
+        DateTime(timezone=True), nullable=True
+    )
+    # SHEET_SYNC_MAX_ATTEMPTS невдалих спроб - запис більше не повторюється
+    failed_at: Mapped[datetime | None] = mapped_column(
+        DateTime(timezone=True), nullable=True
+    )
@@ -22,6 +22,7 @@ class SystemConfigDB(Base):
     
     # Настройки реєстрації
     allow_registration_without_login: Mapped[bool] = mapped_column(Boolean, default=False)
+    scan_dedup_window_ms: Mapped[int] = mapped_column(Integer, default=1500)  # 0 - вимкнено
     
     # Метаінформація
     updated_at: Mapped[datetime] = mapped_column(default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -37,5 +38,6 @@ class SystemConfigDB(Base):
             "auth_cleanup_interval_seconds": self.auth_cleanup_interval_seconds,
             "device_not_returned_hours": self.device_not_returned_hours,
             "allow_registration_without_login": self.allow_registration_without_login,
+            "scan_dedup_window_ms": self.scan_dedup_window_ms,
             "updated_at": self.updated_at.isoformat() if self.updated_at else None,
         }
@@ -1,4 +1,4 @@
-from sqlalchemy import ForeignKey, DateTime, Enum
+from sqlalchemy import ForeignKey, DateTime, Enum, Index
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from sqlalchemy.sql import func
 from db.base import Base
@@ -13,6 +13,13 @@ class TransactionType(enum.Enum):
 
 class TransactionDB(Base):
     __tablename__ = "transactions"
+    __table_args__ = (
+        # keyset-пагінація історії: ORDER BY timestamp DESC, id DESC
+        Index("ix_transactions_timestamp_id", "timestamp", "id"),
+        # фільтри історії за працівником / пристроєм
+        Index("ix_transactions_employee_id_timestamp", "employee_id", "timestamp"),
+        Index("ix_transactions_device_id_timestamp", "device_id", "timestamp"),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True)
     timestamp: Mapped[datetime] = mapped_column(
@@ -1,54 +1,122 @@
 """Моделі пристроїв"""
+import json
+import time
 from datetime import datetime
 from typing import Dict, Any, Optional
-from pydantic import BaseModel
 
 
-class DeviceData(BaseModel):
+def _isoformat(wall_time: Optional[float]) -> Optional[str]:
+    return datetime.fromtimestamp(wall_time).isoformat() if wall_time is not None else None
+
+
+def _to_json(value: Any) -> str:
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+
+
+class DeviceData:
     """Дані пристрою"""
-    timestamp: datetime
-    data: Dict[str, Any]
+    __slots__ = ("timestamp", "data")
 
-    def dict(self, **kwargs):
-        d = super().model_dump(**kwargs)
-        d['timestamp'] = self.timestamp.isoformat()
-        return d
-    
-    class Config:
-        arbitrary_types_allowed = True
+    def __init__(self, data: Dict[str, Any], timestamp: Optional[float] = None):
+        self.data = data
+        self.timestamp = time.time() if timestamp is None else timestamp
+
+    def dict(self) -> Dict[str, Any]:
+        return {"timestamp": _isoformat(self.timestamp), "data": self.data}
 
 
 class Device:
-    """Модель пристрою ESP32"""
-    
+    """
+    Модель пристрою ESP32.
+
+    Час останньої активності - time.monotonic() (дедлайни офлайну не
+    залежать від переведення годинника) плюс time.time() для UI.
+    Запис списку пристроїв кешується JSON-текстом і скидається лише
+    при зміні пристрою: повний device_list - склеювання готових рядків.
+    """
+    __slots__ = (
+        "id", "name", "latest_data",
+        "_is_online", "_connected_at", "_seen_at", "_seen_monotonic", "_entry_json",
+    )
+
     def __init__(self, device_id: str, name: Optional[str] = None):
         self.id = device_id
         self.name = name or f"ESP32-{device_id[-6:]}"
         self.latest_data: Optional[DeviceData] = None
-        self.connected_at: Optional[datetime] = None
-        self.last_seen: Optional[datetime] = None
-        self.is_online: bool = False
-        
+        self._is_online = False
+        self._connected_at: Optional[float] = None
+        self._seen_at: Optional[float] = None
+        self._seen_monotonic: Optional[float] = None
+        self._entry_json: Optional[str] = None
+
+    @property
+    def is_online(self) -> bool:
+        return self._is_online
+
+    @is_online.setter
+    def is_online(self, value: bool):
+        if value != self._is_online:
+            self._is_online = value
+            self._entry_json = None
+
+    @property
+    def connected_at(self) -> Optional[datetime]:
+        return datetime.fromtimestamp(self._connected_at) if self._connected_at is not None else None
+
+    @property
+    def last_seen(self) -> Optional[datetime]:
+        return datetime.fromtimestamp(self._seen_at) if self._seen_at is not None else None
+
+    @property
+    def seen_monotonic(self) -> Optional[float]:
+        """time.monotonic() останньої активності (для дедлайнів)"""
+        return self._seen_monotonic
+
+    def _mark_seen(self) -> float:
+        now = time.time()
+        self._seen_at = now
+        self._seen_monotonic = time.monotonic()
+        self._is_online = True
+        self._entry_json = None
+        return now
+
+    def mark_connected(self) -> None:
+        """Пристрій (пере)підключився"""
+        self._connected_at = time.time()
+        self._is_online = True
+        self._entry_json = None
+
     def update_data(self, data: Dict[str, Any]) -> None:
         """Оновити дані пристрою"""
-        self.latest_data = DeviceData(
-            timestamp=datetime.now(),
-            data=data
-        )
-        self.last_seen = datetime.now()
-        self.is_online = True
-        
+        self.latest_data = DeviceData(data, self._mark_seen())
+
+    def touch(self) -> None:
+        """Ознака життя без нових даних (heartbeat зчитувача)"""
+        self._mark_seen()
+
     def mark_offline(self) -> None:
         """Позначити пристрій як офлайн"""
         self.is_online = False
-        
-    def to_dict(self) -> Dict[str, Any]:
-        """Перетворити пристрій у словник"""
+
+    def to_summary(self) -> Dict[str, Any]:
+        """Запис для списку пристроїв (без latest_data)"""
         return {
             "id": self.id,
             "name": self.name,
-            "is_online": self.is_online,
-            "connected_at": self.connected_at.isoformat() if self.connected_at else None,
-            "last_seen": self.last_seen.isoformat() if self.last_seen else None,
+            "is_online": self._is_online,
+            "connected_at": _isoformat(self._connected_at),
+            "last_seen": _isoformat(self._seen_at),
+        }
+
+    def entry_json(self) -> str:
+        """'"<id>":{...}' - готовий фрагмент словника devices у device_list"""
+        if self._entry_json is None:
+            self._entry_json = f"{_to_json(self.id)}:{_to_json(self.to_summary())}"
+        return self._entry_json
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Перетворити пристрій у словник"""
+        return {
+            **self.to_summary(),
             "latest_data": self.latest_data.dict() if self.latest_data else None
-        }
\ No newline at end of file
+        }
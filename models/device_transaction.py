@@ -1,4 +1,4 @@
-from sqlalchemy import ForeignKey, DateTime
+from sqlalchemy import ForeignKey, DateTime, Index
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from sqlalchemy.sql import func
 from db.base import Base
@@ -6,6 +6,10 @@ from datetime import datetime
 
 class DeviceChangeTransaction(Base):
     __tablename__ = "device_change_transactions"
+    __table_args__ = (
+        # keyset-пагінація історії: ORDER BY timestamp DESC, id DESC
+        Index("ix_device_change_transactions_timestamp_id", "timestamp", "id"),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True)
     timestamp: Mapped[datetime] = mapped_column(
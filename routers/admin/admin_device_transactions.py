@@ -1,10 +1,14 @@
-from fastapi import APIRouter, Depends, Query
+from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, or_, func
+from sqlalchemy import select
 from sqlalchemy.orm import joinedload
 from datetime import datetime, time
 
+from config import TRANSACTIONS_MAX_PAGE_SIZE, TRANSACTIONS_PAGE_SIZE
 from db.session import get_db
+from services.history_export import ExportFormatError, export_response
+from services.pagination import paginate_keyset
+from services.search import search_condition
 from app.dependencies.admin import require_admin
 from models.device_transaction import DeviceChangeTransaction
 from models.db_user import UserDB
@@ -15,11 +19,53 @@ router = APIRouter(
     tags=["Admin Device Transactions"]
 )
 
-PAGE_SIZE = 10
+PAGE_SIZE = TRANSACTIONS_PAGE_SIZE
+
+def apply_device_transaction_filters(
+    stmt,
+    user_q: str | None = None,
+    device_q: str | None = None,
+    date_from: datetime | None = None,
+    date_to: datetime | None = None
+):
+    """Фільтри історії змін (stmt має містити join користувача і пристрою)"""
+
+    # 🔍 фільтр по користувачу
+    if user_q and user_q.strip():
+        stmt = stmt.where(
+            search_condition(
+                user_q,
+                [UserDB.username, UserDB.first_name, UserDB.last_name]
+            )
+        )
+
+    # 🔍 фільтр по пристрою
+    if device_q and device_q.strip():
+        stmt = stmt.where(
+            search_condition(device_q, [DeviceDB.name])
+        )
+
+    # 📅 дата ВІД
+    if date_from:
+        stmt = stmt.where(DeviceChangeTransaction.timestamp >= date_from)
+
+    # 📅 дата ДО
+    if date_to:
+        stmt = stmt.where(
+            DeviceChangeTransaction.timestamp <= datetime.combine(
+                date_to.date(), time.max
+            )
+        )
+
+    return stmt
+
 
 @router.get("")
 async def get_device_transactions(
     page: int = Query(1, ge=1),
+    page_size: int = Query(PAGE_SIZE, ge=1, le=TRANSACTIONS_MAX_PAGE_SIZE),
+    cursor: str | None = Query(None),
+    with_total: bool = Query(True),
     user_q: str | None = Query(None),
     device_q: str | None = Query(None),
     date_from: datetime | None = Query(None),
@@ -35,49 +81,65 @@ async def get_device_transactions(
         )
         .join(DeviceChangeTransaction.user)
         .join(DeviceChangeTransaction.device)
-        .order_by(DeviceChangeTransaction.timestamp.desc())
     )
 
-    # 🔍 фільтр по користувачу
-    if user_q:
-        stmt = stmt.where(
-            or_(
-                UserDB.username.ilike(f"%{user_q}%"),
-                UserDB.first_name.ilike(f"%{user_q}%"),
-                UserDB.last_name.ilike(f"%{user_q}%"),
-            )
-        )
+    stmt = apply_device_transaction_filters(
+        stmt, user_q, device_q, date_from, date_to
+    )
 
-    # 🔍 фільтр по пристрою
-    if device_q:
-        stmt = stmt.where(
-            DeviceDB.name.ilike(f"%{device_q}%")
-        )
+    return await paginate_keyset(
+        db,
+        stmt,
+        key_columns=(DeviceChangeTransaction.timestamp, DeviceChangeTransaction.id),
+        count_key=("device_transactions", user_q, device_q, date_from, date_to),
+        page=page,
+        page_size=page_size,
+        cursor=cursor,
+        with_total=with_total
+    )
 
-    # 📅 дата ВІД
-    if date_from:
-        stmt = stmt.where(DeviceChangeTransaction.timestamp >= date_from)
 
-    # 📅 дата ДО
-    if date_to:
-        stmt = stmt.where(
-            DeviceChangeTransaction.timestamp <= datetime.combine(
-                date_to.date(), time.max
-            )
+@router.get("/export")
+async def export_device_transactions(
+    format: str = Query("csv", pattern="^(csv|xlsx)$"),
+    user_q: str | None = Query(None),
+    device_q: str | None = Query(None),
+    date_from: datetime | None = Query(None),
+    date_to: datetime | None = Query(None),
+    current_user=Depends(require_admin)
+):
+    """Вся відфільтрована історія змін одним файлом (CSV або XLSX), потоково"""
+
+    stmt = (
+        select(
+            DeviceChangeTransaction.id,
+            DeviceChangeTransaction.timestamp,
+            UserDB.username,
+            UserDB.first_name,
+            UserDB.last_name,
+            DeviceDB.name,
+            DeviceDB.serial_number,
+            DeviceChangeTransaction.description
         )
+        .select_from(DeviceChangeTransaction)
+        .join(DeviceChangeTransaction.user)
+        .join(DeviceChangeTransaction.device)
+        .order_by(DeviceChangeTransaction.timestamp.desc(), DeviceChangeTransaction.id.desc())
+    )
 
-    # 🔢 total
-    count_stmt = select(func.count()).select_from(stmt.subquery())
-    total = (await db.execute(count_stmt)).scalar_one()
-    pages = max(1, (total + PAGE_SIZE - 1) // PAGE_SIZE)
-
-    # 📄 пагінація
-    stmt = stmt.offset((page - 1) * PAGE_SIZE).limit(PAGE_SIZE)
-    result = await db.execute(stmt)
-
-    return {
-        "items": result.scalars().all(),
-        "page": page,
-        "pages": pages,
-        "total": total
-    }
+    stmt = apply_device_transaction_filters(
+        stmt, user_q, device_q, date_from, date_to
+    )
+
+    try:
+        return export_response(
+            stmt,
+            header=[
+                "ID", "Data", "Użytkownik", "Imię", "Nazwisko",
+                "Urządzenie", "S/N", "Opis"
+            ],
+            export_format=format,
+            filename="zmiany_urzadzen"
+        )
+    except ExportFormatError as e:
+        raise HTTPException(status_code=400, detail=str(e))
@@ -1,9 +1,13 @@
-from fastapi import APIRouter, Depends, Query
+from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, or_, func
+from sqlalchemy import select
 from sqlalchemy.orm import joinedload
 
+from config import TRANSACTIONS_MAX_PAGE_SIZE, TRANSACTIONS_PAGE_SIZE
 from db.session import get_db
+from services.history_export import ExportFormatError, export_response
+from services.pagination import paginate_keyset
+from services.search import search_condition
 from app.dependencies.admin import require_manager_or_admin
 from models.db_transaction import TransactionDB
 from models.db_employee import EmployeeDB
@@ -16,44 +20,31 @@ router = APIRouter(
     tags=["Admin Transactions"]
 )
 
-PAGE_SIZE = 10
+PAGE_SIZE = TRANSACTIONS_PAGE_SIZE
 
-@router.get("")
-async def get_transactions(
-    page: int = Query(1, ge=1),
-    employee_q: str | None = Query(None),
-    device_q: str | None = Query(None),
-    date_from: datetime | None = Query(None),
-    date_to: datetime | None = Query(None),
-    tx_type: TransactionType | None = Query(None),
-    db: AsyncSession = Depends(get_db),
-    user=Depends(require_manager_or_admin)
+def apply_transaction_filters(
+    stmt,
+    employee_q: str | None = None,
+    device_q: str | None = None,
+    date_from: datetime | None = None,
+    date_to: datetime | None = None,
+    tx_type: TransactionType | None = None
 ):
-    stmt = (
-        select(TransactionDB)
-        .options(
-            joinedload(TransactionDB.employee),
-            joinedload(TransactionDB.device)
-        )
-        .outerjoin(TransactionDB.employee)
-        .join(TransactionDB.device)
-        .order_by(TransactionDB.timestamp.desc())
-    )
+    """Фільтри історії (stmt має містити join працівника і пристрою)"""
 
     # 🔍 працівник
-    if employee_q:
+    if employee_q and employee_q.strip():
         stmt = stmt.where(
-            or_(
-                EmployeeDB.wms_login.ilike(f"%{employee_q}%"),
-                EmployeeDB.first_name.ilike(f"%{employee_q}%"),
-                EmployeeDB.last_name.ilike(f"%{employee_q}%"),
+            search_condition(
+                employee_q,
+                [EmployeeDB.wms_login, EmployeeDB.first_name, EmployeeDB.last_name]
             )
         )
 
     # 🔍 пристрій
-    if device_q:
+    if device_q and device_q.strip():
         stmt = stmt.where(
-            DeviceDB.name.ilike(f"%{device_q}%")
+            search_condition(device_q, [DeviceDB.name])
         )
 
     # 📅 дата ВІД
@@ -72,18 +63,93 @@ async def get_transactions(
     if tx_type:
         stmt = stmt.where(TransactionDB.type == tx_type)
 
-    # 🔢 total
-    count_stmt = select(func.count()).select_from(stmt.subquery())
-    total = (await db.execute(count_stmt)).scalar_one()
-    pages = max(1, (total + PAGE_SIZE - 1) // PAGE_SIZE)
-
-    # 📄 пагінація
-    stmt = stmt.offset((page - 1) * PAGE_SIZE).limit(PAGE_SIZE)
-    result = await db.execute(stmt)
-
-    return {
-        "items": result.scalars().all(),
-        "page": page,
-        "pages": pages,
-        "total": total
-    }
+    return stmt
+
+
+@router.get("")
+async def get_transactions(
+    page: int = Query(1, ge=1),
+    page_size: int = Query(PAGE_SIZE, ge=1, le=TRANSACTIONS_MAX_PAGE_SIZE),
+    cursor: str | None = Query(None),
+    with_total: bool = Query(True),
+    employee_q: str | None = Query(None),
+    device_q: str | None = Query(None),
+    date_from: datetime | None = Query(None),
+    date_to: datetime | None = Query(None),
+    tx_type: TransactionType | None = Query(None),
+    db: AsyncSession = Depends(get_db),
+    user=Depends(require_manager_or_admin)
+):
+    stmt = (
+        select(TransactionDB)
+        .options(
+            joinedload(TransactionDB.employee),
+            joinedload(TransactionDB.device)
+        )
+        .outerjoin(TransactionDB.employee)
+        .join(TransactionDB.device)
+    )
+
+    stmt = apply_transaction_filters(
+        stmt, employee_q, device_q, date_from, date_to, tx_type
+    )
+
+    return await paginate_keyset(
+        db,
+        stmt,
+        key_columns=(TransactionDB.timestamp, TransactionDB.id),
+        count_key=("admin_transactions", employee_q, device_q, date_from, date_to, tx_type),
+        page=page,
+        page_size=page_size,
+        cursor=cursor,
+        with_total=with_total
+    )
+
+
+@router.get("/export")
+async def export_transactions(
+    format: str = Query("csv", pattern="^(csv|xlsx)$"),
+    employee_q: str | None = Query(None),
+    device_q: str | None = Query(None),
+    date_from: datetime | None = Query(None),
+    date_to: datetime | None = Query(None),
+    tx_type: TransactionType | None = Query(None),
+    user=Depends(require_manager_or_admin)
+):
+    """Вся відфільтрована історія одним файлом (CSV або XLSX), потоково"""
+
+    stmt = (
+        select(
+            TransactionDB.id,
+            TransactionDB.timestamp,
+            TransactionDB.type,
+            EmployeeDB.first_name,
+            EmployeeDB.last_name,
+            EmployeeDB.wms_login,
+            EmployeeDB.department,
+            DeviceDB.name,
+            DeviceDB.type,
+            DeviceDB.serial_number
+        )
+        .select_from(TransactionDB)
+        .outerjoin(TransactionDB.employee)
+        .join(TransactionDB.device)
+        .order_by(TransactionDB.timestamp.desc(), TransactionDB.id.desc())
+    )
+
+    stmt = apply_transaction_filters(
+        stmt, employee_q, device_q, date_from, date_to, tx_type
+    )
+
+    try:
+        return export_response(
+            stmt,
+            header=[
+                "ID", "Data", "Typ", "Imię", "Nazwisko", "Login WMS",
+                "Dział", "Urządzenie", "Typ urządzenia", "S/N"
+            ],
+            export_format=format,
+            filename="transakcje"
+        )
+    except ExportFormatError as e:
+        raise HTTPException(status_code=400, detail=str(e))
@@ -1,19 +1,33 @@
-from fastapi import APIRouter, Depends, Body, Query, HTTPException
+import asyncio
+import json
+
+from fastapi import APIRouter, Depends, Body, Query, HTTPException, File, UploadFile, Request
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import selectinload
 from sqlalchemy.exc import IntegrityError
 from models.db_department_manager import DepartmentManagerDB
 from models.db_guest import DBGuest
 from models.device_transaction import DeviceChangeTransaction
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import func, select, or_, and_
+from sqlalchemy import select, or_, and_
 
-from db.session import get_db
+from db.session import background_session, get_db
 from app.dependencies.admin import require_admin, require_manager_or_admin
 from models.db_employee import EmployeeDB
 from models.db_device import DeviceDB, DeviceType, SiteType
 from models.db_port import DevicePortDB
 from models.db_device_status import DeviceStatusDB
 from services.device_transactions import build_change_descriptions, create_device_transaction
+from services.employee_import import import_employees
+from services.search import search_condition
+from services.inventory_import import (
+    InventoryImportError,
+    import_inventory,
+    read_csv_rows,
+    read_xlsx_sheets,
+)
+from managers.rfid_index import rfid_index
+from managers.dashboard_stats import dashboard_stats
 
 router = APIRouter(
     prefix="/admin/api",
@@ -52,6 +66,7 @@ async def create_employee(
         db.add(employee)
         await db.commit()
         await db.refresh(employee)
+        rfid_index.put_employee(employee)
         return employee
         
     except IntegrityError as e:
@@ -79,6 +94,73 @@ async def create_employee(
         )
 
 
+# ===============================
+# BULK IMPORT
+# ===============================
+
+async def _read_employee_rows(request: Request) -> list[dict]:
+    """Рядки з JSON-масиву або CSV (тіло text/csv чи поле file форми)"""
+
+    content_type = request.headers.get("content-type", "")
+
+    if content_type.startswith("multipart/form-data"):
+        form = await request.form()
+        upload = form.get("file")
+        if upload is None or isinstance(upload, str):
+            raise HTTPException(status_code=400, detail="Brak pliku CSV")
+        content = await upload.read()
+    elif content_type.startswith("text/csv"):
+        content = await request.body()
+    else:
+        payload = await request.json()
+        if isinstance(payload, dict):
+            payload = payload.get("employees")
+        if not isinstance(payload, list):
+            raise HTTPException(status_code=400, detail="Oczekiwano listy pracowników")
+        return payload
+
+    try:
+        rows = read_csv_rows(content)
+    except UnicodeDecodeError:
+        raise HTTPException(status_code=400, detail="Plik CSV musi być w UTF-8")
+
+    if not rows:
+        return []
+
+    header = [column.strip() for column in rows[0]]
+    return [dict(zip(header, row)) for row in rows[1:] if any(cell.strip() for cell in row)]
+
+
+@router.post("/employees/bulk")
+async def bulk_import_employees(
+    request: Request,
+    update_existing: bool = Query(default=True),
+    stream: bool = Query(default=False),
+    db: AsyncSession = Depends(get_db),
+    user=Depends(require_admin)
+):
+    """
+    Масовий імпорт/оновлення працівників (ключ - rfid).
+    stream=true - NDJSON з подіями progress і фінальним result.
+    """
+
+    raw_rows = await _read_employee_rows(request)
+
+    if not stream:
+        result = None
+        async for event in import_employees(db, raw_rows, update_existing):
+            result = event
+        return {"summary": result["summary"], "rows": result["rows"]}
+
+    async def events():
+        # власна сесія - відповідь живе довше за залежність get_db
+        async with background_session() as session:
+            async for event in import_employees(session, raw_rows, update_existing):
+                yield json.dumps(event, ensure_ascii=False) + "\n"
+
+    return StreamingResponse(events(), media_type="application/x-ndjson")
+
+
 # ===============================
 # LIST + SEARCH
 # ===============================
@@ -86,20 +168,26 @@ async def create_employee(
 @router.get("/employees")
 async def get_employees(
     q: str | None = Query(default=None),
+    match: str = Query(default="auto", pattern="^(auto|contains|prefix)$"),
+    limit: int | None = Query(default=None, ge=1, le=500),
     db: AsyncSession = Depends(get_db),
     user=Depends(require_admin)
 ):
     stmt = select(EmployeeDB)
 
-    if q:
+    if q and q.strip():
         stmt = stmt.where(
-            or_(
-                EmployeeDB.first_name.ilike(f"%{q}%"),
-                EmployeeDB.last_name.ilike(f"%{q}%"),
-                EmployeeDB.wms_login.ilike(f"%{q}%")
+            search_condition(
+                q,
+                [EmployeeDB.first_name, EmployeeDB.last_name, EmployeeDB.wms_login],
+                mode=match
             )
         )
     stmt = stmt.order_by(EmployeeDB.last_name, EmployeeDB.first_name)
+
+    # typeahead - лише перші збіги
+    if limit:
+        stmt = stmt.limit(limit)
     result = await db.execute(stmt)
     return result.scalars().all()
 
@@ -146,6 +234,8 @@ async def update_employee(
         if not employee:
             raise HTTPException(status_code=404, detail="Pracownik nie znaleziony")
 
+        touched_guests = []
+
         for field in ["wms_login", "first_name", "last_name", "company", "rfid", "department"]:
             if field in payload:
                 value = payload[field]
@@ -168,6 +258,8 @@ async def update_employee(
                     
                     if new_guest:
                         new_guest.used = True
+
+                    touched_guests = [g for g in (old_guest, new_guest) if g]
                     
                     # Single commit for both changes
                     await db.commit()
@@ -177,6 +269,9 @@ async def update_employee(
 
         await db.commit()
         await db.refresh(employee)
+        rfid_index.put_employee(employee)
+        for guest in touched_guests:
+            rfid_index.put_guest(guest)
         return employee
         
     except IntegrityError as e:
@@ -217,6 +312,7 @@ async def delete_employee(
 
         await db.delete(employee)
         await db.commit()
+        rfid_index.remove_employee(employee_id)
         return {"message": "Pracownik został usunięty ✅"}
 
     except Exception as e:
@@ -275,6 +371,7 @@ async def create_guest(
         db.add(guest)
         await db.commit()
         await db.refresh(guest)
+        rfid_index.put_guest(guest)
         return guest
         
     except IntegrityError as e:
@@ -338,6 +435,7 @@ async def update_guest(
 
         await db.commit()
         await db.refresh(guest)
+        rfid_index.put_guest(guest)
         return guest
         
     except IntegrityError as e:
@@ -399,6 +497,7 @@ async def delete_guest(
 
         await db.delete(guest)
         await db.commit()
+        rfid_index.remove_guest(guest_id)
         return {"message": "Gość został usunięty"}
 
     except HTTPException:
@@ -465,6 +564,8 @@ async def create_temporary_employee(
         db.add(guest)
         await db.commit()
         await db.refresh(employee)
+        rfid_index.put_employee(employee)
+        rfid_index.put_guest(guest)
         
         return {
             "employee": employee,
@@ -551,6 +652,7 @@ async def create_device(
         db.add(device)
         await db.commit()
         await db.refresh(device)
+        rfid_index.put_device(device)
         return device
         
     except IntegrityError as e:
@@ -590,6 +692,7 @@ async def create_device(
 @router.get("/devices")
 async def get_devices(
     q: str | None = Query(default=None),
+    match: str = Query(default="auto", pattern="^(auto|contains|prefix)$"),
     status_ids: list[int] | None = Query(default=None),
     db: AsyncSession = Depends(get_db),
     user=Depends(require_admin)
@@ -603,12 +706,13 @@ async def get_devices(
         )
     )
 
-    if q:
+    if q and q.strip():
         stmt = stmt.where(
-            or_(
-                DeviceDB.name.ilike(f"%{q}%"),
-                DeviceDB.serial_number.ilike(f"%{q}%"),
-                DeviceDB.rfid.ilike(f"%{q}%")
+            search_condition(
+                q,
+                [DeviceDB.name],
+                code_columns=[DeviceDB.serial_number, DeviceDB.rfid],
+                mode=match
             )
         )
 
@@ -797,6 +901,7 @@ async def update_device(
 
         await db.commit()
         await db.refresh(device)
+        rfid_index.put_device(device)
         
         if changes or port_changes:
 
@@ -815,6 +920,7 @@ async def update_device(
                 device=device,
                 descriptions=descriptions
             )
+            await db.commit()
 
         return device
 
@@ -864,6 +970,60 @@ async def delete_device(
 
     await db.delete(device)
     await db.commit()
+    rfid_index.remove_device(device_id)
+
+
+# ===============================
+# DEVICES IMPORT
+# ===============================
+
+@router.post("/devices/import")
+async def import_devices(
+    file: UploadFile | None = File(default=None),
+    dry_run: bool = Query(default=True),
+    device_type: DeviceType | None = Query(default=None),
+    db: AsyncSession = Depends(get_db),
+    user=Depends(require_admin)
+):
+    """
+    Імпорт інвентаризації: з завантаженого CSV/XLSX або, без файлу,
+    з Google Sheets. За замовчуванням - лише звіт змін (dry_run).
+    """
+
+    try:
+        sheets = None
+
+        if file is not None:
+            content = await file.read()
+            filename = (file.filename or "").lower()
+
+            if filename.endswith(".xlsx"):
+                sheets = await asyncio.to_thread(read_xlsx_sheets, content)
+            else:
+                sheets = [(file.filename or "CSV", read_csv_rows(content))]
+
+        report = await import_inventory(
+            db,
+            sheets=sheets,
+            default_type=device_type,
+            dry_run=dry_run
+        )
+
+    except InventoryImportError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except UnicodeDecodeError:
+        raise HTTPException(status_code=400, detail="Plik CSV musi być w UTF-8")
+    except IntegrityError:
+        await db.rollback()
+        raise HTTPException(
+            status_code=400,
+            detail="Błąd bazy danych: import przerwany, dane nie zostały zapisane"
+        )
+
+    if not dry_run:
+        await rfid_index.reload(db)
+
+    return report
 
 
 # ===============================
@@ -1129,99 +1289,5 @@ async def get_dashboard(
     db: AsyncSession = Depends(get_db),
     user=Depends(require_manager_or_admin)
 ):
-    # =========================
-    # GLOBAL COUNTS
-    # =========================
-    available_stmt = select(func.count()).select_from(DeviceDB).where(DeviceDB.enabled == True)
-    disabled_stmt = select(func.count()).select_from(DeviceDB).where(DeviceDB.enabled == False)
-
-    available = (await db.execute(available_stmt)).scalar() or 0
-    disabled = (await db.execute(disabled_stmt)).scalar() or 0
-
-    # =========================
-    # BY TYPE (ENABLED)
-    # =========================
-    type_stmt = (
-        select(
-            DeviceDB.type,
-            func.count()
-        )
-        .where(DeviceDB.enabled == True)
-        .group_by(DeviceDB.type)
-    )
-
-    type_result = await db.execute(type_stmt)
-
-    types = {
-        "scanner": 0,
-        "printer": 0
-    }
-
-    for t, count in type_result:
-        types[t.value] = count
-
-    # =========================
-    # BY TYPE (DISABLED)
-    # =========================
-    disabled_type_stmt = (
-        select(
-            DeviceDB.type,
-            func.count()
-        )
-        .where(DeviceDB.enabled == False)
-        .group_by(DeviceDB.type)
-    )
-
-    disabled_type_result = await db.execute(disabled_type_stmt)
-
-    disabled_types = {
-        "scanner": 0,
-        "printer": 0
-    }
-
-    for t, count in disabled_type_result:
-        disabled_types[t.value] = count
-
-    # =========================
-    # DEPARTMENTS (FULL DATA)
-    # =========================
-    dept_stmt = (
-        select(
-            EmployeeDB.department,
-
-            func.count(func.distinct(EmployeeDB.id)).label("employees"),
-            func.count(DeviceDB.id).label("devices"),
-
-            func.count().filter(DeviceDB.type == DeviceType.scanner).label("scanners"),
-            func.count().filter(DeviceDB.type == DeviceType.printer).label("printers"),
-        )
-        .join(DeviceDB, DeviceDB.employee_id == EmployeeDB.id)
-        .where(
-            DeviceDB.enabled == True,
-            DeviceDB.employee_id.is_not(None)
-        )
-        .group_by(EmployeeDB.department)
-    )
-
-    dept_result = await db.execute(dept_stmt)
-
-    departments = [
-        {
-            "department": row.department or "Brak",
-            "employees": row.employees or 0,
-            "devices": row.devices or 0,
-            "scanners": row.scanners or 0,
-            "printers": row.printers or 0,
-        }
-        for row in dept_result
-    ]
-
-    return {
-        "devices": {
-            "available": available,
-            "disabled": disabled,
-            "by_type": types,
-            "disabled_by_type": disabled_types
-        },
-        "departments": departments
-    }
\ No newline at end of file
+    # лічильники ведуться інкрементально (rfid_index), БД - лише на холодному старті
+    return await dashboard_stats.get_snapshot(db)
\ No newline at end of file
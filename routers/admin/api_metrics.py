@@ -0,0 +1,25 @@
+"""Метрики кешів і черг (тільки для адміністраторів)"""
+from typing import Any, Dict
+
+from fastapi import APIRouter, Depends
+
+from app.dependencies.admin import require_admin
+from db.session import pool_metrics
+from managers.auth_manager import auth_manager
+from services.sheet_sync import sheet_sync_worker
+
+router = APIRouter(prefix="/admin/api/metrics", tags=["Admin Metrics"])
+
+
+@router.get("")
+async def get_metrics(_: dict = Depends(require_admin)) -> Dict[str, Any]:
+    from app.main import esp_ingest, scan_dedup
+
+    return {
+        "auth_token_cache": auth_manager.sessions.stats(),
+        "password_hasher": auth_manager.hasher.stats(),
+        "db_pools": pool_metrics(),
+        "esp_ingest": esp_ingest.stats(),
+        "scan_dedup": scan_dedup.stats(),
+        "sheet_sync": await sheet_sync_worker.stats(),
+    }
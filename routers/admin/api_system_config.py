@@ -23,6 +23,7 @@ class ConfigUpdateRequest(BaseModel):
     auth_cleanup_interval_seconds: Optional[int] = None
     device_not_returned_hours: Optional[int] = None
     allow_registration_without_login: Optional[bool] = None
+    scan_dedup_window_ms: Optional[int] = None
     
     class Config:
         json_schema_extra = {
@@ -80,12 +81,12 @@ async def update_config(
             raise ValueError("device_timeout_minutes must be > 0")
         if "registration_timeout_seconds" in updates and updates["registration_timeout_seconds"] <= 0:
             raise ValueError("registration_timeout_seconds must be > 0")
+        if "scan_dedup_window_ms" in updates and updates["scan_dedup_window_ms"] < 0:
+            raise ValueError("scan_dedup_window_ms must be >= 0")
         
+        # менеджери (тут і на інших воркерах) оновлюються через слухачів config_manager
         updated_config = await config_manager.update_config(db, updates)
         
-        # Оновити менеджери з новими значеннями
-        _update_managers(updated_config)
-        
         logger.info(f"System configuration updated: {updates}")
         
         return {
@@ -106,29 +107,6 @@ async def update_config(
         )
 
 
-def _update_managers(config: Dict[str, Any]):
-    """
-    Оновити менеджери з новими значеннями таймаутів.
-    Це забезпечує миттєве застосування змін для request-обробки.
-    
-    Фонові задачи (cleanup functions) беруть конфіги безпосередньо з config_manager.
-    """
-    try:
-        # Імпортуємо тут, щоб уникнути циклічних імпортів
-        from app.main import device_manager, registration_manager
-        
-        if "device_timeout_minutes" in config:
-            device_manager.update_timeout(config["device_timeout_minutes"])
-        
-        if "registration_timeout_seconds" in config:
-            registration_manager.update_timeout(config["registration_timeout_seconds"])
-        
-        logger.info("Device and registration managers updated with new timeouts")
-    except Exception as e:
-        logger.error(f"Error updating managers: {e}")
-        # Не піднімаємо помилку, оскільки конфіг все одно зберігся в БД
-
-
 @router.post("/refresh-cache")
 async def refresh_cache(
     db: AsyncSession = Depends(get_db),
@@ -139,11 +117,7 @@ async def refresh_cache(
     Доступно тільки для адміністраторів.
     """
     try:
-        config_manager.invalidate_cache()
-        config = await config_manager.get_config(db)
-        
-        # Також оновити менеджери
-        _update_managers(config)
+        config = await config_manager.reload(db)
         
         return {
             "status": "ok",
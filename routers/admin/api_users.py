@@ -7,6 +7,7 @@ from app.dependencies.admin import require_admin
 from models.db_user import UserDB, UserRole
 from schemas.user import UserCreate, UserUpdate
 from managers.auth_manager import auth_manager
+from routers.auth import hash_password_or_503
 
 router = APIRouter(
     prefix="/admin/api",
@@ -67,7 +68,7 @@ async def create_user(
     db: AsyncSession = Depends(get_db),
     user=Depends(require_admin)
 ):
-    hashed = auth_manager.get_password_hash(payload.password)
+    hashed = await hash_password_or_503(payload.password)
 
     db_user = UserDB(
         first_name=payload.first_name,
@@ -103,7 +104,7 @@ async def update_user(
         raise HTTPException(404, "User not found")
 
     if payload.password:
-        db_user.password_hash = auth_manager.get_password_hash(payload.password)
+        db_user.password_hash = await hash_password_or_503(payload.password)
 
     for field in ["first_name", "last_name", "role", "is_active"]:
         value = getattr(payload, field)
@@ -112,6 +113,9 @@ async def update_user(
 
     await db.commit()
     await db.refresh(db_user)
+
+    # роль / активність / пароль могли змінитись - токени перевіряються заново
+    auth_manager.revoke_user(user_id)
     return db_user
 
 # ===============================
@@ -134,3 +138,4 @@ async def delete_user(
 
     await db.delete(db_user)
     await db.commit()
+    auth_manager.revoke_user(user_id)
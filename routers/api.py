@@ -1,23 +1,26 @@
+import logging
 from datetime import datetime, timezone
 
 from fastapi import APIRouter, Depends, HTTPException
 from fastapi import status
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
-from sqlalchemy.orm import selectinload
+from sqlalchemy.exc import SQLAlchemyError
 
 from managers.connection_manager import ConnectionManager
 from managers.device_manager import DeviceManager
 from managers.config_manager import config_manager
-from db.session import get_db
-from models.db_employee import EmployeeDB
+from managers.rfid_index import rfid_index
+from managers.ingest_queue import IngestQueueFull
+from db.session import async_session, get_db
 from models.db_device import DeviceDB, DeviceType
-from models.db_transaction import TransactionDB
-from models.db_guest import DBGuest
-from models.db_transaction import TransactionType as DbTransactionType
-from schemas.transaction import TransactionType
 from routers.auth import get_current_user
+from schemas.esp import EspScanBatch
+from services.device_assignment import assign_device, unassign_device
+from services.scan_receipts import claim_scans
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/api", tags=["API"])
 
@@ -42,24 +45,18 @@ async def can_register_on_device(
 ):
     """
     Дозвіл на реєстрацію якщо:
-    - є user у esp_allowed_users
+    - є user у esp_access
     - І є websocket слухач цього ESP
     """
 
-    from app.main import esp_allowed_users
+    from app.main import esp_access
 
     # users які дозволили реєстрацію
-    device_users = esp_allowed_users.get(device_id, set())
-    if not device_users:
+    if not esp_access.users(device_id):
         return False
 
     # websocket слухачі
-    listeners = [
-        ws for ws, subscribed in manager.connections.items()
-        if subscribed == device_id
-    ]
-
-    if not listeners:
+    if not manager.has_subscribers(device_id):
         return False
 
     return True
@@ -67,6 +64,13 @@ async def can_register_on_device(
 
 # ---------- DATA ENDPOINT (ESP32) ----------
 
+def validate_esp32_data(data: Dict[str, Any]):
+    """Перевірка до постановки в чергу - помилку бачить сам ESP"""
+    rfid = data.get("rfid")
+    if rfid is not None and not isinstance(rfid, str):
+        raise HTTPException(422, "rfid must be a string")
+
+
 @router.post("/data/{device_id}")
 async def receive_esp32_data(
     device_id: str,
@@ -77,230 +81,331 @@ async def receive_esp32_data(
     current_user: dict = Depends(get_current_user(False)),
 
 ):
-    from app.main import registration_manager, esp_allowed_users
+    from app.main import esp_ingest
+
+    validate_esp32_data(data)
+
+    if esp_ingest.running:
+        # ESP не чекає на відповідь - обробка у воркері зчитувача, по порядку
+        try:
+            esp_ingest.submit(device_id, data)
+        except IngestQueueFull:
+            raise HTTPException(503, "Reader queue is full")
+        return {"status": "queued"}
+
+    # черга вимкнена (ESP_INGEST_QUEUE_ENABLED=false) або додаток ще не стартував
+    await process_esp32_data(device_id, data, devices, manager, db)
+    return {"status": "ok"}
+
+
+@router.post("/data/{device_id}/batch")
+async def receive_esp32_batch(
+    device_id: str,
+    batch: EspScanBatch,
+    devices: DeviceManager = Depends(get_devices),
+    manager: ConnectionManager = Depends(get_manager),
+    db: AsyncSession = Depends(get_db),
+    current_user: dict = Depends(get_current_user(False)),
+):
+    """
+    Пачка сканів з буфера SD одним запитом і однією транзакцією.
+
+    Кожен скан обробляється так само, як POST /data/{device_id}, у порядку
+    пачки. Скани з уже відомим id (повтор після обриву WiFi) пропускаються.
+    Відповідь - після commit, тож ESP може видалити підтверджені скани з SD.
+
+    Повідомлення для UI розсилаються лише після commit. Якщо commit не
+    вдався, сесія реєстрації і rfid_index повертаються до стану з БД.
+
+    scanned_at - час транзакцій зі скану; сесія реєстрації оцінюється
+    за часом сканів (картка о t0, пристрій о t0 + 3 с - закріплення,
+    навіть якщо пачка прийшла через годину).
+    """
+    from app.main import esp_ingest, registration_manager
+
+    scans = {}
+    for scan in batch.scans:
+        validate_esp32_data(scan.data)
+        scans.setdefault(scan.id, scan)
+
+    # одиночні скани цього ESP, що ще в черзі, - спершу
+    await esp_ingest.join(device_id)
+
+    new_ids = await claim_scans(db, device_id, scans.keys())
+
+    # сесія до пачки - для відкату
+    previous = registration_manager.get(device_id)
+    if previous is not None:
+        previous = (previous.employee, previous.started_at)
+
+    now = datetime.now(timezone.utc)
+    outbox: List[Dict[str, Any]] = []
+    for scan_id, scan in scans.items():
+        if scan_id not in new_ids:
+            continue
+
+        data = dict(scan.data)
+        scanned_at = scan.scanned_at
+        if scanned_at:
+            if scanned_at.tzinfo is None:
+                # годинник ESP - UTC
+                scanned_at = scanned_at.replace(tzinfo=timezone.utc)
+            # годинник ESP попереду сервера - не пишемо час з майбутнього
+            scanned_at = min(scanned_at, now)
+            data.setdefault("scanned_at", scanned_at.isoformat())
+        await process_esp32_data(
+            device_id, data, devices, manager, db, outbox=outbox, scanned_at=scanned_at
+        )
+
+    try:
+        await db.commit()
+    except SQLAlchemyError:
+        await db.rollback()
+        if previous is None:
+            registration_manager.end(device_id)
+        else:
+            registration_manager.restore(device_id, *previous)
+        # призначення в індексі не дійшли до БД - перечитати
+        await rfid_index.reload(db)
+        raise HTTPException(503, "Batch not saved, retry")
+
+    for payload in outbox:
+        await manager.broadcast_device_data(device_id, payload)
+    if outbox:
+        await manager.broadcast_device_list()
+
+    return {
+        "status": "ok",
+        "processed": [scan_id for scan_id in scans if scan_id in new_ids],
+        "duplicates": [scan_id for scan_id in scans if scan_id not in new_ids],
+    }
+
+
+async def process_queued_esp32_data(device_id: str, data: Dict[str, Any]):
+    """Обробник черги: власна сесія БД на кожен скан"""
+    async with async_session() as db:
+        await process_esp32_data(device_id, data, get_devices(), get_manager(), db)
+
+
+async def process_esp32_data(
+    device_id: str,
+    data: Dict[str, Any],
+    devices: DeviceManager,
+    manager: ConnectionManager,
+    db: AsyncSession,
+    outbox: Optional[List[Dict[str, Any]]] = None,
+    scanned_at: Optional[datetime] = None,
+) -> Optional[Dict[str, Any]]:
+    """
+    Один скан: стан пристрою, сесія реєстрації, закріплення в БД, статус для UI.
+    Повертає registration_status (None - дані без RFID).
+
+    outbox - скан з пачки: зміни в БД не комітяться, а повідомлення для UI
+    додаються в outbox і розсилаються після commit пачки. scanned_at - час
+    скану з буфера ESP (None - щойно).
+
+    Повтор скану (той самий зчитувач, rfid і nonce) у вікні дедуплікації
+    отримує результат першого без звернень до БД. Пачки мають власні
+    ключі ідемпотентності і не кешуються до commit.
+    """
+    from app.main import scan_dedup
+
+    rfid = data.get("rfid")
+    if not rfid or outbox is not None:
+        return await _process_scan(device_id, data, devices, manager, db, outbox, scanned_at)
+
+    return await scan_dedup.run(
+        scan_dedup.key(device_id, rfid, data.get("nonce")),
+        lambda: _process_scan(device_id, data, devices, manager, db, outbox, scanned_at),
+        # дублікат - все одно ознака життя зчитувача
+        on_duplicate=lambda: devices.touch(device_id),
+    )
+
+
+async def _process_scan(
+    device_id: str,
+    data: Dict[str, Any],
+    devices: DeviceManager,
+    manager: ConnectionManager,
+    db: AsyncSession,
+    outbox: Optional[List[Dict[str, Any]]],
+    scanned_at: Optional[datetime],
+) -> Optional[Dict[str, Any]]:
+    from app.main import registration_manager
+
+    commit = outbox is None
+
+    async def send(payload: Dict[str, Any]):
+        if outbox is None:
+            await manager.broadcast_device_data(device_id, payload)
+        else:
+            outbox.append(payload)
 
     device = devices.update_device_data(device_id, data)
     # Broadcast ESP data
     if device.latest_data:
-        await manager.broadcast_device_data(
-            device_id,
-            {
-                "type": "esp32_data",
-                "device_id": device_id,
-                "data": device.latest_data.data,
-            }
-        )
+        await send({
+            "type": "esp32_data",
+            "device_id": device_id,
+            "data": device.latest_data.data,
+        })
+
+    if commit:
+        await manager.broadcast_device_list()
 
-    await manager.broadcast_device_list()
-    # print("Allwed devices:", esp_allowed_users)
-    # print("Current user:", current_user)
-    
-    # Отримати конфіг динамічно з БД
-    config = await config_manager.get_config(db)
+    # Знімок конфігу - без запиту до БД і без блокування
+    config = config_manager.snapshot
     allow_registration_without_login = config.get("allow_registration_without_login", False)
-    
+
     if allow_registration_without_login:
         can_register = True
     else:
         can_register = await can_register_on_device(device_id, manager)
 
-    #     print("Allwed devices:", esp_allowed_users)
-    #     print("Current user:", current_user)
-    #     print("Can register:", can_register)
-    # print("Can register:", can_register)
     rfid = data.get("rfid")
     ui_message = None
     ui_status = "info"
 
     if not rfid:
-        return {"status": "ok"}
+        return None
 
-    # ---------- EMPLOYEE ----------
-    result = await db.execute(
-        select(EmployeeDB)
-        .options(selectinload(EmployeeDB.devices))
-        .where(EmployeeDB.rfid == rfid)
-    )
-    employee = result.scalar_one_or_none()
+    entry = await rfid_index.resolve_or_fetch(db, rfid)
 
-    if employee:
+    # ---------- EMPLOYEE ----------
+    if entry and entry.kind == "employee":
+        employee = entry
         if can_register:
-            registration_manager.start_or_replace(device_id, employee)
+            registration_manager.start_or_replace(device_id, employee, at=scanned_at)
             ui_message = (
                 f"Pracownik {employee.wms_login} aktywny. "
                 f"Przyłóż skaner lub drukarkę"
             )
-            print("ui message:", ui_message)
             ui_status = "success"
         else:
-            result = await db.execute(
-                    select(DeviceDB).where(DeviceDB.employee_id == employee.id)
-                )
-            print("Employee devices query result:", result)
-            user_devices = result.scalars().all()
-            
+            user_devices = rfid_index.devices_of(employee.id)
+
             ui_message = (
                 f"Pracownik {employee.first_name} {employee.last_name} posiada. "
                 f"{', '.join([f'{d.type.value}: {d.name}' for d in user_devices])}. "
             )
-            print("ui message:", ui_message)
             ui_status = "info"
 
-    else:
-        # ---------- DEVICE ----------
-        result = await db.execute(
-            select(DeviceDB).where(DeviceDB.rfid == rfid)
-        )
-        device_db = result.scalar_one_or_none()
+    # ---------- GUEST / UNKNOWN ----------
+    elif not entry or entry.kind == "guest":
+        ui_message = "Nieznany RFID"
+        ui_status = "error"
+        if entry:
+            ui_message = f"To jest: {entry.name}"
+            ui_status = "success"
 
-        if not device_db:
-            ui_message = "Nieznany RFID"
-            ui_status = "error"
-            guest = await db.execute(
-                select(DBGuest).where(DBGuest.rfid == rfid and DBGuest.used == False)
-            )
-            guest = guest.scalar_one_or_none()
-            if guest:
-                ui_message = f"To jest: {guest.name}"
-                ui_status = "success"
+    # ---------- DEVICE ----------
+    else:
+        device_db = entry
 
+        if not can_register:
+            if device_db.employee_id is None:
+                ui_message = (
+                    f"{device_db.type.value} {device_db.name} nie jest przypisany do nikogo. "
+                )
+                ui_status = "info"
+            else:
+                owner = await rfid_index.get_employee_or_fetch(db, device_db.employee_id)
+                ui_message = (
+                    f"{device_db.type.value} {device_db.name} "
+                    f"należy do {owner.wms_login if owner else device_db.employee_id}. "
+                    f"Brak uprawnień do rejestracji."
+                )
+                ui_status = "info"
         else:
-            if not can_register:
-                if device_db.employee_id is None:
-                    ui_message = (
-                        f"{device_db.type.value} {device_db.name} nie jest przypisany do nikogo. "
-                    )
-                    ui_status = "info"
+            session = registration_manager.get(device_id, at=scanned_at)
+
+            # brak sesji pracownika
+            if not session:
+                if device_db.employee_id is not None:
+                    await unassign_device(db, device_db.id, commit=commit, scanned_at=scanned_at)
+                    rfid_index.set_device_owner(device_db.id, None)
+
+                    ui_message = f"{device_db.type.value} {device_db.name} został odpięty"
+                    ui_status = "success"
                 else:
-                    employee_full_name = await db.execute(
-                        select(EmployeeDB).where(EmployeeDB.id == device_db.employee_id)
+                    ui_message = "Najpierw przyłóż kartę pracownika"
+                    ui_status = "error"
+
+            else:
+                employee = session.employee
+
+                owned_types = {d.type for d in rfid_index.devices_of(employee.id)}
+                held_by_other = device_db.employee_id not in (None, employee.id)
+
+                # перевірка за індексом, остаточна - в умові UPDATE
+                assigned = (
+                    not held_by_other
+                    and device_db.type not in owned_types
+                    and await assign_device(
+                        db, device_db.id, employee.id, commit=commit, scanned_at=scanned_at
                     )
-                    employee_full_name = employee_full_name.scalar_one_or_none()
+                )
+
+                if held_by_other:
+                    # пристрій не переходить мовчки: попередній власник
+                    # має його повернути (скан без сесії - odpięcie)
+                    owner = await rfid_index.get_employee_or_fetch(db, device_db.employee_id)
                     ui_message = (
                         f"{device_db.type.value} {device_db.name} "
-                        f"należy do {employee_full_name.wms_login}. "
-                        f"Brak uprawnień do rejestracji."
+                        f"należy do {owner.wms_login if owner else device_db.employee_id}. "
+                        f"Najpierw go odepnij."
                     )
-                    ui_status = "info"
-            else:
-                session = registration_manager.get(device_id)
+                    ui_status = "error"
+                elif not assigned:
+                    ui_message = (
+                        f"Pracownik już posiada {device_db.type.value} {device_db.name}"
+                    )
+                    ui_status = "error"
+                else:
+                    rfid_index.set_device_owner(device_db.id, employee.id)
 
-                # brak sesji pracownika
-                if not session:
-                    if device_db.employee_id is not None:
-                        device_db.employee_id = None
-                        await db.commit()
+                    user_devices = rfid_index.devices_of(employee.id)
+                    owned_types = {d.type.value for d in user_devices}
 
-                        ui_message = f"{device_db.type.value} {device_db.name} został odpięty"
-                        ui_status = "success"
+                    if owned_types == {"scanner", "printer"}:
+                        registration_manager.end(device_id)
 
-                        transaction = TransactionDB(
-                            type=TransactionType.unregistered,
-                            device_id=device_db.id,
-                            employee_id=None
+                        scanner = next(d for d in user_devices if d.type.value == DeviceType.scanner.value)
+                        printer = next(d for d in user_devices if d.type.value == DeviceType.printer.value)
+                        ui_message = (
+                            f"{employee.wms_login} "
+                            f"ma już skaner {scanner.name} i drukarkę {printer.name}. "
+                            f"Rejestracja zakończona."
                         )
-                        db.add(transaction)
-                        await db.commit()
+                        ui_status = "success"
                     else:
-                        ui_message = "Najpierw przyłóż kartę pracownika"
-                        ui_status = "error"
-
-                else:
-                    employee = session.employee
-
-                    result = await db.execute(
-                        select(DeviceDB).where(DeviceDB.employee_id == employee.id)
-                    )
-                    user_devices = result.scalars().all()
-                    owned_types = {d.type for d in user_devices}
-
-                    if device_db.type in owned_types:
-                        # TODO - add logic to chek if owner of device is not curent employee finish curent session and unregister device from second one employee
-                        # if device_db.employee_id != employee.id:
-                        #     device_db.employee_id = None
-                        #     await db.commit()
-                        #     ui_message = f"{device_db.type.value} {device_db.name} został odpięty"
-                        #     ui_status = "success"
-
-                        #     transaction = TransactionDB(
-                        #         type=TransactionType.unregistered,
-                        #         device_id=device_db.id,
-                        #         employee_id=None
-                        #     )
-                        #     db.add(transaction)
-                        #     await db.commit()
-
-                        #     session.end()
-                    
+                        registration_manager.refresh(device_id, at=scanned_at)
                         ui_message = (
-                            f"Pracownik już posiada {device_db.type.value} {device_db.name}"
+                            f"{device_db.type.value} {device_db.name} "
+                            f"przypisano do {employee.wms_login}"
                         )
-                        ui_status = "error"
-                    else:
-                        device_db.employee_id = employee.id
-                        await db.commit()
+                        ui_status = "success"
 
-                        result = await db.execute(
-                            select(DeviceDB)
-                            .where(DeviceDB.employee_id == employee.id)
-                        )
-                        user_devices = result.scalars().all()
-                        owned_types = {d.type.value for d in user_devices}
-
-                        if owned_types == {"scanner", "printer"}:
-                            registration_manager.end(device_id)
-
-                            scanner = next(d for d in user_devices if d.type.value == DeviceType.scanner.value)
-                            printer = next(d for d in user_devices if d.type.value == DeviceType.printer.value)                         
-                            ui_message = (
-                                f"{employee.wms_login} "
-                                f"ma już skaner {scanner.name} i drukarkę {printer.name}. "
-                                f"Rejestracja zakończona."
-                            )
-                            ui_status = "success"
-                            transaction = TransactionDB(
-                                type=TransactionType.registered,
-                                device_id=device_db.id,
-                                employee_id=employee.id
-                            )
-                            db.add(transaction)
-                            await db.commit()
-                        else:
-                            registration_manager.refresh(device_id)
-                            ui_message = (
-                                f"{device_db.type.value} {device_db.name} "
-                                f"przypisano do {employee.wms_login}"
-                            )
-                            ui_status = "success"
-                            transaction = TransactionDB(
-                                type=TransactionType.registered,
-                                device_id=device_db.id,
-                                employee_id=employee.id
-                            )
-                            db.add(transaction)
-                            await db.commit()
-    
-    session = registration_manager.get(device_id)
+    # скан з буфера: сесія на його момент (timeout_left тоді - 0)
+    session = registration_manager.get(device_id, at=scanned_at)
     timeout_left = None
     if session:
         # обчислюємо скільки секунд залишилось до закінчення сесії
         timeout_left = (session.started_at + registration_manager.timeout - datetime.now(timezone.utc)).total_seconds()
         timeout_left = max(0, timeout_left)
-        print(f"Timeout left for device {device_id}: {timeout_left} seconds")
-
-    await manager.broadcast_device_data(
-        device_id,
-        {
-            "type": "registration_status",
-            "status": ui_status,
-            "message": ui_message,
-            "session": {
-                "timeout_seconds": timeout_left
-            } if session else None
-        },
-    )
+        logger.debug("Timeout left for device %s: %s seconds", device_id, timeout_left)
+
+    registration_status = {
+        "type": "registration_status",
+        "status": ui_status,
+        "message": ui_message,
+        "session": {
+            "timeout_seconds": timeout_left
+        } if session else None
+    }
+    await send(registration_status)
 
-    return {"status": "ok"}
+    return registration_status
 
 
 # ---------- ESP SUBSCRIBE / UNSUBSCRIBE ----------
@@ -310,12 +415,9 @@ async def subscribe_esp(
     esp_id: str,
     current_user: dict = Depends(get_current_user())
 ):
-    from app.main import esp_allowed_users
-
-    if esp_id not in esp_allowed_users:
-        esp_allowed_users[esp_id] = set()
+    from app.main import esp_access
 
-    esp_allowed_users[esp_id].add(current_user["id"])
+    esp_access.allow(esp_id, current_user["id"])
 
     return {
         "status": "success",
@@ -328,12 +430,9 @@ async def unsubscribe_esp(
     esp_id: str,
     current_user: dict = Depends(get_current_user())
 ):
-    from app.main import esp_allowed_users
+    from app.main import esp_access
 
-    if esp_id in esp_allowed_users:
-        esp_allowed_users[esp_id].discard(current_user["id"])
-        if not esp_allowed_users[esp_id]:
-            esp_allowed_users.pop(esp_id)
+    esp_access.revoke(esp_id, current_user["id"])
 
     return {
         "status": "success",
@@ -368,6 +467,7 @@ async def create_device(
     db.add(device)
     await db.commit()
     await db.refresh(device)
+    rfid_index.put_device(device)
 
     return {
         "id": device.id,
@@ -389,7 +489,7 @@ async def end_session(
     if not session:
         return {"status": "error", "message": "Brak aktywnej sesji"}
 
-    registration_manager.sessions.pop(device_id, None)
+    registration_manager.end(device_id)
 
     await manager.broadcast_device_data(
             device_id,
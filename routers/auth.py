@@ -9,7 +9,7 @@ from pydantic import BaseModel
 from db.session import get_db
 from schemas.user import UserCreate, UserOut, Token, UserUpdate
 from models.db_user import UserDB, UserRole
-from managers.auth_manager import auth_manager
+from managers.auth_manager import PasswordHasherBusy, auth_manager
 
 router = APIRouter(prefix="/auth", tags=["Authentication"])
 
@@ -83,11 +83,21 @@ def get_current_user(required: bool = True):
             "is_active": user.is_active
         }
 
-        auth_manager.add_session(token, user_dict)
+        auth_manager.add_session(token, user_dict, exp=payload.get("exp"))
         return user_dict
 
     return _get_current_user
 
+BUSY_DETAIL = "Serwer jest zajęty, spróbuj ponownie za chwilę"
+
+
+async def hash_password_or_503(password: str) -> str:
+    try:
+        return await auth_manager.hash_password(password)
+    except PasswordHasherBusy:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=BUSY_DETAIL)
+
+
 def require_role(required_role: UserRole):
     def role_checker(current_user: dict = Depends(get_current_user())):
         if current_user["role"] != required_role.value:
@@ -120,7 +130,7 @@ async def register_user(
             detail="Username already registered"
         )
     
-    hashed_password = auth_manager.get_password_hash(user_data.password)
+    hashed_password = await hash_password_or_503(user_data.password)
     user = UserDB(
         first_name=user_data.first_name,
         last_name=user_data.last_name,
@@ -152,7 +162,10 @@ async def login_form(
     db: AsyncSession = Depends(get_db)
 ):
 
-    user = await auth_manager.authenticate_user(db, username, password)
+    try:
+        user = await auth_manager.authenticate_user(db, username, password)
+    except PasswordHasherBusy:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=BUSY_DETAIL)
     
     if not user:
         raise HTTPException(
@@ -188,6 +201,7 @@ async def login_form(
 
 @router.post("/logout")
 async def logout(
+    request: Request,
     response: Response,
     current_user: dict = Depends(get_current_user()),
     token: str = Depends(oauth2_scheme)
@@ -197,7 +211,9 @@ async def logout(
     remove_user_from_all_esps(user_id)
     remove_user_ws_subscriptions(user_id)
 
-    auth_manager.remove_session(token)
+    token = token or get_token_from_cookie(request)
+    if token:
+        auth_manager.remove_session(token)
     response.delete_cookie("access_token")
     return {"message": "Successfully logged out"}
 
@@ -1,9 +1,24 @@
+import asyncio
+import hmac
 import json
-from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Depends
+import logging
+from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Depends, HTTPException
+from app.dependencies.admin import require_manager_or_admin
+from config import ESP_READER_TOKEN, ESP_WS_HEARTBEAT_SECONDS, ESP_WS_IDLE_SECONDS
 from managers.connection_manager import ConnectionManager
 from managers.device_manager import DeviceManager
+from managers.dashboard_stats import dashboard_stats
+from db.session import async_session
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
+
+# Відгук зчитувачу за статусом скану: колір LED і сигнали бузера (мс)
+READER_FEEDBACK = {
+    "success": {"led": "green", "buzzer": [150]},
+    "error": {"led": "red", "buzzer": [100, 100, 100]},
+    "info": {"led": "blue", "buzzer": [50]},
+}
 
 
 def get_manager():
@@ -16,6 +31,17 @@ def get_devices():
     return device_manager
 
 
+def can_watch_dashboard(user) -> bool:
+    """Ті самі права, що й GET /admin/api/dashboard (менеджер або адмін)"""
+    if not user:
+        return False
+    try:
+        require_manager_or_admin(user)
+    except HTTPException:
+        return False
+    return True
+
+
 @router.websocket("/ws")
 async def websocket_endpoint(
     websocket: WebSocket,
@@ -24,6 +50,7 @@ async def websocket_endpoint(
 ):
     await manager.connect(websocket)
     from routers.auth import get_current_user
+    user = None
     try:
         user = await get_current_user(False)(websocket)
         if user:
@@ -31,7 +58,8 @@ async def websocket_endpoint(
     except Exception as e:
         print("WS auth error:", e)
 
-    await manager.broadcast_device_list()
+    # повний список - лише новому клієнту, далі він отримує дельти
+    await manager.send_device_list(websocket)
 
     try:
         while True:
@@ -41,6 +69,7 @@ async def websocket_endpoint(
             if msg["command"] == "subscribe":
                 device_id = msg["device_id"]
                 manager.subscribe(websocket, device_id)
+                await manager.send_device_list(websocket)
 
                 # 🔥 КРИТИЧНО: відправити ОСТАННІ дані одразу
                 device = devices.get_device(device_id)
@@ -54,5 +83,130 @@ async def websocket_endpoint(
             elif msg["command"] == "unsubscribe":
                 manager.unsubscribe(websocket)
 
+            elif msg["command"] == "watch_dashboard":
+                # лічильники - лише для менеджера / адміна
+                if not can_watch_dashboard(user):
+                    continue
+
+                manager.watch_dashboard(websocket)
+                async with async_session() as db:
+                    snapshot = await dashboard_stats.get_snapshot(db)
+                await manager.send_json(websocket, {"type": "dashboard_stats", "data": snapshot})
+
+            elif msg["command"] == "device_list":
+                # клієнт пропустив дельту - повний знімок
+                await manager.send_device_list(websocket)
+
     except WebSocketDisconnect:
+        pass
+    except RuntimeError:
+        # з'єднання вже закрите сервером (повільний клієнт)
+        pass
+    finally:
         manager.disconnect(websocket)
+
+
+# ===============================
+# ESP32 READERS
+# ===============================
+def reader_token_valid(websocket: WebSocket) -> bool:
+    """?token=... або Authorization: Bearer ...; без ESP_READER_TOKEN - відкрито"""
+    if not ESP_READER_TOKEN:
+        return True
+
+    token = websocket.query_params.get("token")
+    authorization = websocket.headers.get("authorization", "")
+    if not token and authorization.lower().startswith("bearer "):
+        token = authorization[7:]
+
+    return bool(token) and hmac.compare_digest(token, ESP_READER_TOKEN)
+
+
+def reader_feedback(scan_id, status: str, message=None) -> dict:
+    return {
+        "type": "feedback",
+        "id": scan_id,
+        "status": status,
+        "message": message,
+        **READER_FEEDBACK.get(status, READER_FEEDBACK["info"]),
+    }
+
+
+@router.websocket("/ws/esp/{device_id}")
+async def reader_endpoint(
+    websocket: WebSocket,
+    device_id: str,
+    manager: ConnectionManager = Depends(get_manager),
+    devices: DeviceManager = Depends(get_devices),
+):
+    """
+    Постійний канал зчитувача: TLS і автентифікація один раз на з'єднання,
+    далі скани ({"type": "scan", "id", "data"}) і heartbeat. На кожен скан -
+    відгук для бузера/LED у тому ж з'єднанні. Закрите з'єднання або тиша
+    довша за ESP_WS_IDLE_SECONDS - пристрій одразу офлайн.
+    """
+    from app.main import esp_ingest
+    from routers.api import process_esp32_data, validate_esp32_data
+
+    if not reader_token_valid(websocket):
+        await websocket.close(code=1008)
+        return
+
+    await manager.connect_reader(device_id, websocket)
+    devices.touch(device_id)
+    await manager.broadcast_device_list()
+    await websocket.send_text(json.dumps({
+        "type": "hello",
+        "heartbeat_seconds": ESP_WS_HEARTBEAT_SECONDS,
+    }))
+
+    try:
+        while True:
+            raw = await asyncio.wait_for(websocket.receive_text(), timeout=ESP_WS_IDLE_SECONDS)
+            try:
+                msg = json.loads(raw)
+            except ValueError:
+                continue
+
+            if msg.get("type") == "heartbeat":
+                devices.touch(device_id)
+                await websocket.send_text(json.dumps({"type": "pong"}))
+
+            elif msg.get("type") == "scan":
+                scan_id = msg.get("id")
+                data = msg.get("data") or {}
+
+                try:
+                    validate_esp32_data(data)
+                    # скани, що ще чекають у черзі HTTP, - спершу
+                    await esp_ingest.join(device_id)
+                    async with async_session() as db:
+                        status = await process_esp32_data(device_id, data, devices, manager, db)
+                except HTTPException as e:
+                    feedback = reader_feedback(scan_id, "error", e.detail)
+                except Exception:
+                    logger.exception("Reader scan failed for %s", device_id)
+                    feedback = reader_feedback(scan_id, "error", "Błąd serwera")
+                else:
+                    feedback = (
+                        reader_feedback(scan_id, status["status"], status["message"])
+                        if status else {"type": "ack", "id": scan_id}
+                    )
+
+                await websocket.send_text(json.dumps(feedback))
+
+    except (WebSocketDisconnect, asyncio.TimeoutError, RuntimeError):
+        pass
+    finally:
+        if manager.disconnect_reader(device_id, websocket):
+            try:
+                await websocket.close()
+            except RuntimeError:
+                pass
+
+            if devices.disconnect(device_id):
+                await manager.broadcast_device_data(device_id, {
+                    "type": "device_offline",
+                    "device_id": device_id
+                })
+                await manager.broadcast_device_list()
@@ -0,0 +1,16 @@
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from pydantic import BaseModel, Field
+
+from config import ESP_BATCH_MAX_SCANS
+
+
+class EspScan(BaseModel):
+    id: str = Field(min_length=1, max_length=64)  # ключ ідемпотентності з ESP
+    scanned_at: Optional[datetime] = None
+    data: Dict[str, Any]
+
+
+class EspScanBatch(BaseModel):
+    scans: List[EspScan] = Field(max_length=ESP_BATCH_MAX_SCANS)
@@ -0,0 +1,138 @@
+# services/device_assignment.py
+
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import exists, func, insert, literal, null, or_, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased
+
+from models.db_device import DeviceDB
+from models.db_transaction import TransactionDB, TransactionType
+
+
+def _transaction_type(value: TransactionType):
+    return literal(value, TransactionDB.__table__.c.type.type)
+
+
+def _transaction_time(value: Optional[datetime]):
+    """Час скану з ESP (пачка з буфера SD) або час запису"""
+    if value is None:
+        return func.now()
+    return literal(value, TransactionDB.__table__.c.timestamp.type)
+
+
+async def assign_device(
+    db: AsyncSession,
+    device_id: int,
+    employee_id: int,
+    commit: bool = True,
+    scanned_at: Optional[datetime] = None
+) -> bool:
+    """
+    Закріпити пристрій за працівником і записати TransactionDB
+    одним запитом (UPDATE ... RETURNING всередині INSERT ... SELECT).
+
+    Умова в WHERE пропускає оновлення, якщо пристрій закріплений за
+    іншим працівником (спершу його треба відкріпити) або працівник вже
+    має пристрій того ж типу. Одночасні запити з двох ESP відсікає
+    частковий унікальний індекс uq_devices_employee_type.
+
+    commit=False - у спільній транзакції пачки сканів: конфлікт
+    відкочує лише точку збереження цього скану. scanned_at - час
+    транзакції (скан з буфера SD), інакше час запису.
+
+    Повертає False, якщо пристрій не закріплено.
+    """
+
+    owned = aliased(DeviceDB)
+
+    assigned = (
+        update(DeviceDB)
+        .where(
+            DeviceDB.id == device_id,
+            or_(DeviceDB.employee_id.is_(None), DeviceDB.employee_id == employee_id),
+            ~exists().where(
+                owned.employee_id == employee_id,
+                owned.type == DeviceDB.type
+            )
+        )
+        .values(employee_id=employee_id)
+        .returning(DeviceDB.id, DeviceDB.employee_id)
+        .cte("assigned")
+    )
+
+    stmt = (
+        insert(TransactionDB)
+        .from_select(
+            ["timestamp", "type", "device_id", "employee_id"],
+            select(
+                _transaction_time(scanned_at),
+                _transaction_type(TransactionType.registered),
+                assigned.c.id,
+                assigned.c.employee_id
+            )
+        )
+        .returning(TransactionDB.id)
+    )
+
+    try:
+        if commit:
+            result = await db.execute(stmt)
+            transaction_id = result.scalar_one_or_none()
+            await db.commit()
+        else:
+            async with db.begin_nested():
+                result = await db.execute(stmt)
+                transaction_id = result.scalar_one_or_none()
+    except IntegrityError:
+        if commit:
+            await db.rollback()
+        return False
+
+    return transaction_id is not None
+
+
+async def unassign_device(
+    db: AsyncSession,
+    device_id: int,
+    commit: bool = True,
+    scanned_at: Optional[datetime] = None
+) -> bool:
+    """
+    Відкріпити пристрій і записати TransactionDB (unregistered)
+    одним запитом. Повертає False, якщо пристрій вже був вільний.
+    """
+
+    released = (
+        update(DeviceDB)
+        .where(
+            DeviceDB.id == device_id,
+            DeviceDB.employee_id.is_not(None)
+        )
+        .values(employee_id=None)
+        .returning(DeviceDB.id)
+        .cte("released")
+    )
+
+    stmt = (
+        insert(TransactionDB)
+        .from_select(
+            ["timestamp", "type", "device_id", "employee_id"],
+            select(
+                _transaction_time(scanned_at),
+                _transaction_type(TransactionType.unregistered),
+                released.c.id,
+                null()
+            )
+        )
+        .returning(TransactionDB.id)
+    )
+
+    result = await db.execute(stmt)
+    transaction_id = result.scalar_one_or_none()
+    if commit:
+        await db.commit()
+
+    return transaction_id is not None
@@ -9,7 +9,7 @@ from models.db_device import DeviceDB, DeviceType
 from models.db_device_status import DeviceStatusDB
 from models.device_transaction import DeviceChangeTransaction
 
-from services.google_sheets import sync_device_to_sheet
+from services.sheet_sync import enqueue_device_sync
 
 
 FIELD_LABELS = {
@@ -106,10 +106,11 @@ async def create_device_transaction(
 
     db.add(transaction)
 
-    await db.flush()
-
-    await sync_device_to_sheet(
+    # Google Sheets оновлює фоновий воркер після commit
+    enqueue_device_sync(
         db=db,
         device_id=device.id,
         notes=notes
-    )
\ No newline at end of file
+    )
+
+    await db.flush()
\ No newline at end of file
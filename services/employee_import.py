@@ -0,0 +1,275 @@
+# services/employee_import.py
+
+import logging
+from typing import AsyncIterator
+
+from sqlalchemy import or_, select, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from managers.rfid_index import rfid_index
+from models.db_employee import EmployeeDB
+from models.db_guest import DBGuest
+
+logger = logging.getLogger(__name__)
+
+EMPLOYEE_FIELDS = ["first_name", "last_name", "company", "rfid", "wms_login", "department"]
+REQUIRED_FIELDS = ["first_name", "last_name", "company", "rfid"]
+UPDATABLE_FIELDS = ["first_name", "last_name", "company", "wms_login", "department"]
+
+# Розмір пачки: один набір запитів і один commit на пачку
+EMPLOYEE_CHUNK_SIZE = 500
+
+
+def _clean(value) -> str:
+    return str(value).strip() if value is not None else ""
+
+
+def validate_employee_rows(raw_rows: list[dict]) -> tuple[list[dict], list[dict]]:
+    """
+    Перевірити поля і дублікати rfid/wms_login всередині файлу.
+    Повертає (коректні рядки, результати-помилки). Рядки нумеруються з 1.
+    """
+
+    valid = []
+    errors = []
+    seen_rfid: dict[str, int] = {}
+    seen_login: dict[str, int] = {}
+
+    for row_number, raw in enumerate(raw_rows, start=1):
+
+        if not isinstance(raw, dict):
+            errors.append({"row": row_number, "status": "error", "error": "Nieprawidłowy format wiersza"})
+            continue
+
+        row = {field: _clean(raw.get(field)) for field in EMPLOYEE_FIELDS}
+        row["row"] = row_number
+        # порожній wms_login -> NULL, щоб не порушувати unique
+        row["wms_login"] = row["wms_login"] or None
+
+        def error(message):
+            errors.append({
+                "row": row_number,
+                "rfid": row["rfid"] or None,
+                "wms_login": row["wms_login"],
+                "status": "error",
+                "error": message,
+            })
+
+        missing = [field for field in REQUIRED_FIELDS if not row[field]]
+        if missing:
+            error(f"Pole '{missing[0]}' jest wymagane")
+            continue
+
+        if row["rfid"] in seen_rfid:
+            error(f"RFID powtórzony w wierszu {seen_rfid[row['rfid']]}")
+            continue
+
+        if row["wms_login"] and row["wms_login"] in seen_login:
+            error(f"Login WMS powtórzony w wierszu {seen_login[row['wms_login']]}")
+            continue
+
+        seen_rfid[row["rfid"]] = row_number
+        if row["wms_login"]:
+            seen_login[row["wms_login"]] = row_number
+
+        valid.append(row)
+
+    return valid, errors
+
+
+def classify_employee_chunk(
+    rows: list[dict],
+    existing: list[dict],
+    update_existing: bool = True
+) -> tuple[list[dict], list[dict]]:
+    """
+    Розкласти пачку за станом БД (без запитів).
+    existing - працівники, чий rfid або wms_login є в пачці.
+
+    Повертає (рядки до запису з полем "action", результати без запису).
+    """
+
+    by_rfid = {employee["rfid"]: employee for employee in existing}
+    by_login = {
+        employee["wms_login"]: employee
+        for employee in existing
+        if employee["wms_login"]
+    }
+
+    to_write = []
+    results = []
+
+    for row in rows:
+        current = by_rfid.get(row["rfid"])
+        login_owner = by_login.get(row["wms_login"]) if row["wms_login"] else None
+
+        base = {"row": row["row"], "rfid": row["rfid"], "wms_login": row["wms_login"]}
+
+        if login_owner and (current is None or login_owner["id"] != current["id"]):
+            results.append({
+                **base,
+                "status": "error",
+                "error": f"Login WMS należy do pracownika {login_owner['first_name']} {login_owner['last_name']}",
+            })
+            continue
+
+        if current is None:
+            to_write.append({**row, "action": "created"})
+            continue
+
+        if not update_existing:
+            results.append({**base, "id": current["id"], "status": "error", "error": "Pracownik z tym RFID już istnieje"})
+            continue
+
+        # "" і NULL в БД вважаємо однаковими
+        if all((current[field] or None) == (row[field] or None) for field in UPDATABLE_FIELDS):
+            results.append({**base, "id": current["id"], "status": "unchanged"})
+            continue
+
+        to_write.append({**row, "action": "updated"})
+
+    return to_write, results
+
+
+async def _existing_for_chunk(db: AsyncSession, rows: list[dict]) -> list[dict]:
+    """Працівники з rfid або wms_login пачки - одним запитом"""
+
+    rfids = [row["rfid"] for row in rows]
+    logins = [row["wms_login"] for row in rows if row["wms_login"]]
+
+    conditions = [EmployeeDB.rfid.in_(rfids)]
+    if logins:
+        conditions.append(EmployeeDB.wms_login.in_(logins))
+
+    result = await db.execute(
+        select(
+            EmployeeDB.id,
+            EmployeeDB.rfid,
+            EmployeeDB.wms_login,
+            EmployeeDB.first_name,
+            EmployeeDB.last_name,
+            EmployeeDB.company,
+            EmployeeDB.department,
+        ).where(or_(*conditions))
+    )
+
+    return [dict(row._mapping) for row in result]
+
+
+async def _write_chunk(db: AsyncSession, to_write: list[dict]) -> list[dict]:
+    """
+    Upsert пачки одним INSERT ... ON CONFLICT (rfid) і позначити
+    гостьові картки з тими ж RFID як використані (як update_employee).
+    """
+
+    stmt = insert(EmployeeDB).values([
+        {field: row[field] for field in EMPLOYEE_FIELDS}
+        for row in to_write
+    ])
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["rfid"],
+        set_={field: stmt.excluded[field] for field in UPDATABLE_FIELDS},
+    ).returning(
+        EmployeeDB.id,
+        EmployeeDB.rfid,
+        EmployeeDB.first_name,
+        EmployeeDB.last_name,
+        EmployeeDB.wms_login,
+        EmployeeDB.department,
+    )
+
+    result = await db.execute(stmt)
+    employees = result.all()
+
+    result = await db.execute(
+        update(DBGuest)
+        .where(
+            DBGuest.rfid.in_([row["rfid"] for row in to_write]),
+            DBGuest.used.is_(False)
+        )
+        .values(used=True)
+        .returning(DBGuest.id, DBGuest.rfid, DBGuest.name, DBGuest.used)
+    )
+    guests = result.all()
+
+    await db.commit()
+
+    for employee in employees:
+        rfid_index.put_employee(employee)
+    for guest in guests:
+        rfid_index.put_guest(guest)
+
+    return employees
+
+
+async def import_employees(
+    db: AsyncSession,
+    raw_rows: list[dict],
+    update_existing: bool = True,
+    chunk_size: int = EMPLOYEE_CHUNK_SIZE
+) -> AsyncIterator[dict]:
+    """
+    Масовий імпорт працівників пачками.
+
+    Віддає події {"type": "progress", ...} після кожної пачки
+    і наприкінці {"type": "result", "summary": ..., "rows": [...]}.
+    Кожна пачка - окрема транзакція: помилка запису пачки
+    не відкочує попередні.
+    """
+
+    valid, results = validate_employee_rows(raw_rows)
+    total = len(raw_rows)
+    processed = len(results)
+
+    for start in range(0, len(valid), chunk_size):
+        chunk = valid[start:start + chunk_size]
+
+        existing = await _existing_for_chunk(db, chunk)
+        to_write, chunk_results = classify_employee_chunk(chunk, existing, update_existing)
+
+        if to_write:
+            try:
+                employees = await _write_chunk(db, to_write)
+            except IntegrityError as e:
+                # конкурентна зміна між перевіркою і записом
+                await db.rollback()
+                logger.warning("Employee import chunk failed: %s", e)
+                chunk_results.extend(
+                    {
+                        "row": row["row"],
+                        "rfid": row["rfid"],
+                        "wms_login": row["wms_login"],
+                        "status": "error",
+                        "error": "Konflikt danych podczas zapisu, spróbuj ponownie",
+                    }
+                    for row in to_write
+                )
+            else:
+                ids = {employee.rfid: employee.id for employee in employees}
+                chunk_results.extend(
+                    {
+                        "row": row["row"],
+                        "rfid": row["rfid"],
+                        "wms_login": row["wms_login"],
+                        "id": ids.get(row["rfid"]),
+                        "status": row["action"],
+                    }
+                    for row in to_write
+                )
+
+        results.extend(chunk_results)
+        processed += len(chunk)
+
+        yield {"type": "progress", "processed": processed, "total": total}
+
+    results.sort(key=lambda result: result["row"])
+
+    summary = {"total": total}
+    for status in ("created", "updated", "unchanged", "error"):
+        summary[status] = sum(1 for result in results if result["status"] == status)
+
+    logger.info("Employee import: %s", summary)
+
+    yield {"type": "result", "summary": summary, "rows": results}
@@ -1,20 +1,30 @@
 # services/google_sheets.py
 
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import date
+from typing import Iterator
+import logging
 import os
+import threading
+import time
 
 from google.oauth2.service_account import Credentials
 from googleapiclient.discovery import build
-from sqlalchemy import select
-from sqlalchemy.orm import selectinload
 
+from config import SHEET_ROW_INDEX_TTL_SECONDS, SHEETS_READ_MAX_WORKERS
 from models.db_device import DeviceDB, DeviceType
 
 from dotenv import load_dotenv
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 SPREADSHEET_ID = os.getenv("SPREADSHEET_ID")
 
+# Дозволяє направити клієнта на локальний фейковий сервер Sheets (тести)
+SHEETS_API_ENDPOINT = os.getenv("SHEETS_API_ENDPOINT")
+
 
 SCOPES = [
     "https://www.googleapis.com/auth/spreadsheets",
@@ -26,7 +36,30 @@ credentials = Credentials.from_service_account_file(
     scopes=SCOPES
 )
 
-service = build("sheets", "v4", credentials=credentials)
+service = build(
+    "sheets",
+    "v4",
+    credentials=credentials,
+    client_options={"api_endpoint": SHEETS_API_ENDPOINT} if SHEETS_API_ENDPOINT else None
+)
+
+HEADER_ROW_INDEX = 2  # третій рядок аркуша містить назви колонок
+
+
+def column_letter(column_number: int) -> str:
+    """1 -> A, 26 -> Z, 27 -> AA"""
+    letters = ""
+    while column_number > 0:
+        column_number, remainder = divmod(column_number - 1, 26)
+        letters = chr(65 + remainder) + letters
+    return letters
+
+
+def build_row_range(spread_sheet_name: str, row_index: int, num_columns: int) -> str:
+    return (
+        f"{spread_sheet_name}!A{row_index}:"
+        f"{column_letter(num_columns)}{row_index}"
+    )
 
 
 def get_sheet_name(device: DeviceDB) -> str:
@@ -92,12 +125,10 @@ def generate_line_to_write(
     return result_line
 
 
-def write_dev_change_to_spreadsheet(
+def merge_previous_notes(
     row_to_write: list[str],
-    row_index: int,
     previous_row: list[str],
-    line_of_position_column: list[str],
-    spread_sheet_name: str
+    line_of_position_column: list[str]
 ):
 
     for list_index, column_name in enumerate(line_of_position_column):
@@ -113,99 +144,243 @@ def write_dev_change_to_spreadsheet(
                 previous_notes + "\n" + row_to_write[list_index]
             )
 
-    num_columns = len(row_to_write)
 
-    end_column_letter = chr(64 + num_columns)
+class SheetRowIndex:
+    """
+    Кеш заголовків аркуша і позицій рядків (назва пристрою -> номер рядка).
+
+    Будується з рядка заголовків і колонки "Nazwa" замість повного аркуша.
+    Оновлюється за TTL, при промаху або коли ranged-читання показує,
+    що рядок зсунувся.
+    """
+
+    def __init__(self, ttl_seconds: int):
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._sheets: dict[str, tuple[list[str], dict[str, int], float]] = {}
+
+    def get(
+        self,
+        sheets_service,
+        spread_sheet_name: str,
+        force_refresh: bool = False
+    ) -> tuple[list[str], dict[str, int]]:
+
+        with self._lock:
+            cached = self._sheets.get(spread_sheet_name)
+
+            if (
+                cached
+                and not force_refresh
+                and time.monotonic() - cached[2] < self.ttl_seconds
+            ):
+                return cached[0], cached[1]
+
+            header, rows = self._load(sheets_service, spread_sheet_name)
+            self._sheets[spread_sheet_name] = (header, rows, time.monotonic())
+            return header, rows
+
+    def invalidate(self, spread_sheet_name: str | None = None):
+        with self._lock:
+            if spread_sheet_name:
+                self._sheets.pop(spread_sheet_name, None)
+            else:
+                self._sheets.clear()
+
+    def _load(
+        self,
+        sheets_service,
+        spread_sheet_name: str
+    ) -> tuple[list[str], dict[str, int]]:
+
+        header_row = HEADER_ROW_INDEX + 1
+
+        header = _get_values(
+            sheets_service, f"{spread_sheet_name}!{header_row}:{header_row}"
+        )
+        header = header[0] if header else []
 
-    update_range = (
-        f"{spread_sheet_name}!A{row_index}:{end_column_letter}{row_index}"
-    )
+        if "Nazwa" in header:
+            column = column_letter(header.index("Nazwa") + 1)
+            values = _get_values(
+                sheets_service, f"{spread_sheet_name}!{column}:{column}"
+            )
+        else:
+            # без колонки "Nazwa" - як раніше, шукаємо по всіх клітинках
+            values = _get_values(sheets_service, spread_sheet_name)
 
-    service.spreadsheets().values().update(
-        spreadsheetId=SPREADSHEET_ID,
-        range=update_range,
-        valueInputOption="RAW",
-        body={
-            "values": [row_to_write]
-        },
-    ).execute()
+        rows: dict[str, int] = {}
+        for row_index, row_values in enumerate(values):
+            for cell in row_values:
+                rows.setdefault(cell, row_index + 1)
 
+        logger.info(
+            "Sheet row index for %s rebuilt: %s entries",
+            spread_sheet_name, len(rows)
+        )
+        return header, rows
 
-async def sync_device_to_sheet(
-    db,
-    device_id: int,
-    notes: str
-):
 
-    result = await db.execute(
-        select(DeviceDB)
-        .options(
-            selectinload(DeviceDB.status),
-            selectinload(DeviceDB.ports)
+sheet_row_index = SheetRowIndex(ttl_seconds=SHEET_ROW_INDEX_TTL_SECONDS)
+
+
+def _get_values(sheets_service, range_name: str) -> list[list[str]]:
+
+    response = (
+        sheets_service.spreadsheets()
+        .values()
+        .get(
+            spreadsheetId=SPREADSHEET_ID,
+            range=range_name
         )
-        .where(DeviceDB.id == device_id)
+        .execute()
     )
 
-    device = result.scalar_one()
+    return response.get("values", [])
+
 
-    spread_sheet_name = get_sheet_name(device)
+def _read_rows(
+    sheets_service,
+    spread_sheet_name: str,
+    row_numbers: list[int],
+    num_columns: int
+) -> dict[int, list[str]]:
+    """Прочитати кілька окремих рядків одним values().batchGet"""
+
+    if not row_numbers:
+        return {}
 
     response = (
-        service.spreadsheets()
+        sheets_service.spreadsheets()
         .values()
-        .get(
+        .batchGet(
             spreadsheetId=SPREADSHEET_ID,
-            range=spread_sheet_name
+            ranges=[
+                build_row_range(spread_sheet_name, row_number, num_columns)
+                for row_number in row_numbers
+            ]
         )
         .execute()
     )
 
-    values = response.get("values", [])
+    rows = {}
+    for row_number, value_range in zip(row_numbers, response.get("valueRanges", [])):
+        values = value_range.get("values", [])
+        rows[row_number] = values[0] if values else []
 
-    if not values:
-        return
+    return rows
+
+
+def locate_device_rows(
+    sheets_service,
+    spread_sheet_name: str,
+    items: list[tuple[DeviceDB, str]]
+) -> tuple[list[str], list[tuple[DeviceDB, str, int, list[str]]]]:
+    """
+    Знайти рядки пристроїв через кешований індекс і перевірити їх
+    ranged-читанням. Якщо рядок не знайдено або в ньому інший пристрій,
+    індекс перебудовується один раз.
 
-    line_of_position_column = values[2]
+    Повертає (заголовки, [(пристрій, нотатки, номер рядка, поточний рядок)]).
+    """
 
-    device_coordinate = None
-    previous_row = None
+    located = []
+    pending = items
+    header: list[str] = []
 
-    for row_index, row_values in enumerate(values):
+    for force_refresh in (False, True):
+
+        header, rows = sheet_row_index.get(
+            sheets_service, spread_sheet_name, force_refresh=force_refresh
+        )
+
+        if not header:
+            return header, []
+
+        targets = [
+            (device, notes, rows.get(device.name))
+            for device, notes in pending
+        ]
+        current_rows = _read_rows(
+            sheets_service,
+            spread_sheet_name,
+            sorted({row_number for _, _, row_number in targets if row_number}),
+            len(header)
+        )
 
-        if device.name in row_values:
+        pending = []
+        for device, notes, row_number in targets:
+            previous_row = current_rows.get(row_number)
 
-            device_coordinate = row_index + 1
-            previous_row = row_values
+            if previous_row is not None and device.name in previous_row:
+                located.append((device, notes, row_number, previous_row))
+            else:
+                pending.append((device, notes))
 
+        if not pending:
             break
 
-    if not device_coordinate:
-        return
+    return header, located
 
-    if len(previous_row) < len(line_of_position_column):
 
-        previous_row.extend(
-            [
-                ""
-                for _ in range(
-                    len(line_of_position_column) - len(previous_row)
-                )
-            ]
+def sync_devices_to_sheets(
+    devices_with_notes: list[tuple[DeviceDB, str]],
+    sheets_service=None
+) -> set[int]:
+    """
+    Записати зміни кількох пристроїв одним values().batchUpdate.
+
+    Блокуючий виклик - запускати в пулі потоків.
+    Пристрої (з завантаженими status і ports) мають бути вже прочитані з БД.
+    Повертає id пристроїв, для яких знайдено рядок в аркуші.
+    """
+
+    sheets_service = sheets_service or service
+
+    by_sheet: dict[str, list[tuple[DeviceDB, str]]] = {}
+    for device, notes in devices_with_notes:
+        by_sheet.setdefault(get_sheet_name(device), []).append((device, notes))
+
+    data = []
+    written = set()
+
+    for spread_sheet_name, items in by_sheet.items():
+
+        line_of_position_column, located = locate_device_rows(
+            sheets_service, spread_sheet_name, items
         )
 
-    row_to_write = generate_line_to_write(
-        device=device,
-        line_of_position_column=line_of_position_column,
-        notes=notes
-    )
+        for device, notes, device_coordinate, previous_row in located:
+
+            row_to_write = generate_line_to_write(
+                device=device,
+                line_of_position_column=line_of_position_column,
+                notes=notes
+            )
+
+            merge_previous_notes(
+                row_to_write, previous_row, line_of_position_column
+            )
+
+            data.append({
+                "range": build_row_range(
+                    spread_sheet_name, device_coordinate, len(row_to_write)
+                ),
+                "values": [row_to_write],
+            })
+            written.add(device.id)
+
+    if data:
+        sheets_service.spreadsheets().values().batchUpdate(
+            spreadsheetId=SPREADSHEET_ID,
+            body={
+                "valueInputOption": "RAW",
+                "data": data,
+            },
+        ).execute()
+
+    return written
 
-    write_dev_change_to_spreadsheet(
-        row_to_write=row_to_write,
-        row_index=device_coordinate,
-        previous_row=previous_row,
-        line_of_position_column=line_of_position_column,
-        spread_sheet_name=spread_sheet_name,
-    )
 
 def write_report_gs(
     data: list[list],
@@ -238,52 +413,254 @@ def write_report_gs(
     ).execute()
 
 
-def read_all_sheets(
-    SPREADSHEET_ID_param: str | None = None
-):
+# ===============================
+# READ ALL SHEETS
+# ===============================
+
+NOT_DEVICE_SHEETS = ("UWAGI", "REPORT")
+
+_thread_local = threading.local()
+
+
+def _default_service_factory():
+    return build(
+        "sheets",
+        "v4",
+        credentials=credentials,
+        client_options={"api_endpoint": SHEETS_API_ENDPOINT} if SHEETS_API_ENDPOINT else None
+    )
+
+
+def _thread_service(service_factory):
+    """Окремий клієнт на потік - httplib2.Http не потокобезпечний"""
+    clients = getattr(_thread_local, "clients", None)
+    if clients is None:
+        clients = _thread_local.clients = {}
+
+    if service_factory not in clients:
+        clients[service_factory] = service_factory()
+
+    return clients[service_factory]
+
+
+def quote_sheet_name(spread_sheet_name: str) -> str:
+    """Назва аркуша для A1-нотації: 'Moje skanery'!A1"""
+    return "'" + spread_sheet_name.replace("'", "''") + "'"
+
+
+def _column_runs(indexes: list[int]) -> list[tuple[int, int]]:
+    """[1, 2, 3, 7] -> [(1, 3), (7, 7)] - сусідні колонки одним діапазоном"""
+    runs: list[tuple[int, int]] = []
+    for index in sorted(set(indexes)):
+        if runs and runs[-1][1] == index - 1:
+            runs[-1] = (runs[-1][0], index)
+        else:
+            runs.append((index, index))
+    return runs
+
+
+def _read_projected_sheet(
+    sheets_service,
+    spreadsheet_id: str,
+    spread_sheet_name: str,
+    header: list[str],
+    columns: list[str]
+) -> list[list[str]]:
+    """
+    Прочитати з аркуша лише колонки columns (за назвами з рядка заголовків).
+    Рядки повертаються в порядку columns, відсутні колонки - порожні.
+    """
+
+    positions = {name: header.index(name) for name in columns if name in header}
+    if not positions:
+        return []
+
+    runs = _column_runs(list(positions.values()))
+    sheet = quote_sheet_name(spread_sheet_name)
+
+    response = (
+        sheets_service.spreadsheets()
+        .values()
+        .batchGet(
+            spreadsheetId=spreadsheet_id,
+            ranges=[
+                f"{sheet}!{column_letter(first + 1)}:{column_letter(last + 1)}"
+                for first, last in runs
+            ]
+        )
+        .execute()
+    )
+
+    # колонка аркуша -> (значення діапазону, зсув колонки в діапазоні)
+    cells: dict[int, tuple[list[list[str]], int]] = {}
+    num_rows = 0
+    for (first, last), value_range in zip(runs, response.get("valueRanges", [])):
+        values = value_range.get("values", [])
+        num_rows = max(num_rows, len(values))
+        for index in range(first, last + 1):
+            cells[index] = (values, index - first)
+
+    rows = []
+    for row_index in range(num_rows):
+        row = []
+        for name in columns:
+            value = ""
+            if name in positions:
+                values, offset = cells[positions[name]]
+                if row_index < len(values) and offset < len(values[row_index]):
+                    value = values[row_index][offset]
+            row.append(value)
+        rows.append(row)
+
+    return rows
+
+
+def _read_sheet(
+    service_factory,
+    spreadsheet_id: str,
+    spread_sheet_name: str,
+    header: list[str] | None,
+    columns: list[str] | None
+) -> list[list[str]]:
+
+    sheets_service = _thread_service(service_factory)
+
+    if columns is not None:
+        return _read_projected_sheet(
+            sheets_service, spreadsheet_id, spread_sheet_name, header or [], columns
+        )
+
+    response = (
+        sheets_service.spreadsheets()
+        .values()
+        .get(
+            spreadsheetId=spreadsheet_id,
+            range=quote_sheet_name(spread_sheet_name)
+        )
+        .execute()
+    )
+
+    return response.get("values", [])
+
+
+def _read_headers(
+    sheets_service,
+    spreadsheet_id: str,
+    sheet_names: list[str]
+) -> dict[str, list[str]]:
+    """Рядки заголовків усіх аркушів одним values().batchGet"""
+
+    header_row = HEADER_ROW_INDEX + 1
+
+    response = (
+        sheets_service.spreadsheets()
+        .values()
+        .batchGet(
+            spreadsheetId=spreadsheet_id,
+            ranges=[
+                f"{quote_sheet_name(name)}!{header_row}:{header_row}"
+                for name in sheet_names
+            ]
+        )
+        .execute()
+    )
+
+    headers = {}
+    for name, value_range in zip(sheet_names, response.get("valueRanges", [])):
+        values = value_range.get("values", [])
+        headers[name] = values[0] if values else []
+
+    return headers
+
+
+def iter_all_sheets(
+    SPREADSHEET_ID_param: str | None = None,
+    columns: list[str] | None = None,
+    max_workers: int = SHEETS_READ_MAX_WORKERS,
+    service_factory=None
+) -> Iterator[tuple[str, list[list[str]]]]:
+    """
+    Читати аркуші інвентаризації паралельно і віддавати їх по одному:
+    (назва аркуша, рядки).
+
+    Одночасно виконується (і тримається в пам'яті) не більше max_workers
+    аркушів; порядок - як у таблиці. Кожен потік має власний клієнт
+    (service_factory викликається раз на потік).
+
+    columns - список назв колонок з рядка заголовків. Якщо задано,
+    з аркуша читаються лише ці колонки, а рядки повертаються в порядку
+    columns (рядок заголовків теж, на позиції HEADER_ROW_INDEX).
+    """
 
     target_SPREADSHEET_ID = (
         SPREADSHEET_ID_param or SPREADSHEET_ID
     )
+    service_factory = service_factory or _default_service_factory
+    sheets_service = _thread_service(service_factory)
 
     sheets = (
-        service.spreadsheets()
+        sheets_service.spreadsheets()
         .get(
-            spreadsheetId=target_SPREADSHEET_ID
+            spreadsheetId=target_SPREADSHEET_ID,
+            fields="sheets.properties.title"
         )
         .execute()
     )
 
-    not_dev_st_list = [
-        "UWAGI",
-        "REPORT"
-    ]
-
     sheet_names = [
         sheet["properties"]["title"]
         for sheet in sheets["sheets"]
-        if sheet["properties"]["title"] not in not_dev_st_list
+        if sheet["properties"]["title"] not in NOT_DEVICE_SHEETS
     ]
 
-    data = []
-
-    for sheet_name in sheet_names:
-
-        range_name = f"{sheet_name}!A1:ZZ"
+    if not sheet_names:
+        return
 
-        result = (
-            service.spreadsheets()
-            .values()
-            .get(
-                spreadsheetId=target_SPREADSHEET_ID,
-                range=range_name
-            )
-            .execute()
-        )
+    headers = {}
+    if columns is not None:
+        headers = _read_headers(sheets_service, target_SPREADSHEET_ID, sheet_names)
+
+    with ThreadPoolExecutor(
+        max_workers=max(1, max_workers),
+        thread_name_prefix="sheets-read"
+    ) as executor:
+
+        pending = deque()
+        names = iter(sheet_names)
+
+        def submit_next():
+            name = next(names, None)
+            if name is not None:
+                pending.append((name, executor.submit(
+                    _read_sheet,
+                    service_factory,
+                    target_SPREADSHEET_ID,
+                    name,
+                    headers.get(name),
+                    columns
+                )))
+
+        for _ in range(max(1, max_workers)):
+            submit_next()
+
+        try:
+            while pending:
+                name, future = pending.popleft()
+                values = future.result()
+                submit_next()
+                yield name, values
+        finally:
+            for _, future in pending:
+                future.cancel()
 
-        values = result.get("values", [])
 
-        if values:
-            data.append(values)
+def read_all_sheets(
+    SPREADSHEET_ID_param: str | None = None
+):
+    """Усі аркуші інвентаризації повністю (список непорожніх аркушів)"""
 
-    return data
\ No newline at end of file
+    return [
+        values
+        for _, values in iter_all_sheets(SPREADSHEET_ID_param)
+        if values
+    ]
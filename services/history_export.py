@@ -0,0 +1,153 @@
+# services/history_export.py
+
+import asyncio
+import csv
+import enum
+import io
+import os
+import tempfile
+from datetime import datetime
+from typing import AsyncIterator
+
+from fastapi.responses import StreamingResponse
+from sqlalchemy import Select
+
+from db.session import background_session
+
+# Скільки рядків забирати з курсора БД за раз і скільки писати в один шматок відповіді
+EXPORT_YIELD_PER = 1000
+EXPORT_CHUNK_SIZE = 64 * 1024
+
+EXPORT_FORMATS = ("csv", "xlsx")
+
+
+class ExportFormatError(Exception):
+    """Формат експорту недоступний"""
+
+
+def _format_value(value):
+    if value is None:
+        return ""
+    if isinstance(value, enum.Enum):
+        return value.value
+    if isinstance(value, datetime):
+        return value.isoformat(sep=" ", timespec="seconds")
+    return value
+
+
+async def stream_rows(stmt: Select) -> AsyncIterator[tuple]:
+    """
+    Рядки запиту через серверний курсор (yield_per), без ORM-об'єктів.
+    Власна сесія - відповідь стрімиться довше, ніж живе залежність get_db.
+    """
+
+    async with background_session() as session:
+        result = await session.stream(
+            stmt.execution_options(yield_per=EXPORT_YIELD_PER)
+        )
+        async for row in result:
+            yield tuple(_format_value(value) for value in row)
+
+
+async def csv_chunks(header: list[str], rows: AsyncIterator[tuple]) -> AsyncIterator[bytes]:
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    # BOM - щоб Excel правильно відкрив польські символи
+    buffer.write("\ufeff")
+    writer.writerow(header)
+
+    async for row in rows:
+        writer.writerow(row)
+
+        if buffer.tell() >= EXPORT_CHUNK_SIZE:
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+
+def _xlsx_workbook():
+    # openpyxl (requirements.txt) імпортується лише для XLSX
+    try:
+        from openpyxl import Workbook
+    except ImportError:
+        raise ExportFormatError("Eksport XLSX wymaga pakietu openpyxl")
+
+    return Workbook(write_only=True)
+
+
+def _append_rows(worksheet, rows: list[tuple]):
+    for row in rows:
+        worksheet.append(row)
+
+
+async def xlsx_chunks(
+    header: list[str],
+    rows: AsyncIterator[tuple],
+    sheet_title: str,
+    workbook=None
+) -> AsyncIterator[bytes]:
+    """
+    XLSX - це zip, тому файл спочатку пишеться в тимчасовий файл
+    (write_only - рядки не тримаються в пам'яті), потім віддається шматками.
+
+    openpyxl і save() - чистий CPU: пачки рядків дописуються, а файл
+    зберігається в потоці (asyncio.to_thread), щоб річна історія
+    не зупиняла event loop воркера.
+    """
+
+    workbook = workbook or _xlsx_workbook()
+    worksheet = workbook.create_sheet(title=sheet_title)
+
+    batch = [header]
+    async for row in rows:
+        batch.append(row)
+
+        if len(batch) >= EXPORT_YIELD_PER:
+            await asyncio.to_thread(_append_rows, worksheet, batch)
+            batch = []
+
+    if batch:
+        await asyncio.to_thread(_append_rows, worksheet, batch)
+
+    fd, path = tempfile.mkstemp(suffix=".xlsx")
+    os.close(fd)
+
+    try:
+        await asyncio.to_thread(workbook.save, path)
+
+        with open(path, "rb") as file:
+            while chunk := await asyncio.to_thread(file.read, EXPORT_CHUNK_SIZE):
+                yield chunk
+    finally:
+        os.remove(path)
+
+
+def export_response(
+    stmt: Select,
+    header: list[str],
+    export_format: str,
+    filename: str
+) -> StreamingResponse:
+    """StreamingResponse з результатом запиту у форматі csv або xlsx"""
+
+    rows = stream_rows(stmt)
+
+    if export_format == "xlsx":
+        body = xlsx_chunks(header, rows, sheet_title=filename[:31], workbook=_xlsx_workbook())
+        media_type = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+    else:
+        body = csv_chunks(header, rows)
+        media_type = "text/csv; charset=utf-8"
+
+    return StreamingResponse(
+        body,
+        media_type=media_type,
+        headers={
+            "Content-Disposition": f'attachment; filename="{filename}.{export_format}"'
+        }
+    )
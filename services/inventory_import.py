@@ -0,0 +1,502 @@
+# services/inventory_import.py
+
+import asyncio
+import csv
+import io
+import logging
+from dataclasses import dataclass, field
+
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models.db_device import DeviceDB, DeviceType, SiteType
+from models.db_device_status import DeviceStatusDB
+from models.db_port import DevicePortDB
+from services.google_sheets import iter_all_sheets
+
+logger = logging.getLogger(__name__)
+
+# Колонки аркуша, які розуміє імпорт (як у generate_line_to_write)
+IMPORT_COLUMNS = ["S/N", "RFID", "Nazwa", "IP", "STATUS", "SITE", "PORTS", "TYP"]
+
+# Аркуш -> тип пристрою (зворотне до get_sheet_name)
+SHEET_DEVICE_TYPES = {
+    "SCANER": DeviceType.scanner,
+    "PRINTER": DeviceType.printer,
+}
+
+# asyncpg має ліміт 32767 параметрів на запит
+DEVICE_CHUNK_SIZE = 2000
+PORT_CHUNK_SIZE = 5000
+
+# В скількох перших рядках файлу шукати рядок заголовків
+HEADER_SEARCH_ROWS = 10
+
+DEVICE_FIELDS = ["name", "rfid", "type", "site", "ip", "status"]
+
+
+class InventoryImportError(Exception):
+    """Файл або аркуш неможливо імпортувати"""
+
+
+@dataclass
+class InventoryRow:
+    source: str
+    row_number: int
+    serial_number: str
+    rfid: str
+    name: str
+    type: DeviceType
+    site: SiteType | None
+    ip: str | None
+    status: str | None
+    ports: list[str] = field(default_factory=list)
+
+
+@dataclass
+class ImportPlan:
+    create: list[InventoryRow] = field(default_factory=list)
+    update: list[tuple[InventoryRow, dict]] = field(default_factory=list)
+    unchanged: int = 0
+    errors: list[dict] = field(default_factory=list)
+    new_statuses: list[str] = field(default_factory=list)
+    # port_number -> serial_number пристрою
+    ports: dict[str, str] = field(default_factory=dict)
+    moved_ports: list[dict] = field(default_factory=list)
+
+    def report(self, dry_run: bool) -> dict:
+        return {
+            "dry_run": dry_run,
+            "summary": {
+                "created": len(self.create),
+                "updated": len(self.update),
+                "unchanged": self.unchanged,
+                "errors": len(self.errors),
+                "statuses_created": len(self.new_statuses),
+                "ports_moved": len(self.moved_ports),
+            },
+            "created": [
+                {"serial_number": row.serial_number, "name": row.name}
+                for row in self.create
+            ],
+            "updated": [
+                {
+                    "serial_number": row.serial_number,
+                    "name": row.name,
+                    "changes": changes,
+                }
+                for row, changes in self.update
+            ],
+            "new_statuses": self.new_statuses,
+            "moved_ports": self.moved_ports,
+            "errors": self.errors,
+        }
+
+
+# ===============================
+# PARSING
+# ===============================
+
+def _cell(row: list, index: int | None) -> str:
+    if index is None or index >= len(row) or row[index] is None:
+        return ""
+    return str(row[index]).strip()
+
+
+def find_header(rows: list[list]) -> int | None:
+    """Номер рядка заголовків (перший рядок з колонками S/N і Nazwa)"""
+    for index, row in enumerate(rows[:HEADER_SEARCH_ROWS]):
+        cells = [_cell(row, i) for i in range(len(row))]
+        if "S/N" in cells and "Nazwa" in cells:
+            return index
+    return None
+
+
+def parse_inventory_rows(
+    source: str,
+    rows: list[list],
+    default_type: DeviceType | None = None
+) -> tuple[list[InventoryRow], list[dict]]:
+    """
+    Перетворити рядки аркуша/файлу на InventoryRow.
+    Тип пристрою береться з колонки TYP, інакше - default_type.
+    Повертає (рядки, помилки).
+    """
+
+    header_index = find_header(rows)
+    if header_index is None:
+        return [], [{"source": source, "row": None, "error": "Brak nagłówka z kolumnami S/N i Nazwa"}]
+
+    header = [_cell(rows[header_index], i) for i in range(len(rows[header_index]))]
+    columns = {name: header.index(name) if name in header else None for name in IMPORT_COLUMNS}
+
+    parsed = []
+    errors = []
+
+    for offset, row in enumerate(rows[header_index + 1:]):
+        row_number = header_index + offset + 2
+
+        serial_number = _cell(row, columns["S/N"])
+        rfid = _cell(row, columns["RFID"])
+        name = _cell(row, columns["Nazwa"]).upper()
+
+        if not (serial_number or rfid or name):
+            continue  # порожній рядок
+
+        def error(message):
+            errors.append({"source": source, "row": row_number, "serial_number": serial_number, "error": message})
+
+        if not serial_number or not rfid or not name:
+            error("Wymagane są S/N, RFID i Nazwa")
+            continue
+
+        device_type = default_type
+        type_value = _cell(row, columns["TYP"]).lower()
+        if type_value:
+            try:
+                device_type = DeviceType(type_value)
+            except ValueError:
+                error(f"Nieznany typ urządzenia '{type_value}'")
+                continue
+
+        if device_type is None:
+            error("Nie można określić typu urządzenia")
+            continue
+
+        site = None
+        site_value = _cell(row, columns["SITE"])
+        if site_value:
+            try:
+                site = SiteType(site_value)
+            except ValueError:
+                error(f"Nieznany site '{site_value}'")
+                continue
+
+        ports = [
+            port.strip()
+            for port in _cell(row, columns["PORTS"]).splitlines()
+            if port.strip()
+        ]
+
+        parsed.append(InventoryRow(
+            source=source,
+            row_number=row_number,
+            serial_number=serial_number,
+            rfid=rfid,
+            name=name,
+            type=device_type,
+            site=site,
+            ip=_cell(row, columns["IP"]) or None,
+            status=_cell(row, columns["STATUS"]) or None,
+            ports=ports,
+        ))
+
+    return parsed, errors
+
+
+def read_csv_rows(content: bytes) -> list[list[str]]:
+    text = content.decode("utf-8-sig")
+    dialect = csv.excel
+    try:
+        dialect = csv.Sniffer().sniff(text[:4096], delimiters=",;\t")
+    except csv.Error:
+        pass
+    return list(csv.reader(io.StringIO(text), dialect))
+
+
+def read_xlsx_sheets(content: bytes) -> list[tuple[str, list[list]]]:
+    # openpyxl (requirements.txt) імпортується лише для XLSX
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        raise InventoryImportError("Import XLSX wymaga pakietu openpyxl")
+
+    workbook = load_workbook(io.BytesIO(content), read_only=True, data_only=True)
+    try:
+        return [
+            (worksheet.title, [list(row) for row in worksheet.iter_rows(values_only=True)])
+            for worksheet in workbook.worksheets
+        ]
+    finally:
+        workbook.close()
+
+
+def read_google_sheets() -> list[tuple[str, list[list[str]]]]:
+    """Аркуші інвентаризації з Google Sheets, лише потрібні колонки"""
+    return list(iter_all_sheets(columns=IMPORT_COLUMNS))
+
+
+def parse_sheets(
+    sheets: list[tuple[str, list[list]]],
+    default_type: DeviceType | None = None
+) -> tuple[list[InventoryRow], list[dict]]:
+
+    rows = []
+    errors = []
+
+    for sheet_name, values in sheets:
+        sheet_type = SHEET_DEVICE_TYPES.get(sheet_name.upper(), default_type)
+        parsed, sheet_errors = parse_inventory_rows(sheet_name, values, sheet_type)
+        rows.extend(parsed)
+        errors.extend(sheet_errors)
+
+    return rows, errors
+
+
+# ===============================
+# PLANNING
+# ===============================
+
+def plan_inventory_import(
+    rows: list[InventoryRow],
+    existing_devices: list[dict],
+    existing_ports: dict[str, str],
+    existing_statuses: set[str],
+    errors: list[dict] | None = None
+) -> ImportPlan:
+    """
+    Порівняти рядки імпорту зі станом БД (без запитів).
+
+    existing_devices - словники з полями serial_number, name, rfid, type,
+    site, ip, status; existing_ports - port_number -> serial_number.
+
+    Рядок, що конфліктує (дубль у файлі або name/rfid/ip/порт іншого
+    пристрою), потрапляє в errors і не імпортується.
+    """
+
+    plan = ImportPlan(errors=list(errors or []))
+
+    by_serial = {device["serial_number"]: device for device in existing_devices}
+    owners = {
+        key: {
+            device[key]: device["serial_number"]
+            for device in existing_devices
+            if device[key]
+        }
+        for key in ("name", "rfid", "ip")
+    }
+
+    seen = {key: {} for key in ("serial_number", "name", "rfid", "ip")}
+    seen_ports: dict[str, str] = {}
+    new_statuses: set[str] = set()
+
+    for row in rows:
+
+        def error(message):
+            plan.errors.append({
+                "source": row.source,
+                "row": row.row_number,
+                "serial_number": row.serial_number,
+                "error": message,
+            })
+
+        if row.serial_number in seen["serial_number"]:
+            error("Powtórzony S/N w imporcie")
+            continue
+
+        conflict = None
+        for key in ("name", "rfid", "ip"):
+            value = getattr(row, key)
+            if not value:
+                continue
+            if value in seen[key]:
+                conflict = f"Powtórzone {key} '{value}' w imporcie"
+                break
+            owner = owners[key].get(value)
+            if owner is not None and owner != row.serial_number:
+                conflict = f"{key} '{value}' należy do urządzenia {owner}"
+                break
+
+        if conflict is None:
+            for port in row.ports:
+                if seen_ports.get(port, row.serial_number) != row.serial_number:
+                    conflict = f"Port {port} powtórzony w imporcie"
+                    break
+
+        if conflict:
+            error(conflict)
+            continue
+
+        seen["serial_number"][row.serial_number] = row
+        for key in ("name", "rfid", "ip"):
+            if getattr(row, key):
+                seen[key][getattr(row, key)] = row.serial_number
+
+        for port in row.ports:
+            seen_ports[port] = row.serial_number
+            previous = existing_ports.get(port)
+            if previous != row.serial_number:
+                plan.ports[port] = row.serial_number
+                if previous is not None:
+                    plan.moved_ports.append({
+                        "port_number": port,
+                        "from": previous,
+                        "to": row.serial_number,
+                    })
+
+        if row.status and row.status not in existing_statuses:
+            new_statuses.add(row.status)
+
+        current = by_serial.get(row.serial_number)
+        if current is None:
+            plan.create.append(row)
+            continue
+
+        changes = {}
+        for key in DEVICE_FIELDS:
+            old_value, new_value = current[key], getattr(row, key)
+            if old_value != new_value:
+                changes[key] = {
+                    "old": getattr(old_value, "value", old_value),
+                    "new": getattr(new_value, "value", new_value),
+                }
+
+        if changes:
+            plan.update.append((row, changes))
+        else:
+            plan.unchanged += 1
+
+    plan.new_statuses = sorted(new_statuses)
+    return plan
+
+
+# ===============================
+# APPLY
+# ===============================
+
+async def _load_existing(db: AsyncSession):
+
+    result = await db.execute(
+        select(
+            DeviceDB.serial_number,
+            DeviceDB.name,
+            DeviceDB.rfid,
+            DeviceDB.type,
+            DeviceDB.site,
+            DeviceDB.ip,
+            DeviceStatusDB.name.label("status"),
+        )
+        .outerjoin(DeviceStatusDB, DeviceStatusDB.id == DeviceDB.status_id)
+    )
+    devices = [dict(row._mapping) for row in result]
+
+    result = await db.execute(
+        select(DevicePortDB.port_number, DeviceDB.serial_number)
+        .join(DeviceDB, DeviceDB.id == DevicePortDB.device_id)
+    )
+    ports = {port_number: serial_number for port_number, serial_number in result}
+
+    result = await db.execute(select(DeviceStatusDB.name))
+    statuses = set(result.scalars().all())
+
+    return devices, ports, statuses
+
+
+def _chunks(items: list, size: int):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+async def apply_import_plan(db: AsyncSession, plan: ImportPlan):
+    """Записати план пакетними INSERT ... ON CONFLICT в одній транзакції"""
+
+    if plan.new_statuses:
+        await db.execute(
+            insert(DeviceStatusDB)
+            .values([{"name": name} for name in plan.new_statuses])
+            .on_conflict_do_nothing(index_elements=["name"])
+        )
+
+    result = await db.execute(select(DeviceStatusDB.id, DeviceStatusDB.name))
+    status_ids = {name: status_id for status_id, name in result}
+
+    device_rows = plan.create + [row for row, _ in plan.update]
+    device_ids: dict[str, int] = {}
+
+    for chunk in _chunks(device_rows, DEVICE_CHUNK_SIZE):
+        stmt = insert(DeviceDB).values([
+            {
+                "serial_number": row.serial_number,
+                "name": row.name,
+                "rfid": row.rfid,
+                "type": row.type,
+                "site": row.site,
+                "ip": row.ip,
+                "status_id": status_ids.get(row.status),
+                "enabled": True,
+            }
+            for row in chunk
+        ])
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["serial_number"],
+            set_={
+                "name": stmt.excluded.name,
+                "rfid": stmt.excluded.rfid,
+                "type": stmt.excluded.type,
+                "site": stmt.excluded.site,
+                "ip": stmt.excluded.ip,
+                "status_id": stmt.excluded.status_id,
+            },
+        ).returning(DeviceDB.id, DeviceDB.serial_number)
+
+        result = await db.execute(stmt)
+        device_ids.update({serial_number: device_id for device_id, serial_number in result})
+
+    if plan.ports:
+        missing = {serial for serial in plan.ports.values() if serial not in device_ids}
+        if missing:
+            result = await db.execute(
+                select(DeviceDB.id, DeviceDB.serial_number)
+                .where(DeviceDB.serial_number.in_(missing))
+            )
+            device_ids.update({serial_number: device_id for device_id, serial_number in result})
+
+        port_rows = [
+            {"port_number": port_number, "device_id": device_ids[serial_number]}
+            for port_number, serial_number in plan.ports.items()
+        ]
+
+        for chunk in _chunks(port_rows, PORT_CHUNK_SIZE):
+            stmt = insert(DevicePortDB).values(chunk)
+            await db.execute(
+                stmt.on_conflict_do_update(
+                    index_elements=["port_number"],
+                    set_={"device_id": stmt.excluded.device_id},
+                )
+            )
+
+
+async def import_inventory(
+    db: AsyncSession,
+    sheets: list[tuple[str, list[list]]] | None = None,
+    default_type: DeviceType | None = None,
+    dry_run: bool = True
+) -> dict:
+    """
+    Імпорт інвентаризації в БД. sheets - [(назва, рядки)] з файлу;
+    якщо не задано, аркуші читаються з Google Sheets.
+    Повертає звіт змін; при dry_run нічого не записує.
+    """
+
+    if sheets is None:
+        sheets = await asyncio.to_thread(read_google_sheets)
+
+    rows, errors = parse_sheets(sheets, default_type)
+
+    existing_devices, existing_ports, existing_statuses = await _load_existing(db)
+
+    plan = plan_inventory_import(
+        rows, existing_devices, existing_ports, existing_statuses, errors
+    )
+
+    if not dry_run:
+        await apply_import_plan(db, plan)
+        await db.commit()
+
+        logger.info(
+            "Inventory import: %s created, %s updated, %s errors",
+            len(plan.create), len(plan.update), len(plan.errors)
+        )
+
+    return plan.report(dry_run)
@@ -0,0 +1,142 @@
+# services/pagination.py
+
+import base64
+import json
+import time
+from datetime import datetime
+from typing import Any, Sequence
+
+from fastapi import HTTPException
+from sqlalchemy import Select, func, select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from config import TRANSACTIONS_COUNT_CACHE_SECONDS, TRANSACTIONS_COUNT_CACHE_SIZE
+
+
+def encode_cursor(values: Sequence[Any]) -> str:
+    """Значення ключових колонок останнього рядка сторінки -> непрозорий рядок"""
+    raw = json.dumps([
+        value.isoformat() if isinstance(value, datetime) else value
+        for value in values
+    ]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, key_columns: Sequence) -> tuple:
+    """Рядок курсора -> значення key_columns (типи - з колонок)"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = json.loads(raw)
+        if not isinstance(values, list) or len(values) != len(key_columns):
+            raise ValueError("cursor does not match key columns")
+
+        return tuple(
+            _from_json(value, column.type.python_type)
+            for value, column in zip(values, key_columns)
+        )
+    except (ValueError, TypeError, NotImplementedError):
+        raise HTTPException(status_code=400, detail="Nieprawidłowy kursor")
+
+
+def _from_json(value, python_type):
+    if python_type is datetime:
+        return datetime.fromisoformat(value)
+    return python_type(value)
+
+
+class CountCache:
+    """
+    Кеш кількості рядків для фільтрів списку (ключ - назва списку
+    і значення фільтрів). Точний count(*) рахується не частіше ніж раз
+    на ttl_seconds для однакових фільтрів.
+    """
+
+    def __init__(self, ttl_seconds: int, max_entries: int):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: dict[tuple, tuple[int, float]] = {}
+
+    def get(self, key: tuple) -> int | None:
+        entry = self._entries.get(key)
+        if entry and time.monotonic() - entry[1] < self.ttl_seconds:
+            return entry[0]
+        return None
+
+    def set(self, key: tuple, total: int):
+        if len(self._entries) >= self.max_entries:
+            # викидаємо найстаріший запис
+            oldest = min(self._entries, key=lambda k: self._entries[k][1])
+            self._entries.pop(oldest)
+        self._entries[key] = (total, time.monotonic())
+
+    def invalidate(self):
+        self._entries.clear()
+
+
+count_cache = CountCache(
+    ttl_seconds=TRANSACTIONS_COUNT_CACHE_SECONDS,
+    max_entries=TRANSACTIONS_COUNT_CACHE_SIZE
+)
+
+
+async def count_rows(db: AsyncSession, stmt: Select, count_key: tuple) -> int:
+    total = count_cache.get(count_key)
+    if total is None:
+        count_stmt = select(func.count()).select_from(stmt.order_by(None).subquery())
+        total = (await db.execute(count_stmt)).scalar_one()
+        count_cache.set(count_key, total)
+    return total
+
+
+async def paginate_keyset(
+    db: AsyncSession,
+    stmt: Select,
+    key_columns: Sequence,
+    count_key: tuple,
+    page: int = 1,
+    page_size: int = 10,
+    cursor: str | None = None,
+    with_total: bool = True
+) -> dict:
+    """
+    Сторінка, впорядкована за key_columns від більших до менших
+    (напр. (timestamp, id): найновіші першими). Остання колонка має
+    бути унікальною, щоб порядок був однозначним.
+
+    cursor - keyset-пагінація: WHERE (key_columns) < cursor, без OFFSET.
+    Без cursor працює стара схема з page (OFFSET) для сумісності.
+    В обох випадках відповідь містить next_cursor наступної сторінки.
+    """
+
+    stmt = stmt.order_by(None).order_by(*(column.desc() for column in key_columns))
+
+    total = None
+    pages = None
+    if with_total:
+        total = await count_rows(db, stmt, count_key)
+        pages = max(1, (total + page_size - 1) // page_size)
+
+    if cursor:
+        stmt = stmt.where(
+            tuple_(*key_columns) < tuple_(*decode_cursor(cursor, key_columns))
+        )
+        page = None
+    else:
+        stmt = stmt.offset((page - 1) * page_size)
+
+    result = await db.execute(stmt.limit(page_size + 1))
+    items = result.scalars().all()
+
+    next_cursor = None
+    if len(items) > page_size:
+        items = items[:page_size]
+        next_cursor = encode_cursor([getattr(items[-1], column.key) for column in key_columns])
+
+    return {
+        "items": items,
+        "page": page,
+        "pages": pages,
+        "total": total,
+        "page_size": page_size,
+        "next_cursor": next_cursor
+    }
@@ -0,0 +1,49 @@
+# services/scan_receipts.py
+
+from datetime import datetime, timedelta, timezone
+from typing import Iterable, Set
+
+from sqlalchemy import delete
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from config import ESP_SCAN_RECEIPT_HOURS
+from models.db_esp_scan import EspScanReceiptDB
+
+
+async def claim_scans(
+    db: AsyncSession,
+    device_id: str,
+    scan_ids: Iterable[str]
+) -> Set[str]:
+    """
+    Записати ключі сканів зчитувача (без commit - у транзакції пачки).
+
+    INSERT ... ON CONFLICT DO NOTHING RETURNING повертає лише нові ключі:
+    скани, які вже були оброблені (повтор пачки після обриву WiFi),
+    пропускаються. Ключі, старші за ESP_SCAN_RECEIPT_HOURS, видаляються.
+    """
+
+    scan_ids = list(scan_ids)
+    if not scan_ids:
+        return set()
+
+    await db.execute(
+        delete(EspScanReceiptDB).where(
+            EspScanReceiptDB.device_id == device_id,
+            EspScanReceiptDB.received_at
+            < datetime.now(timezone.utc) - timedelta(hours=ESP_SCAN_RECEIPT_HOURS)
+        )
+    )
+
+    result = await db.execute(
+        insert(EspScanReceiptDB)
+        .values([
+            {"device_id": device_id, "scan_id": scan_id}
+            for scan_id in scan_ids
+        ])
+        .on_conflict_do_nothing(index_elements=["device_id", "scan_id"])
+        .returning(EspScanReceiptDB.scan_id)
+    )
+
+    return set(result.scalars().all())
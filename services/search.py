@@ -0,0 +1,74 @@
+# services/search.py
+
+from sqlalchemy import func, or_
+
+# pg_trgm шукає по трійках символів: коротший запит індекс
+# для "%q%" не звужує, тому такі запити шукаються за префіксом
+TRIGRAM_MIN_LENGTH = 3
+
+SEARCH_MODES = ("auto", "contains", "prefix")
+
+
+def escape_like(value: str) -> str:
+    """Екранувати %, _ і \\ з введення користувача для LIKE"""
+    return (
+        value.replace("\\", "\\\\")
+        .replace("%", "\\%")
+        .replace("_", "\\_")
+    )
+
+
+def contains(q: str, *columns):
+    """col ILIKE '%q%' - GIN індекси gin_trgm_ops"""
+    pattern = f"%{escape_like(q)}%"
+    return or_(*(column.ilike(pattern, escape="\\") for column in columns))
+
+
+def starts_with(q: str, *columns):
+    """col ILIKE 'q%' - теж обслуговується GIN індексами gin_trgm_ops"""
+    pattern = f"{escape_like(q)}%"
+    return or_(*(column.ilike(pattern, escape="\\") for column in columns))
+
+
+def code_prefix(q: str, *columns):
+    """
+    lower(col) LIKE 'q%' - btree індекси lower(col) text_pattern_ops
+    для RFID і серійних номерів (пошук при скануванні, typeahead).
+    """
+    pattern = f"{escape_like(q.lower())}%"
+    return or_(*(func.lower(column).like(pattern, escape="\\") for column in columns))
+
+
+def search_condition(
+    q: str,
+    columns: list,
+    code_columns: list | None = None,
+    mode: str = "auto"
+):
+    """
+    Умова пошуку q по колонках.
+
+    columns - текстові колонки (імена, логіни, назви);
+    code_columns - коди (RFID, S/N), для яких префікс шукається
+    через lower(col) text_pattern_ops.
+
+    mode: "contains" - підрядок, "prefix" - початок значення,
+    "auto" - підрядок, а для запитів коротших за TRIGRAM_MIN_LENGTH - префікс.
+    """
+
+    q = q.strip()
+    code_columns = code_columns or []
+
+    if mode == "auto":
+        mode = "contains" if len(q) >= TRIGRAM_MIN_LENGTH else "prefix"
+
+    if mode == "contains":
+        return contains(q, *columns, *code_columns)
+
+    conditions = []
+    if columns:
+        conditions.append(starts_with(q, *columns))
+    if code_columns:
+        conditions.append(code_prefix(q, *code_columns))
+
+    return or_(*conditions)
@@ -0,0 +1,249 @@
+# services/sheet_sync.py
+
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import event, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+
+import config
+from db.session import background_session
+from models.db_device import DeviceDB
+from models.db_sheet_sync import SheetSyncOutboxDB
+from services.google_sheets import sync_devices_to_sheets
+
+logger = logging.getLogger(__name__)
+
+
+def enqueue_device_sync(
+    db: AsyncSession,
+    device_id: int,
+    notes: str
+):
+    """
+    Додати зміну пристрою в чергу синхронізації.
+    Запис зберігається разом з транзакцією викликача,
+    воркер прокидається після її commit.
+    """
+
+    db.add(SheetSyncOutboxDB(device_id=device_id, notes=notes))
+
+    event.listen(
+        db.sync_session,
+        "after_commit",
+        lambda session: sheet_sync_worker.notify(),
+        once=True
+    )
+
+
+class SheetSyncWorker:
+    """Фоновий воркер, що переносить чергу sheet_sync_outbox в Google Sheets"""
+
+    def __init__(self, session_factory=None, sheets_service=None):
+        self._session_factory = session_factory or background_session
+        self._sheets_service = sheets_service
+        self._wakeup = asyncio.Event()
+        # з моменту старту воркера (для /admin/api/metrics)
+        self.synced = 0
+        self.retried = 0
+        self.failed = 0
+        # один потік - googleapiclient/httplib2 не потокобезпечні
+        self._executor = ThreadPoolExecutor(
+            max_workers=1,
+            thread_name_prefix="sheet-sync"
+        )
+
+    def notify(self):
+        """Розбудити воркер (є нові записи в черзі)"""
+        self._wakeup.set()
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    async def run(self):
+        logger.info("Sheet sync worker started")
+
+        while True:
+            self._wakeup.clear()
+
+            try:
+                processed = await self.process_pending()
+            except Exception as exc:
+                logger.error("Error in sheet sync worker: %s", exc)
+                processed = 0
+
+            # повна пачка - в черзі, ймовірно, є ще записи
+            if processed >= config.SHEET_SYNC_BATCH_SIZE:
+                continue
+
+            try:
+                await asyncio.wait_for(
+                    self._wakeup.wait(),
+                    timeout=config.SHEET_SYNC_POLL_SECONDS
+                )
+            except asyncio.TimeoutError:
+                pass
+
+    async def process_pending(self) -> int:
+        """
+        Обробити одну пачку черги. Повертає кількість записів черги.
+
+        Записи спершу захоплюються (next_attempt_at зсувається на час оренди,
+        commit), виклик Google Sheets іде вже без транзакції і блокувань,
+        результат записується окремою короткою транзакцією. Якщо процес
+        впаде посередині - записи повернуться в роботу після оренди.
+        """
+
+        claimed = await self._claim()
+        if claimed is None:
+            return 0
+
+        attempts_by_entry, devices_with_notes = claimed
+
+        error = None
+        written: set[int] = set()
+        try:
+            loop = asyncio.get_running_loop()
+            written = await loop.run_in_executor(
+                self._executor,
+                sync_devices_to_sheets,
+                devices_with_notes,
+                self._sheets_service
+            )
+        except Exception as exc:
+            error = exc
+            logger.warning(
+                "Sheet sync failed for %s entries: %s", len(attempts_by_entry), exc
+            )
+        else:
+            logger.info(
+                "Synced %s devices to sheet (%s outbox entries)",
+                len(written), len(attempts_by_entry)
+            )
+
+        await self._record(attempts_by_entry, written, error)
+        return len(attempts_by_entry)
+
+    async def _claim(self):
+        """Захопити пачку черги і прочитати її пристрої (одна коротка транзакція)"""
+
+        async with self._session_factory() as db:
+            now = datetime.now(timezone.utc)
+
+            result = await db.execute(
+                select(SheetSyncOutboxDB)
+                .where(
+                    SheetSyncOutboxDB.synced_at.is_(None),
+                    SheetSyncOutboxDB.failed_at.is_(None),
+                    SheetSyncOutboxDB.next_attempt_at <= now
+                )
+                .order_by(SheetSyncOutboxDB.id)
+                .limit(config.SHEET_SYNC_BATCH_SIZE)
+                .with_for_update(skip_locked=True)
+            )
+            entries = result.scalars().all()
+
+            if not entries:
+                return None
+
+            # кілька змін одного пристрою -> один запис в аркуш
+            notes_by_device: dict[int, list[str]] = {}
+            for entry in entries:
+                notes_by_device.setdefault(entry.device_id, []).append(entry.notes)
+                entry.next_attempt_at = now + timedelta(
+                    seconds=config.SHEET_SYNC_LEASE_SECONDS
+                )
+
+            result = await db.execute(
+                select(DeviceDB)
+                .options(
+                    selectinload(DeviceDB.status),
+                    selectinload(DeviceDB.ports)
+                )
+                .where(DeviceDB.id.in_(notes_by_device.keys()))
+            )
+            devices_with_notes = [
+                (device, "\n".join(notes_by_device[device.id]))
+                for device in result.scalars().all()
+            ]
+
+            attempts_by_entry = {
+                entry.id: (entry.device_id, entry.attempts) for entry in entries
+            }
+
+            await db.commit()
+            return attempts_by_entry, devices_with_notes
+
+    async def _record(self, attempts_by_entry: dict, written: set[int], error):
+        """
+        Записати результат виклику Sheets для захоплених записів.
+        Після SHEET_SYNC_MAX_ATTEMPTS невдач запис позначається failed_at
+        і більше не захоплюється (видно в /admin/api/metrics).
+        """
+
+        async with self._session_factory() as db:
+            now = datetime.now(timezone.utc)
+
+            result = await db.execute(
+                select(SheetSyncOutboxDB)
+                .where(SheetSyncOutboxDB.id.in_(attempts_by_entry.keys()))
+            )
+
+            for entry in result.scalars().all():
+                device_id, attempts = attempts_by_entry[entry.id]
+                if error is not None:
+                    entry.attempts = attempts + 1
+                    entry.last_error = str(error)[:1000]
+                    if entry.attempts >= config.SHEET_SYNC_MAX_ATTEMPTS:
+                        entry.failed_at = now
+                        self.failed += 1
+                        logger.error(
+                            "Sheet sync entry %s (device %s) failed after %s attempts: %s",
+                            entry.id, device_id, entry.attempts, entry.last_error
+                        )
+                    else:
+                        entry.next_attempt_at = now + self._backoff(entry.attempts)
+                        self.retried += 1
+                else:
+                    entry.synced_at = now
+                    self.synced += 1
+                    if device_id not in written:
+                        entry.last_error = "Device row not found in sheet"
+
+            await db.commit()
+
+    async def stats(self) -> dict:
+        """Стан черги: очікують / остаточно невдалі (з БД) і лічильники воркера"""
+
+        async with self._session_factory() as db:
+            result = await db.execute(
+                select(
+                    func.count().filter(
+                        SheetSyncOutboxDB.synced_at.is_(None),
+                        SheetSyncOutboxDB.failed_at.is_(None)
+                    ),
+                    func.count().filter(SheetSyncOutboxDB.failed_at.is_not(None)),
+                )
+            )
+            pending, failed = result.one()
+
+        return {
+            "pending": pending,
+            "failed": failed,
+            "max_attempts": config.SHEET_SYNC_MAX_ATTEMPTS,
+            "synced_since_start": self.synced,
+            "retried_since_start": self.retried,
+            "failed_since_start": self.failed,
+        }
+
+    @staticmethod
+    def _backoff(attempts: int) -> timedelta:
+        delay = config.SHEET_SYNC_RETRY_BASE_SECONDS * 2 ** (attempts - 1)
+        return timedelta(seconds=min(delay, config.SHEET_SYNC_RETRY_MAX_SECONDS))
+
+
+# Глобальний екземпляр воркера
+sheet_sync_worker = SheetSyncWorker()
@@ -1,4 +1,5 @@
 import pytest
+from datetime import datetime, timedelta, timezone
 from types import SimpleNamespace
 from unittest.mock import AsyncMock, Mock
 
@@ -9,6 +10,8 @@ from routers.api import get_devices, get_manager, get_db
 
 from models.device import Device
 from models.db_device import DeviceType as DBDeviceType
+from managers.config_manager import config_manager
+from managers.rfid_index import rfid_index
 
 
 # =========================
@@ -39,6 +42,59 @@ def fake_connection_manager():
     return cm
 
 
+@pytest.fixture(autouse=True)
+def app_state():
+    """Ізолювати глобальний стан app.main між тестами"""
+    import app.main as mainmod
+
+    original_reg = mainmod.registration_manager
+    config = config_manager._get_default_config_dict()
+    config["allow_registration_without_login"] = True
+    config_manager._cache = config
+    config_manager._cache_time = datetime.utcnow()
+    rfid_index.clear()
+
+    yield
+
+    mainmod.registration_manager = original_reg
+    config_manager.invalidate_cache()
+    rfid_index.clear()
+    app.dependency_overrides.clear()
+
+
+def make_registration_manager(session=None):
+    reg = Mock()
+    reg.timeout = timedelta(seconds=7)
+    reg.get = Mock(return_value=session)
+    return reg
+
+
+def make_session(employee):
+    return SimpleNamespace(employee=employee, started_at=datetime.now(timezone.utc))
+
+
+def seed_employee(id, rfid="EMP-RFID", **fields):
+    return rfid_index.put_employee(SimpleNamespace(
+        id=id,
+        rfid=rfid,
+        first_name=fields.get("first_name", "Jan"),
+        last_name=fields.get("last_name", "Kowalski"),
+        wms_login=fields.get("wms_login", f"login{id}"),
+        department=fields.get("department"),
+    ))
+
+
+def seed_device(id, name, type, rfid=None, employee_id=None):
+    return rfid_index.put_device(SimpleNamespace(
+        id=id,
+        rfid=rfid or f"DEV-{id}",
+        name=name,
+        type=type,
+        employee_id=employee_id,
+        enabled=True,
+    ))
+
+
 @pytest.fixture
 async def ac():
     transport = ASGITransport(app=app)
@@ -55,9 +111,11 @@ async def ac():
 
 class FakeDB:
     def __init__(self):
-        self.execute = AsyncMock()
+        # результат - звичайний Mock: scalar_one_or_none() синхронний, як у SQLAlchemy
+        self.execute = AsyncMock(return_value=make_result_scalar(None))
         self.add = Mock()          # ⬅ НЕ AsyncMock
         self.commit = AsyncMock()
+        self.rollback = AsyncMock()
         self.refresh = AsyncMock()
 
 
@@ -101,24 +159,24 @@ async def test_no_rfid_updates_device_and_broadcasts(
 async def test_rfid_matches_employee_starts_session_and_sends_status(
     ac, fake_device_manager, fake_connection_manager
 ):
-    employee = SimpleNamespace(id=1, first_name="Jan", last_name="Kowalski", devices=[])
+    employee = seed_employee(1, rfid="EMP-RFID")
 
     fake_db = FakeDB()
-    fake_db.execute.return_value = make_result_scalar(employee)
 
     app.dependency_overrides[get_devices] = lambda: fake_device_manager
     app.dependency_overrides[get_manager] = lambda: fake_connection_manager
     app.dependency_overrides[get_db] = lambda: fake_db
 
     import app.main as mainmod
-    fake_reg = Mock()
-    fake_reg.start_or_replace = Mock()
+    fake_reg = make_registration_manager()
     mainmod.registration_manager = fake_reg
 
     resp = await ac.post("/api/data/dev-2", json={"rfid": "EMP-RFID"})
 
     assert resp.status_code == 200
-    fake_reg.start_or_replace.assert_called_with("dev-2", employee)
+    fake_reg.start_or_replace.assert_called_with("dev-2", employee, at=None)
+    # індекс відповів без звернень до БД
+    fake_db.execute.assert_not_awaited()
 
     app.dependency_overrides.clear()
 
@@ -131,6 +189,7 @@ async def test_rfid_unknown_returns_error_status(
     fake_db.execute.side_effect = [
         make_result_scalar(None),  # employee
         make_result_scalar(None),  # device
+        make_result_scalar(None),  # guest
     ]
 
     app.dependency_overrides[get_devices] = lambda: fake_device_manager
@@ -138,7 +197,7 @@ async def test_rfid_unknown_returns_error_status(
     app.dependency_overrides[get_db] = lambda: fake_db
 
     import app.main as mainmod
-    mainmod.registration_manager = Mock()
+    mainmod.registration_manager = make_registration_manager()
 
     resp = await ac.post("/api/data/dev-3", json={"rfid": "UNKNOWN"})
     assert resp.status_code == 200
@@ -156,37 +215,51 @@ async def test_rfid_unknown_returns_error_status(
 async def test_rfid_device_unlink_when_no_session_and_employee_present(
     ac, fake_device_manager, fake_connection_manager
 ):
-    pass
+    seed_employee(4)
+    seed_device(14, "S4", DBDeviceType.scanner, rfid="RFID", employee_id=4)
+
+    fake_db = FakeDB()
+    fake_db.execute.return_value = make_result_scalar(201)  # id транзакції unregistered
+
+    app.dependency_overrides[get_devices] = lambda: fake_device_manager
+    app.dependency_overrides[get_manager] = lambda: fake_connection_manager
+    app.dependency_overrides[get_db] = lambda: fake_db
+
+    import app.main as mainmod
+    mainmod.registration_manager = make_registration_manager()
+
+    resp = await ac.post("/api/data/dev-4", json={"rfid": "RFID"})
+    assert resp.status_code == 200
+
+    assert any(
+        call.args[1]["status"] == "success"
+        for call in fake_connection_manager.broadcast_device_data.await_args_list
+        if call.args[1]["type"] == "registration_status"
+    )
+    fake_db.execute.assert_awaited_once()
+    fake_db.commit.assert_awaited_once()
+    assert rfid_index.devices_of(4) == []
+
+    app.dependency_overrides.clear()
 
 
 @pytest.mark.asyncio
 async def test_session_exists_and_employee_already_has_same_type(
     ac, fake_device_manager, fake_connection_manager
 ):
-    device_db = SimpleNamespace(
-        id=11,
-        name="S2",
-        type=DBDeviceType.scanner,
-        employee_id=None,
-    )
+    seed_device(11, "S2", DBDeviceType.scanner, rfid="RFID")
 
-    employee = SimpleNamespace(id=2, first_name="A", last_name="B")
-    user_device = SimpleNamespace(type=DBDeviceType.scanner)
+    employee = seed_employee(2, first_name="A", last_name="B")
+    seed_device(10, "S1", DBDeviceType.scanner, employee_id=2)
 
     fake_db = FakeDB()
-    fake_db.execute.side_effect = [
-        make_result_scalar(None),               # employee
-        make_result_scalar(device_db),          # device
-        make_result_scalars_list([user_device]) # user devices
-    ]
 
     app.dependency_overrides[get_devices] = lambda: fake_device_manager
     app.dependency_overrides[get_manager] = lambda: fake_connection_manager
     app.dependency_overrides[get_db] = lambda: fake_db
 
     import app.main as mainmod
-    fake_reg = Mock()
-    fake_reg.get = Mock(return_value=SimpleNamespace(employee=employee))
+    fake_reg = make_registration_manager(make_session(employee))
     mainmod.registration_manager = fake_reg
 
     resp = await ac.post("/api/data/dev-5", json={"rfid": "RFID"})
@@ -205,24 +278,122 @@ async def test_session_exists_and_employee_already_has_same_type(
 async def test_session_completion_when_employee_gets_both_devices(
     ac, fake_device_manager, fake_connection_manager
 ):
-    device_db = SimpleNamespace(
-        id=12,
-        name="P1",
-        type=DBDeviceType.printer,
-        employee_id=None,
+    seed_device(12, "P1", DBDeviceType.printer, rfid="RFID")
+
+    employee = seed_employee(3, first_name="X", last_name="Y")
+    seed_device(13, "Sx", DBDeviceType.scanner, employee_id=3)
+
+    fake_db = FakeDB()
+    fake_db.execute.return_value = make_result_scalar(202)  # id транзакції registered
+
+    app.dependency_overrides[get_devices] = lambda: fake_device_manager
+    app.dependency_overrides[get_manager] = lambda: fake_connection_manager
+    app.dependency_overrides[get_db] = lambda: fake_db
+
+    import app.main as mainmod
+    fake_reg = make_registration_manager(make_session(employee))
+    mainmod.registration_manager = fake_reg
+
+    resp = await ac.post("/api/data/dev-6", json={"rfid": "RFID"})
+    assert resp.status_code == 200
+
+    fake_reg.end.assert_called_with("dev-6")
+    # UPDATE ... RETURNING + INSERT транзакції одним запитом і одним commit
+    fake_db.execute.assert_awaited_once()
+    fake_db.commit.assert_awaited_once()
+    assert {d.name for d in rfid_index.devices_of(3)} == {"Sx", "P1"}
+
+    app.dependency_overrides.clear()
+
+
+@pytest.mark.asyncio
+async def test_concurrent_assignment_is_reported_as_conflict(
+    ac, fake_device_manager, fake_connection_manager
+):
+    seed_device(15, "P2", DBDeviceType.printer, rfid="RFID")
+    employee = seed_employee(6)
+
+    fake_db = FakeDB()
+    # індекс пропустив, але інший запит встиг закріпити принтер:
+    # UPDATE не знайшов рядка - RETURNING порожній
+    fake_db.execute.return_value = make_result_scalar(None)
+
+    app.dependency_overrides[get_devices] = lambda: fake_device_manager
+    app.dependency_overrides[get_manager] = lambda: fake_connection_manager
+    app.dependency_overrides[get_db] = lambda: fake_db
+
+    import app.main as mainmod
+    fake_reg = make_registration_manager(make_session(employee))
+    mainmod.registration_manager = fake_reg
+
+    resp = await ac.post("/api/data/dev-8", json={"rfid": "RFID"})
+    assert resp.status_code == 200
+
+    fake_db.execute.assert_awaited_once()
+    assert any(
+        call.args[1]["status"] == "error"
+        for call in fake_connection_manager.broadcast_device_data.await_args_list
+        if call.args[1]["type"] == "registration_status"
     )
+    fake_reg.end.assert_not_called()
+    fake_reg.refresh.assert_not_called()
+    assert rfid_index.devices_of(6) == []
+
+    app.dependency_overrides.clear()
+
 
-    employee = SimpleNamespace(id=3, first_name="X", last_name="Y")
+@pytest.mark.asyncio
+async def test_device_of_another_employee_is_not_moved(
+    ac, fake_device_manager, fake_connection_manager
+):
+    seed_employee(5, rfid="OWNER-RFID", wms_login="owner")
+    seed_device(16, "S3", DBDeviceType.scanner, rfid="RFID", employee_id=5)
+    employee = seed_employee(6)
+
+    fake_db = FakeDB()
+
+    app.dependency_overrides[get_devices] = lambda: fake_device_manager
+    app.dependency_overrides[get_manager] = lambda: fake_connection_manager
+    app.dependency_overrides[get_db] = lambda: fake_db
+
+    import app.main as mainmod
+    fake_reg = make_registration_manager(make_session(employee))
+    mainmod.registration_manager = fake_reg
+
+    resp = await ac.post("/api/data/dev-9", json={"rfid": "RFID"})
+    assert resp.status_code == 200
+
+    fake_db.execute.assert_not_awaited()
+    status = fake_connection_manager.broadcast_device_data.await_args_list[-1].args[1]
+    assert status["status"] == "error"
+    assert "owner" in status["message"]
+    assert [d.name for d in rfid_index.devices_of(5)] == ["S3"]
+    assert rfid_index.devices_of(6) == []
+
+    app.dependency_overrides.clear()
+
+
+@pytest.mark.asyncio
+async def test_assign_update_skips_device_held_by_someone_else():
+    from sqlalchemy.dialects import postgresql
+
+    from services.device_assignment import assign_device
+
+    db = FakeDB()
+    await assign_device(db, 16, 6)
 
-    scanner = SimpleNamespace(type=DBDeviceType.scanner, name="Sx")
-    printer = SimpleNamespace(type=DBDeviceType.printer, name="Px")
+    sql = str(db.execute.await_args.args[0].compile(dialect=postgresql.dialect()))
+    assert "devices.employee_id IS NULL OR devices.employee_id = " in sql
+@pytest.mark.asyncio
+async def test_batch_skips_known_scan_ids_and_commits_once(
+    ac, fake_device_manager, fake_connection_manager
+):
+    employee = seed_employee(5, rfid="EMP-RFID")
 
     fake_db = FakeDB()
     fake_db.execute.side_effect = [
-        make_result_scalar(None),               # employee
-        make_result_scalar(device_db),          # device
-        make_result_scalars_list([]),            # before
-        make_result_scalars_list([scanner, printer])  # after
+        Mock(),                                 # очищення старих ключів
+        make_result_scalars_list(["scan-2"]),   # нові ключі (scan-1 вже був)
     ]
 
     app.dependency_overrides[get_devices] = lambda: fake_device_manager
@@ -230,15 +401,122 @@ async def test_session_completion_when_employee_gets_both_devices(
     app.dependency_overrides[get_db] = lambda: fake_db
 
     import app.main as mainmod
-    fake_reg = Mock()
-    fake_reg.get = Mock(return_value=SimpleNamespace(employee=employee))
-    fake_reg.end = Mock()
+    fake_reg = make_registration_manager()
     mainmod.registration_manager = fake_reg
 
-    resp = await ac.post("/api/data/dev-6", json={"rfid": "RFID"})
+    resp = await ac.post("/api/data/dev-7/batch", json={"scans": [
+        {"id": "scan-1", "data": {"rfid": "EMP-RFID"}},
+        {"id": "scan-2", "scanned_at": "2026-10-17T08:00:00Z", "data": {"rfid": "EMP-RFID"}},
+    ]})
+
     assert resp.status_code == 200
+    assert resp.json() == {"status": "ok", "processed": ["scan-2"], "duplicates": ["scan-1"]}
+    fake_reg.start_or_replace.assert_called_once_with(
+        "dev-7", employee, at=datetime(2026, 10, 17, 8, tzinfo=timezone.utc)
+    )
+    fake_db.commit.assert_awaited_once()
+    # esp32_data і registration_status - після commit пачки
+    assert [
+        call.args[1]["type"] for call in fake_connection_manager.broadcast_device_data.await_args_list
+    ] == ["esp32_data", "registration_status"]
+    fake_connection_manager.broadcast_device_list.assert_awaited_once()
 
-    fake_reg.end.assert_called_with("dev-6")
-    assert fake_db.add.call_count >= 1
+    app.dependency_overrides.clear()
+
+
+@pytest.mark.asyncio
+async def test_failed_batch_commit_sends_nothing_and_undoes_session(
+    ac, fake_device_manager, fake_connection_manager, monkeypatch
+):
+    from sqlalchemy.exc import OperationalError
+
+    seed_employee(5, rfid="EMP-RFID")
+
+    fake_db = FakeDB()
+    fake_db.execute.side_effect = [
+        Mock(),
+        make_result_scalars_list(["scan-1"]),
+    ]
+    fake_db.commit.side_effect = OperationalError("COMMIT", {}, Exception("connection lost"))
+
+    reload = AsyncMock()
+    monkeypatch.setattr(rfid_index, "reload", reload)
+
+    app.dependency_overrides[get_devices] = lambda: fake_device_manager
+    app.dependency_overrides[get_manager] = lambda: fake_connection_manager
+    app.dependency_overrides[get_db] = lambda: fake_db
+
+    import app.main as mainmod
+    fake_reg = make_registration_manager()
+    mainmod.registration_manager = fake_reg
+
+    resp = await ac.post("/api/data/dev-7/batch", json={"scans": [
+        {"id": "scan-1", "data": {"rfid": "EMP-RFID"}},
+    ]})
+
+    assert resp.status_code == 503
+    fake_db.rollback.assert_awaited_once()
+    # сесія, відкрита скануванням у пачці, закривається
+    fake_reg.start_or_replace.assert_called_once()
+    fake_reg.end.assert_called_once_with("dev-7")
+    reload.assert_awaited_once_with(fake_db)
+    fake_connection_manager.broadcast_device_data.assert_not_called()
+    fake_connection_manager.broadcast_device_list.assert_not_called()
+
+    app.dependency_overrides.clear()
+
+
+class NestedTransaction:
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+@pytest.mark.asyncio
+async def test_buffered_batch_registers_by_scan_time(
+    ac, fake_device_manager, fake_connection_manager
+):
+    from managers.registration_manager import RegistrationManager
+
+    seed_employee(5, rfid="EMP-RFID")
+    seed_device(10, "S1", DBDeviceType.scanner, rfid="SCAN-RFID")
+    seed_device(11, "P1", DBDeviceType.printer, rfid="PRINT-RFID")
+
+    fake_db = FakeDB()
+    fake_db.begin_nested = Mock(return_value=NestedTransaction())
+    fake_db.execute.side_effect = [
+        Mock(),
+        make_result_scalars_list(["scan-1", "scan-2", "scan-3"]),
+        make_result_scalar(301),    # registered: S1
+    ]
+
+    app.dependency_overrides[get_devices] = lambda: fake_device_manager
+    app.dependency_overrides[get_manager] = lambda: fake_connection_manager
+    app.dependency_overrides[get_db] = lambda: fake_db
+
+    import app.main as mainmod
+    mainmod.registration_manager = RegistrationManager(timeout_seconds=7)
+
+    # буфер SD годинної давності: картка, скан через 3 с, друк через 30 с
+    t0 = datetime.now(timezone.utc) - timedelta(hours=1)
+    resp = await ac.post("/api/data/dev-7/batch", json={"scans": [
+        {"id": "scan-1", "scanned_at": t0.isoformat(), "data": {"rfid": "EMP-RFID"}},
+        {"id": "scan-2", "scanned_at": (t0 + timedelta(seconds=3)).isoformat(), "data": {"rfid": "SCAN-RFID"}},
+        {"id": "scan-3", "scanned_at": (t0 + timedelta(seconds=30)).isoformat(), "data": {"rfid": "PRINT-RFID"}},
+    ]})
+
+    assert resp.status_code == 200
+    assert [d.name for d in rfid_index.devices_of(5)] == ["S1"]
+    # сесія минула до скану друкарки - друкарка не закріплена
+    assert fake_db.execute.await_count == 3
+    statuses = [
+        call.args[1]["status"]
+        for call in fake_connection_manager.broadcast_device_data.await_args_list
+        if call.args[1]["type"] == "registration_status"
+    ]
+    assert statuses == ["success", "success", "error"]
+    assert mainmod.registration_manager.get("dev-7") is None
 
     app.dependency_overrides.clear()
@@ -0,0 +1,92 @@
+import asyncio
+from unittest.mock import AsyncMock, Mock
+
+import pytest
+
+from managers.config_manager import ConfigManager
+from managers.state_backend import InMemoryStateBackend, SharedState
+from models.db_system_config import SystemConfigDB
+
+
+def fake_db(db_config):
+    result = Mock()
+    result.scalar_one_or_none = Mock(return_value=db_config)
+    db = Mock()
+    db.execute = AsyncMock(return_value=result)
+    db.commit = AsyncMock()
+    return db
+
+
+@pytest.mark.asyncio
+async def test_config_change_reaches_other_worker_snapshot():
+    backend = InMemoryStateBackend()
+    writer, reader = ConfigManager(), ConfigManager()
+    writer_state, reader_state = SharedState(backend), SharedState(backend)
+    writer.attach_shared_state(writer_state)
+    reader.attach_shared_state(reader_state)
+    await writer_state.start()
+    await reader_state.start()
+
+    applied = []
+    reader.add_listener(applied.append)
+
+    # до завантаження гарячі шляхи бачать дефолти
+    assert reader.snapshot["registration_timeout_seconds"] == 7
+
+    db_config = SystemConfigDB(**{**writer.snapshot, "registration_timeout_seconds": 12})
+    await writer.update_config(fake_db(db_config), {"registration_timeout_seconds": 12})
+    await asyncio.sleep(0.01)
+
+    assert reader.snapshot["registration_timeout_seconds"] == 12
+    assert [config["registration_timeout_seconds"] for config in applied] == [12]
+
+    # той самий конфіг ще раз - слухачі не викликаються
+    reader._apply_remote("changed", {"config": dict(reader.snapshot)}, "other")
+    assert len(applied) == 1
+
+    await writer_state.close()
+    await reader_state.close()
+
+
+class SessionFactory:
+    """Перші failures сесій падають (БД ще не готова)"""
+
+    def __init__(self, db, failures):
+        self.db = db
+        self.failures = failures
+
+    def __call__(self):
+        return self
+
+    async def __aenter__(self):
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("database is starting up")
+        return self.db
+
+    async def __aexit__(self, *exc):
+        pass
+
+
+@pytest.mark.asyncio
+async def test_failed_startup_load_is_retried_in_background():
+    manager = ConfigManager()
+    applied = []
+    manager.add_listener(applied.append)
+
+    broken_db = Mock()
+    broken_db.execute = AsyncMock(side_effect=ConnectionError("refused"))
+    # невдале читання не кешується як дефолти
+    assert (await manager.get_config(broken_db))["registration_timeout_seconds"] == 7
+    assert not manager.loaded
+
+    db_config = SystemConfigDB(**{**manager.snapshot, "registration_timeout_seconds": 12})
+    task = asyncio.create_task(
+        manager.run(SessionFactory(fake_db(db_config), failures=2), retry_seconds=0.01)
+    )
+    await asyncio.sleep(0.1)
+    task.cancel()
+
+    assert manager.loaded
+    assert manager.snapshot["registration_timeout_seconds"] == 12
+    assert [config["registration_timeout_seconds"] for config in applied] == [12]
@@ -0,0 +1,156 @@
+import asyncio
+import json
+
+import pytest
+
+from managers.connection_manager import ConnectionManager
+
+
+class FakeWebSocket:
+    def __init__(self, delay=0.0, fail=False):
+        self.delay = delay
+        self.fail = fail
+        self.sent = []
+        self.closed = False
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, text):
+        if self.fail:
+            raise RuntimeError("connection lost")
+        await asyncio.sleep(self.delay)
+        self.sent.append(json.loads(text))
+
+    async def close(self):
+        self.closed = True
+
+
+class FakeDeviceManager:
+    def get_all_devices_status(self):
+        return {"devices": {}}
+
+
+async def connected(manager, *websockets):
+    for ws in websockets:
+        await manager.connect(ws)
+
+
+@pytest.mark.asyncio
+async def test_broadcast_does_not_wait_for_slow_clients_and_evicts_them():
+    manager = ConnectionManager(FakeDeviceManager(), send_timeout=0.05)
+    fast, stalled, dead = FakeWebSocket(), FakeWebSocket(delay=10), FakeWebSocket(fail=True)
+    await connected(manager, fast, stalled, dead)
+
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    await manager.broadcast_to_all("ping", {"n": 1})
+    assert loop.time() - started < 0.01
+
+    await asyncio.sleep(0.2)
+
+    assert fast.sent == [{"type": "ping", "data": {"n": 1}}]
+    assert set(manager.connections) == {fast}
+    assert stalled.closed and dead.closed
+
+    await manager.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_full_queue_evicts_connection():
+    manager = ConnectionManager(FakeDeviceManager(), queue_size=2, send_timeout=5)
+    slow = FakeWebSocket(delay=1)
+    await connected(manager, slow)
+
+    for n in range(5):
+        await manager.broadcast_to_all("ping", {"n": n})
+
+    assert slow not in manager.connections
+    await manager.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_subscription_index_follows_subscribe_and_disconnect():
+    manager = ConnectionManager(FakeDeviceManager())
+    first, second = FakeWebSocket(), FakeWebSocket()
+    await connected(manager, first, second)
+
+    manager.subscribe(first, "esp-1")
+    manager.subscribe(second, "esp-1")
+    manager.subscribe(second, "esp-2")
+
+    assert manager.subscribers("esp-1") == {first}
+    assert manager.subscribers("esp-2") == {second}
+
+    await manager.broadcast_device_data("esp-1", {"type": "esp32_data"})
+    await asyncio.sleep(0.01)
+    assert first.sent == [{"type": "esp32_data"}] and second.sent == []
+
+    manager.unsubscribe(second)
+    manager.disconnect(first)
+    assert not manager.has_subscribers("esp-1")
+    assert not manager.has_subscribers("esp-2")
+
+    await manager.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_device_list_changes_are_coalesced_into_one_delta():
+    from managers.device_manager import DeviceManager
+
+    devices = DeviceManager()
+    manager = ConnectionManager(devices, device_list_debounce=0.05)
+    ws = FakeWebSocket()
+    await connected(manager, ws)
+
+    await manager.send_device_list(ws)
+    for n in range(5):
+        devices.update_device_data("esp-1", {"n": n})
+        devices.update_device_data("esp-2", {"n": n})
+        await manager.broadcast_device_list()
+
+    await asyncio.sleep(0.15)
+
+    snapshot, delta = ws.sent
+    assert snapshot["type"] == "device_list" and snapshot["version"] == 0
+    assert delta["type"] == "device_list_delta"
+    assert (delta["base_version"], delta["version"]) == (0, 1)
+    assert set(delta["data"]["changed"]) == {"esp-1", "esp-2"}
+    assert "latest_data" not in delta["data"]["changed"]["esp-1"]
+
+    # без змін - без повідомлень
+    await manager.broadcast_device_list()
+    await asyncio.sleep(0.1)
+    assert len(ws.sent) == 2
+
+    await manager.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_dashboard_watchers_get_counters_without_device_list():
+    from managers.device_manager import DeviceManager
+
+    devices = DeviceManager()
+    manager = ConnectionManager(devices, device_list_debounce=0.01)
+    monitor, dashboard = FakeWebSocket(), FakeWebSocket()
+    await connected(manager, monitor, dashboard)
+    manager.watch_dashboard(dashboard)
+
+    devices.update_device_data("esp-1", {"n": 1})
+    await manager.broadcast_device_list()
+    manager.broadcast_dashboard({"devices": {"available": 1}})
+    await asyncio.sleep(0.05)
+
+    assert [m["type"] for m in monitor.sent] == ["device_list_delta"]
+    assert [m["type"] for m in dashboard.sent] == ["dashboard_stats"]
+
+    await manager.shutdown()
+
+
+def test_only_managers_and_admins_watch_dashboard():
+    from routers.websocket import can_watch_dashboard
+
+    assert can_watch_dashboard({"id": 1, "role": "admin"})
+    assert can_watch_dashboard({"id": 2, "role": "manager"})
+    assert not can_watch_dashboard({"id": 3, "role": "worker"})
+    assert not can_watch_dashboard(None)
@@ -0,0 +1,139 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from managers.dashboard_stats import DashboardStats
+from managers.rfid_index import RfidIndex
+from models.db_device import DeviceType
+
+
+def employee(id, department):
+    return SimpleNamespace(
+        id=id, rfid=f"EMP{id}", first_name="Jan", last_name="Kowalski",
+        wms_login=f"login{id}", department=department
+    )
+
+
+def device(id, type, employee_id=None, enabled=True):
+    return SimpleNamespace(
+        id=id, rfid=f"DEV{id}", name=f"Device {id}", type=type,
+        employee_id=employee_id, enabled=enabled
+    )
+
+
+def departments(stats):
+    return {row["department"]: row for row in stats.snapshot()["departments"]}
+
+
+def make_stats():
+    index = RfidIndex()
+    stats = DashboardStats(index, debounce_seconds=0.01)
+    index.add_listener(stats.on_index_change)
+    # холодний старт без БД: порожній індекс
+    index.loaded = True
+    index._notify("loaded")
+    return index, stats
+
+
+def test_counters_follow_index_changes():
+    index, stats = make_stats()
+
+    index.put_employee(employee(1, "WMS"))
+    index.put_employee(employee(2, "WMS"))
+    index.put_device(device(10, DeviceType.scanner, employee_id=1))
+    index.put_device(device(11, DeviceType.printer, employee_id=1))
+    index.put_device(device(12, DeviceType.scanner, employee_id=2))
+    index.put_device(device(13, DeviceType.scanner, enabled=False))
+
+    snapshot = stats.snapshot()
+    assert snapshot["devices"]["by_type"] == {"scanner": 2, "printer": 1}
+    assert snapshot["devices"]["disabled_by_type"] == {"scanner": 1, "printer": 0}
+    assert departments(stats)["WMS"] == {
+        "department": "WMS", "employees": 2, "devices": 3, "scanners": 2, "printers": 1
+    }
+
+    # повернення пристрою і переведення працівника в інший відділ
+    index.set_device_owner(12, None)
+    index.put_employee(employee(1, None))
+    rows = departments(stats)
+    assert "WMS" not in rows
+    assert rows["Brak"]["employees"] == 1
+    assert rows["Brak"]["devices"] == 2
+
+    # вимкнення і видалення
+    index.put_device(device(11, DeviceType.printer, employee_id=1, enabled=False))
+    index.remove_device(10)
+    snapshot = stats.snapshot()
+    assert snapshot["devices"]["available"] == 1
+    assert snapshot["devices"]["disabled"] == 2
+    assert snapshot["departments"] == []
+
+
+@pytest.mark.asyncio
+async def test_changes_are_pushed_once_per_window():
+    index, stats = make_stats()
+    pushed = []
+    stats.add_listener(pushed.append)
+
+    for device_id in range(5):
+        index.put_device(device(device_id, DeviceType.scanner))
+    await asyncio.sleep(0.05)
+
+    assert len(pushed) == 1
+    assert pushed[0]["devices"]["available"] == 5
+
+
+@pytest.mark.asyncio
+async def test_other_workers_reload_counters_after_change(monkeypatch):
+    from managers.state_backend import InMemoryStateBackend, SharedState
+
+    backend = InMemoryStateBackend()
+    workers = []
+    for _ in range(2):
+        index, stats = make_stats()
+        state = SharedState(backend)
+        index.attach_shared_state(state)
+        stats.attach_shared_state(state)
+        await state.start()
+        workers.append((index, stats, state))
+    (index_a, stats_a, _), (index_b, stats_b, _) = workers
+
+    published = []
+    for _, _, state in workers:
+        original = state.publish
+        state.publish = lambda topic, op, _original=original, **data: (
+            published.append((topic, op)), _original(topic, op, **data)
+        )
+
+    reloads = []
+
+    async def load(db):
+        reloads.append(db)
+        stats_b._rebuild([(10, ("scanner", True, None, None))])
+
+    monkeypatch.setattr(stats_b, "load", load)
+
+    class FakeSessionFactory:
+        async def __aenter__(self):
+            return "db"
+
+        async def __aexit__(self, *exc):
+            return False
+
+    monkeypatch.setattr("db.session.async_session", FakeSessionFactory)
+
+    pushed = []
+    stats_b.add_listener(pushed.append)
+
+    for device_id in range(3):
+        index_a.put_device(device(device_id, DeviceType.scanner))
+    await asyncio.sleep(0.1)
+
+    # B перечитав лічильники один раз і не переслав зміну далі
+    assert reloads == ["db"]
+    assert pushed[-1]["devices"]["available"] == 1
+    assert published.count(("dashboard", "changed")) == 1
+
+    for _, _, state in workers:
+        await state.close()
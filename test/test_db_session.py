@@ -0,0 +1,37 @@
+import pytest
+
+from db.session import PoolStats, engine, engine_profile
+
+
+def test_default_profile_does_not_echo_sql():
+    assert engine.echo is False
+    assert engine.pool.size() == engine_profile()["pool_size"]
+
+
+def test_profile_env_overrides(monkeypatch):
+    monkeypatch.setenv("DB_ECHO", "true")
+    monkeypatch.setenv("DB_POOL_SIZE", "25")
+    monkeypatch.setenv("DB_STATEMENT_CACHE_SIZE", "0")
+
+    profile = engine_profile("default")
+    assert profile["echo"] is True
+    assert profile["pool_size"] == 25
+    assert profile["statement_cache_size"] == 0
+
+    with pytest.raises(ValueError):
+        engine_profile("missing")
+
+
+def test_pool_stats_track_checkout_waits():
+    stats = PoolStats()
+    stats.record(0.002)
+    stats.record(0.2)
+    stats.record(30, timed_out=True)
+
+    assert stats.as_dict() == {
+        "checkouts": 2,
+        "timeouts": 1,
+        "avg_wait_ms": 101.0,
+        "max_wait_ms": 200.0,
+        "slow_checkouts": 1,
+    }
@@ -0,0 +1,21 @@
+import json
+
+from managers.device_manager import DeviceManager
+
+
+def test_device_list_json_matches_snapshot_and_tracks_changes():
+    devices = DeviceManager()
+    for n in range(3):
+        devices.update_device_data(f"esp-{n}", {"rfid": f"R{n}"})
+
+    assert json.loads(devices.get_device_list_json()) == devices.get_device_list_snapshot()
+
+    # фрагмент кешується і скидається лише при зміні пристрою
+    device = devices.get_device("esp-1")
+    cached = device.entry_json()
+    assert device.entry_json() is cached
+
+    device.mark_offline()
+    assert device.entry_json() is not cached
+    assert json.loads(devices.get_device_list_json()) == devices.get_device_list_snapshot()
+    assert devices.get_device_list_snapshot()["online_devices"] == 2
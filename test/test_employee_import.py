@@ -0,0 +1,55 @@
+from services.employee_import import classify_employee_chunk, validate_employee_rows
+
+
+def employee(id, rfid, wms_login, **fields):
+    return {
+        "id": id,
+        "rfid": rfid,
+        "wms_login": wms_login,
+        "first_name": fields.get("first_name", "Jan"),
+        "last_name": fields.get("last_name", "Kowalski"),
+        "company": fields.get("company", "Agencja"),
+        "department": fields.get("department", ""),
+    }
+
+
+def test_validate_rows_rejects_missing_fields_and_duplicates():
+    valid, errors = validate_employee_rows([
+        {"first_name": " Jan ", "last_name": "Kowalski", "company": "A", "rfid": "R1", "wms_login": ""},
+        {"first_name": "Anna", "last_name": "Nowak", "company": "A", "rfid": ""},
+        {"first_name": "Ewa", "last_name": "Lis", "company": "A", "rfid": "R1"},
+        {"first_name": "Olga", "last_name": "Wolf", "company": "A", "rfid": "R3", "wms_login": "ow"},
+        {"first_name": "Piotr", "last_name": "Wolf", "company": "A", "rfid": "R4", "wms_login": "ow"},
+    ])
+
+    assert [row["row"] for row in valid] == [1, 4]
+    assert valid[0]["first_name"] == "Jan"
+    assert valid[0]["wms_login"] is None
+    assert [(error["row"], error["status"]) for error in errors] == [
+        (2, "error"), (3, "error"), (5, "error"),
+    ]
+
+
+def test_classify_chunk_against_existing_employees():
+    valid, _ = validate_employee_rows([
+        {"first_name": "Jan", "last_name": "Kowalski", "company": "Agencja", "rfid": "R1", "wms_login": "jk"},
+        {"first_name": "Jan", "last_name": "Nowy", "company": "Agencja", "rfid": "R2", "wms_login": "jn"},
+        {"first_name": "Ola", "last_name": "Nowa", "company": "Agencja", "rfid": "R3", "wms_login": "taken"},
+        {"first_name": "Ida", "last_name": "Ryba", "company": "Agencja", "rfid": "R4"},
+    ])
+
+    existing = [
+        employee(1, "R1", "jk"),
+        employee(2, "R2", "jn", last_name="Stary"),
+        employee(3, "R9", "taken"),
+    ]
+
+    to_write, results = classify_employee_chunk(valid, existing)
+
+    assert [(row["rfid"], row["action"]) for row in to_write] == [("R2", "updated"), ("R4", "created")]
+    assert [(result["rfid"], result["status"]) for result in results] == [
+        ("R1", "unchanged"), ("R3", "error"),
+    ]
+
+    to_write, results = classify_employee_chunk(valid, existing, update_existing=False)
+    assert [row["rfid"] for row in to_write] == ["R4"]
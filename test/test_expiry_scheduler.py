@@ -0,0 +1,58 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from managers.device_manager import DeviceManager
+from managers.expiry_scheduler import ExpiryScheduler
+from managers.registration_manager import RegistrationManager
+
+
+@pytest.mark.asyncio
+async def test_deadlines_fire_in_order_and_reschedule_replaces_old_one():
+    scheduler = ExpiryScheduler()
+    fired = []
+    scheduler.register("t", fired.append)
+    task = asyncio.create_task(scheduler.run())
+
+    scheduler.schedule("t", "late", 0.08)
+    scheduler.schedule("t", "early", 0.02)
+    scheduler.schedule("t", "moved", 0.01)
+    scheduler.schedule("t", "moved", 0.05)
+    scheduler.schedule("t", "cancelled", 0.01)
+    scheduler.cancel("t", "cancelled")
+
+    await asyncio.sleep(0.15)
+    task.cancel()
+
+    assert fired == ["early", "moved", "late"]
+    assert len(scheduler) == 0
+
+
+@pytest.mark.asyncio
+async def test_managers_expire_on_their_deadline():
+    scheduler = ExpiryScheduler()
+    registration = RegistrationManager(timeout_seconds=1)
+    devices = DeviceManager(timeout_minutes=1)
+    registration.attach_scheduler(scheduler)
+    devices.attach_scheduler(scheduler)
+
+    expired = []
+    scheduler.register("registration", expired.append)
+    task = asyncio.create_task(scheduler.run())
+
+    registration.start_or_replace("esp-1", SimpleNamespace(
+        id=1, rfid="EMP", first_name="Jan", last_name="Kowalski",
+        wms_login="jkowalski", department=None
+    ))
+    registration.update_timeout(0)
+    devices.update_device_data("esp-1", {})
+    devices.update_timeout(0)
+
+    await asyncio.sleep(0.05)
+    task.cancel()
+
+    assert expired == ["esp-1"]
+    assert "esp-1" not in registration.sessions
+    assert "esp-1" not in devices.devices
+    assert devices.pop_changes()["data"]["removed"] == ["esp-1"]
@@ -0,0 +1,96 @@
+import threading
+from datetime import datetime, timezone
+
+import pytest
+
+from models.db_transaction import TransactionType
+from services import history_export
+from services.history_export import _format_value, csv_chunks, xlsx_chunks
+
+
+async def rows_of(rows):
+    for row in rows:
+        yield tuple(_format_value(value) for value in row)
+
+
+@pytest.mark.asyncio
+async def test_csv_export_is_chunked(monkeypatch):
+    monkeypatch.setattr(history_export, "EXPORT_CHUNK_SIZE", 64)
+
+    timestamp = datetime(2026, 3, 1, 8, 30, tzinfo=timezone.utc)
+    rows = [(i, timestamp, TransactionType.registered, None, "Łukasz") for i in range(10)]
+
+    chunks = [chunk async for chunk in csv_chunks(["ID", "Data", "Typ", "Login", "Imię"], rows_of(rows))]
+
+    assert len(chunks) > 1
+    lines = b"".join(chunks).decode("utf-8").splitlines()
+    assert lines[0] == "\ufeffID,Data,Typ,Login,Imię"
+    assert lines[1] == "0,2026-03-01 08:30:00+00:00,registered,,Łukasz"
+    assert len(lines) == 11
+
+
+class FakeWorkbook:
+    """write_only Workbook openpyxl: журнал потоків append/save"""
+
+    def __init__(self):
+        self.rows = []
+        self.threads = set()
+
+    def create_sheet(self, title):
+        return self
+
+    def append(self, row):
+        self.threads.add(threading.get_ident())
+        self.rows.append(row)
+
+    def save(self, path):
+        self.threads.add(threading.get_ident())
+        with open(path, "wb") as file:
+            file.write(b"x" * 100)
+
+
+@pytest.mark.asyncio
+async def test_xlsx_is_built_off_the_event_loop(monkeypatch):
+    monkeypatch.setattr(history_export, "EXPORT_YIELD_PER", 3)
+    monkeypatch.setattr(history_export, "EXPORT_CHUNK_SIZE", 64)
+
+    workbook = FakeWorkbook()
+    rows = [(i, "Łukasz") for i in range(7)]
+
+    chunks = [
+        chunk async for chunk in xlsx_chunks(["ID", "Imię"], rows_of(rows), "historia", workbook=workbook)
+    ]
+
+    assert b"".join(chunks) == b"x" * 100
+    assert workbook.rows == [["ID", "Imię"]] + rows
+    assert threading.get_ident() not in workbook.threads
+
+
+@pytest.mark.asyncio
+async def test_xlsx_export_is_a_readable_workbook(monkeypatch):
+    import io
+
+    from openpyxl import load_workbook
+
+    monkeypatch.setattr(history_export, "EXPORT_YIELD_PER", 3)
+    monkeypatch.setattr(history_export, "EXPORT_CHUNK_SIZE", 1024)
+
+    timestamp = datetime(2026, 3, 1, 8, 30, tzinfo=timezone.utc)
+    rows = [(i, timestamp, TransactionType.registered, None, "Łukasz") for i in range(5)]
+    monkeypatch.setattr(history_export, "stream_rows", lambda stmt: rows_of(rows))
+
+    response = history_export.export_response(
+        None, ["ID", "Data", "Typ", "Login", "Imię"], "xlsx", "historia"
+    )
+    assert response.headers["content-disposition"] == 'attachment; filename="historia.xlsx"'
+
+    chunks = [chunk async for chunk in response.body_iterator]
+    assert len(chunks) > 1
+
+    workbook = load_workbook(io.BytesIO(b"".join(chunks)), read_only=True)
+    values = list(workbook["historia"].iter_rows(values_only=True))
+    workbook.close()
+
+    assert values[0] == ("ID", "Data", "Typ", "Login", "Imię")
+    assert values[1][2:] == ("registered", None, "Łukasz")
+    assert len(values) == 6
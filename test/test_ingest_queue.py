@@ -0,0 +1,85 @@
+import asyncio
+
+import pytest
+from httpx import AsyncClient, ASGITransport
+
+from managers.ingest_queue import IngestQueue, IngestQueueFull
+
+
+@pytest.mark.asyncio
+async def test_scans_of_one_reader_are_processed_in_order():
+    processed = []
+
+    async def handler(device_id, data):
+        # перший скан "повільний" - наступні все одно чекають на нього
+        await asyncio.sleep(0.02 if data["n"] == 0 else 0)
+        processed.append((device_id, data["n"]))
+
+    ingest = IngestQueue(handler, queue_size=10, idle_seconds=0.05)
+    ingest.start()
+
+    for n in range(5):
+        ingest.submit("esp-1", {"n": n})
+        ingest.submit("esp-2", {"n": n})
+    assert ingest.depth() > 0
+
+    await ingest.shutdown()
+
+    assert [n for device_id, n in processed if device_id == "esp-1"] == list(range(5))
+    assert [n for device_id, n in processed if device_id == "esp-2"] == list(range(5))
+    assert ingest.stats()["processed"] == 10
+
+
+@pytest.mark.asyncio
+async def test_full_queue_is_rejected_and_idle_worker_stops():
+    release = asyncio.Event()
+
+    async def handler(device_id, data):
+        await release.wait()
+
+    ingest = IngestQueue(handler, queue_size=2, idle_seconds=0.01)
+    ingest.submit("esp-1", {})
+    await asyncio.sleep(0.01)  # воркер забрав перший скан
+
+    ingest.submit("esp-1", {})
+    ingest.submit("esp-1", {})
+    with pytest.raises(IngestQueueFull):
+        ingest.submit("esp-1", {})
+    assert ingest.stats()["rejected"] == 1
+
+    release.set()
+    await asyncio.sleep(0.05)
+
+    assert ingest.stats()["readers"] == 0
+    assert ingest.depth() == 0
+
+
+@pytest.mark.asyncio
+async def test_endpoint_answers_before_processing():
+    import app.main as mainmod
+
+    release = asyncio.Event()
+    processed = []
+
+    async def handler(device_id, data):
+        await release.wait()
+        processed.append(data)
+
+    original = mainmod.esp_ingest
+    mainmod.esp_ingest = IngestQueue(handler)
+    mainmod.esp_ingest.start()
+    try:
+        async with AsyncClient(transport=ASGITransport(app=mainmod.app), base_url="http://test") as ac:
+            resp = await ac.post("/api/data/esp-1", json={"rfid": "EMP"})
+            assert resp.status_code == 200
+            assert resp.json() == {"status": "queued"}
+            assert processed == []
+
+            resp = await ac.post("/api/data/esp-1", json={"rfid": 123})
+            assert resp.status_code == 422
+
+        release.set()
+        await mainmod.esp_ingest.shutdown()
+        assert processed == [{"rfid": "EMP"}]
+    finally:
+        mainmod.esp_ingest = original
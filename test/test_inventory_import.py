@@ -0,0 +1,102 @@
+from models.db_device import DeviceType, SiteType
+from services.inventory_import import parse_sheets, plan_inventory_import
+
+
+HEADER = ["", "S/N", "RFID", "Nazwa", "IP", "STATUS", "SITE", "PORTS"]
+
+
+def sheet(*rows):
+    return [["Inwentaryzacja"], [], HEADER, *rows]
+
+
+def existing(serial_number, name, rfid, **fields):
+    return {
+        "serial_number": serial_number,
+        "name": name,
+        "rfid": rfid,
+        "type": fields.get("type", DeviceType.scanner),
+        "site": fields.get("site", SiteType.EMAG),
+        "ip": fields.get("ip"),
+        "status": fields.get("status"),
+    }
+
+
+def test_parse_maps_columns_and_sheet_type():
+    rows, errors = parse_sheets([
+        ("SCANER", sheet(["1", "SN-1", "R-1", "s1", "", "OK", "EMAG", "P1\nP2"])),
+        ("PRINTER", sheet(["1", "SN-2", "R-2", "p1", "10.0.0.2", "", "XD", ""])),
+    ])
+
+    assert errors == []
+    assert [(r.serial_number, r.name, r.type) for r in rows] == [
+        ("SN-1", "S1", DeviceType.scanner),
+        ("SN-2", "P1", DeviceType.printer),
+    ]
+    assert rows[0].ports == ["P1", "P2"]
+    assert rows[0].row_number == 4
+    assert rows[1].ip == "10.0.0.2" and rows[1].status is None
+
+
+def test_plan_reports_diff_and_conflicts():
+    rows, errors = parse_sheets([
+        ("SCANER", sheet(
+            ["", "SN-1", "R-1", "S1", "", "OK", "EMAG", ""],      # bez zmian
+            ["", "SN-2", "R-2", "S2-NEW", "", "NOWY", "XD", "P9"],  # zmiana
+            ["", "SN-3", "R-3", "S3", "", "", "EMAG", ""],         # nowy
+            ["", "SN-4", "R-1", "S4", "", "", "EMAG", ""],         # RFID SN-1
+            ["", "SN-3", "R-5", "S5", "", "", "EMAG", ""],         # dubel S/N
+            ["", "SN-6", "R-6", "S6", "", "", "MARS", ""],         # zły site
+        )),
+    ])
+
+    plan = plan_inventory_import(
+        rows,
+        existing_devices=[
+            existing("SN-1", "S1", "R-1", status="OK"),
+            existing("SN-2", "S2", "R-2", status="OK"),
+        ],
+        existing_ports={"P9": "SN-1"},
+        existing_statuses={"OK"},
+        errors=errors,
+    )
+
+    assert plan.unchanged == 1
+    assert [row.serial_number for row in plan.create] == ["SN-3"]
+    assert [row.serial_number for row, _ in plan.update] == ["SN-2"]
+    assert set(plan.update[0][1]) == {"name", "site", "status"}
+    assert plan.new_statuses == ["NOWY"]
+    assert plan.ports == {"P9": "SN-2"}
+    assert plan.moved_ports == [{"port_number": "P9", "from": "SN-1", "to": "SN-2"}]
+    assert sorted(error["row"] for error in plan.errors) == [7, 8, 9]
+
+    report = plan.report(dry_run=True)
+    assert report["summary"]["errors"] == 3
+
+
+def test_xlsx_workbook_is_read_sheet_by_sheet():
+    import io
+
+    from openpyxl import Workbook
+
+    from services.inventory_import import read_xlsx_sheets
+
+    workbook = Workbook()
+    scanners = workbook.active
+    scanners.title = "SCANER"
+    for row in sheet(["1", "SN-1", "R-1", "s1", "", "OK", "EMAG", "P1"]):
+        scanners.append(row)
+    printers = workbook.create_sheet("PRINTER")
+    for row in sheet(["1", "SN-2", "R-2", "p1", "10.0.0.2", "", "XD", ""]):
+        printers.append(row)
+
+    content = io.BytesIO()
+    workbook.save(content)
+
+    rows, errors = parse_sheets(read_xlsx_sheets(content.getvalue()))
+
+    assert errors == []
+    assert [(r.serial_number, r.name, r.type) for r in rows] == [
+        ("SN-1", "S1", DeviceType.scanner),
+        ("SN-2", "P1", DeviceType.printer),
+    ]
+    assert rows[0].ports == ["P1"]
@@ -0,0 +1,84 @@
+from datetime import datetime, timezone
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, Mock
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import select
+from sqlalchemy.dialects import postgresql
+
+from models.db_transaction import TransactionDB
+from services.pagination import count_cache, decode_cursor, encode_cursor, paginate_keyset
+
+
+def make_result(items=None, scalar=None):
+    result = Mock()
+    result.scalars = Mock(return_value=Mock(all=Mock(return_value=items or [])))
+    result.scalar_one = Mock(return_value=scalar)
+    return result
+
+
+def test_cursor_roundtrip_and_invalid_cursor():
+    key = (TransactionDB.timestamp, TransactionDB.id)
+    timestamp = datetime(2026, 1, 2, 3, 4, 5, tzinfo=timezone.utc)
+    assert decode_cursor(encode_cursor([timestamp, 42]), key) == (timestamp, 42)
+
+    with pytest.raises(HTTPException):
+        decode_cursor("nie-kursor", key)
+    # курсор іншого порядку
+    with pytest.raises(HTTPException):
+        decode_cursor(encode_cursor([42]), key)
+
+
+@pytest.mark.asyncio
+async def test_keyset_page_uses_cursor_and_cached_total():
+    count_cache.invalidate()
+    timestamp = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    rows = [SimpleNamespace(id=i, timestamp=timestamp) for i in (5, 4, 3)]
+
+    db = Mock()
+    db.execute = AsyncMock(side_effect=[make_result(scalar=25), make_result(rows)])
+
+    key = (TransactionDB.timestamp, TransactionDB.id)
+    page = await paginate_keyset(
+        db, select(TransactionDB), key,
+        count_key=("test",), page_size=2, cursor=encode_cursor([timestamp, 6]),
+    )
+
+    assert [item.id for item in page["items"]] == [5, 4]
+    assert page["total"] == 25 and page["pages"] == 13 and page["page"] is None
+    assert decode_cursor(page["next_cursor"], key) == (timestamp, 4)
+
+    sql = str(db.execute.await_args_list[1].args[0].compile(dialect=postgresql.dialect()))
+    assert "(transactions.timestamp, transactions.id) < (" in sql
+    assert "OFFSET" not in sql
+
+    # total для тих самих фільтрів береться з кешу
+    db.execute = AsyncMock(return_value=make_result(rows[:1]))
+    page = await paginate_keyset(
+        db, select(TransactionDB), key,
+        count_key=("test",), page_size=2, page=2,
+    )
+    assert page["total"] == 25 and page["next_cursor"] is None
+    db.execute.assert_awaited_once()
+    count_cache.invalidate()
+
+
+@pytest.mark.asyncio
+async def test_keyset_follows_given_key_columns():
+    from models.db_employee import EmployeeDB
+
+    rows = [SimpleNamespace(id=i, last_name=name) for i, name in ((7, "Nowak"), (3, "Kowalski"))]
+    db = Mock()
+    db.execute = AsyncMock(return_value=make_result(rows))
+
+    key = (EmployeeDB.last_name, EmployeeDB.id)
+    page = await paginate_keyset(
+        db, select(EmployeeDB), key, count_key=("employees",), page_size=1,
+        cursor=encode_cursor(["Zieliński", 9]), with_total=False,
+    )
+
+    assert decode_cursor(page["next_cursor"], key) == ("Nowak", 7)
+    sql = str(db.execute.await_args.args[0].compile(dialect=postgresql.dialect()))
+    assert "(employees.last_name, employees.id) < (" in sql
+    assert "ORDER BY employees.last_name DESC, employees.id DESC" in sql
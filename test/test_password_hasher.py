@@ -0,0 +1,47 @@
+import asyncio
+
+import pytest
+from passlib.context import CryptContext
+
+from managers.auth_manager import PasswordHasher, PasswordHasherBusy
+
+
+@pytest.mark.asyncio
+async def test_verify_upgrades_hash_when_rounds_change():
+    old = CryptContext(schemes=["pbkdf2_sha256"], pbkdf2_sha256__rounds=1000)
+    new = CryptContext(schemes=["pbkdf2_sha256"], pbkdf2_sha256__rounds=2000)
+    hasher = PasswordHasher(new, max_workers=1, max_pending=2, wait_seconds=1)
+
+    verified, new_hash = await hasher.verify_and_update("secret", old.hash("secret"))
+    assert verified and new.verify("secret", new_hash)
+
+    assert await hasher.verify_and_update("wrong", new_hash) == (False, None)
+    hasher.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_full_pool_rejects_instead_of_queueing_forever():
+    context = CryptContext(schemes=["pbkdf2_sha256"], pbkdf2_sha256__rounds=1000)
+    hasher = PasswordHasher(context, max_workers=1, max_pending=1, wait_seconds=0.01)
+
+    await hasher._slots.acquire()
+    with pytest.raises(PasswordHasherBusy):
+        await hasher.hash("secret")
+    hasher._slots.release()
+
+    assert context.verify("secret", await hasher.hash("secret"))
+    assert hasher.stats()["rejected"] == 1
+    hasher.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_bcrypt_hash_is_not_migrated_to_default_scheme():
+    context = CryptContext(
+        schemes=["pbkdf2_sha256", "bcrypt"], deprecated="auto",
+        pbkdf2_sha256__rounds=1000, bcrypt__rounds=4
+    )
+    hasher = PasswordHasher(context, max_workers=1, max_pending=2, wait_seconds=1)
+
+    bcrypt_hash = context.handler("bcrypt").using(rounds=4).hash("secret")
+    assert await hasher.verify_and_update("secret", bcrypt_hash) == (True, None)
+    hasher.shutdown()
@@ -0,0 +1,100 @@
+import asyncio
+import json
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from unittest.mock import Mock
+
+import pytest
+from fastapi import WebSocketDisconnect
+
+from managers.config_manager import config_manager
+from managers.connection_manager import ConnectionManager
+from managers.device_manager import DeviceManager
+from managers.rfid_index import rfid_index
+from routers.websocket import reader_endpoint
+
+
+class FakeReaderSocket:
+    """Зчитувач: incoming - що шле ESP, sent - що отримав від сервера"""
+
+    def __init__(self):
+        self.incoming = asyncio.Queue()
+        self.sent = asyncio.Queue()
+        self.closed = False
+
+    async def accept(self):
+        pass
+
+    async def receive_text(self):
+        message = await self.incoming.get()
+        if message is None:
+            raise WebSocketDisconnect()
+        return json.dumps(message)
+
+    async def send_text(self, text):
+        await self.sent.put(json.loads(text))
+
+    async def close(self, code=1000):
+        self.closed = True
+
+    async def exchange(self, message):
+        await self.incoming.put(message)
+        return await asyncio.wait_for(self.sent.get(), timeout=1)
+
+
+@pytest.fixture
+def registration():
+    import app.main as mainmod
+
+    original_reg = mainmod.registration_manager
+    registration = Mock()
+    registration.get = Mock(return_value=None)
+    registration.timeout = timedelta(seconds=7)
+    mainmod.registration_manager = registration
+
+    config = config_manager._get_default_config_dict()
+    config["allow_registration_without_login"] = True
+    config_manager._cache = config
+    config_manager._cache_time = datetime.utcnow()
+
+    rfid_index.put_employee(SimpleNamespace(
+        id=1, rfid="EMP-RFID", first_name="Jan", last_name="Kowalski",
+        wms_login="jkowalski", department="WMS"
+    ))
+
+    yield registration
+
+    mainmod.registration_manager = original_reg
+    config_manager.invalidate_cache()
+    rfid_index.clear()
+
+
+@pytest.mark.asyncio
+async def test_reader_streams_scans_and_gets_feedback(registration):
+    devices = DeviceManager()
+    manager = ConnectionManager(devices, device_list_debounce=0.01)
+    reader = FakeReaderSocket()
+
+    endpoint = asyncio.create_task(reader_endpoint(reader, "esp-1", manager, devices))
+
+    assert (await asyncio.wait_for(reader.sent.get(), timeout=1))["type"] == "hello"
+    assert devices.get_device("esp-1").is_online
+
+    assert await reader.exchange({"type": "heartbeat"}) == {"type": "pong"}
+
+    feedback = await reader.exchange({"type": "scan", "id": "s1", "data": {"rfid": "EMP-RFID"}})
+    assert feedback["id"] == "s1"
+    assert feedback["status"] == "success"
+    assert feedback["led"] == "green"
+    registration.start_or_replace.assert_called_once()
+
+    feedback = await reader.exchange({"type": "scan", "id": "s2", "data": {"rfid": 1}})
+    assert feedback["status"] == "error"
+
+    # з'єднання закрите - пристрій офлайн без очікування таймауту
+    await reader.incoming.put(None)
+    await asyncio.wait_for(endpoint, timeout=1)
+    assert devices.get_device("esp-1") is None
+    assert "esp-1" not in manager.readers
+
+    await manager.shutdown()
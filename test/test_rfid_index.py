@@ -0,0 +1,97 @@
+import asyncio
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, Mock
+
+import pytest
+
+from managers.rfid_index import RfidIndex
+
+
+def empty_db():
+    result = Mock()
+    result.scalar_one_or_none.return_value = None
+    db = Mock()
+    db.execute = AsyncMock(return_value=result)
+    return db
+
+
+@pytest.mark.asyncio
+async def test_unknown_rfid_is_cached_until_card_appears():
+    index = RfidIndex()
+    db = empty_db()
+
+    assert await index.resolve_or_fetch(db, "UNKNOWN") is None
+    assert db.execute.await_count == 3
+
+    # повторні прикладання - без запитів до БД
+    assert await index.resolve_or_fetch(db, "UNKNOWN") is None
+    assert db.execute.await_count == 3
+
+    index.put_employee(SimpleNamespace(
+        id=1, rfid="UNKNOWN", first_name="Jan", last_name="Kowalski",
+        wms_login="jkowalski", department=None
+    ))
+    entry = await index.resolve_or_fetch(db, "UNKNOWN")
+    assert entry.kind == "employee"
+
+    index.remove_employee(1)
+    assert await index.resolve_or_fetch(db, "UNKNOWN") is None
+    assert db.execute.await_count == 6
+
+
+@pytest.mark.asyncio
+async def test_miss_cache_is_bounded_and_expires():
+    index = RfidIndex(miss_cache_size=2, miss_cache_seconds=0)
+    db = empty_db()
+
+    for rfid in ("A", "B", "C"):
+        await index.resolve_or_fetch(db, rfid)
+    assert list(index._misses) == ["B", "C"]
+
+    # TTL 0 - промах одразу застарілий, знову запит до БД
+    await index.resolve_or_fetch(db, "C")
+    assert db.execute.await_count == 12
+
+
+@pytest.mark.asyncio
+async def test_index_changes_reach_other_workers():
+    from managers.state_backend import InMemoryStateBackend, SharedState
+    from models.db_device import DeviceType
+
+    backend = InMemoryStateBackend()
+    a, b = RfidIndex(), RfidIndex()
+    states = [SharedState(backend), SharedState(backend)]
+    a.attach_shared_state(states[0])
+    b.attach_shared_state(states[1])
+    for state in states:
+        await state.start()
+
+    # B вже бачив цю картку як невідому
+    await b.resolve_or_fetch(empty_db(), "EMP")
+
+    a.put_employee(SimpleNamespace(
+        id=1, rfid="EMP", first_name="Jan", last_name="Kowalski",
+        wms_login="jkowalski", department=None
+    ))
+    a.put_device(SimpleNamespace(
+        id=10, rfid="DEV", name="S1", type=DeviceType.scanner, employee_id=None, enabled=True
+    ))
+    a.set_device_owner(10, 1)
+    await asyncio.sleep(0.02)
+
+    assert (await b.resolve_or_fetch(empty_db(), "EMP")).wms_login == "jkowalski"
+    assert [device.name for device in b.devices_of(1)] == ["S1"]
+    assert b.get_device(10).type is DeviceType.scanner
+
+    reloads = []
+    b.schedule_reload = lambda: reloads.append(True)
+    a.remove_employee(1)
+    a._replicate("reload")
+    await asyncio.sleep(0.02)
+
+    assert b.resolve("EMP") is None
+    assert b.get_device(10) is None
+    assert reloads == [True]
+
+    for state in states:
+        await state.close()
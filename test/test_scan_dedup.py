@@ -0,0 +1,68 @@
+import asyncio
+
+import pytest
+
+from managers.scan_dedup import ScanDeduplicator
+
+
+def counting_process(result="ok", delay=0):
+    calls = []
+
+    async def process():
+        calls.append(1)
+        await asyncio.sleep(delay)
+        return f"{result}-{len(calls)}"
+
+    return process, calls
+
+
+@pytest.mark.asyncio
+async def test_repeated_scan_is_answered_from_cache():
+    dedup = ScanDeduplicator(window_ms=1000)
+    process, calls = counting_process()
+    duplicates = []
+
+    key = dedup.key("esp-1", "RFID")
+    assert await dedup.run(key, process) == "ok-1"
+    assert await dedup.run(key, process, on_duplicate=lambda: duplicates.append(1)) == "ok-1"
+    assert len(calls) == 1
+    assert duplicates == [1]
+
+    # інший nonce або інший зчитувач - новий скан
+    assert await dedup.run(dedup.key("esp-1", "RFID", "n2"), process) == "ok-2"
+    assert await dedup.run(dedup.key("esp-2", "RFID"), process) == "ok-3"
+    assert dedup.stats()["hits"] == 1
+
+
+@pytest.mark.asyncio
+async def test_concurrent_duplicate_waits_for_first_scan():
+    dedup = ScanDeduplicator(window_ms=1000)
+    process, calls = counting_process(delay=0.02)
+    key = dedup.key("esp-1", "RFID")
+
+    results = await asyncio.gather(dedup.run(key, process), dedup.run(key, process))
+
+    assert results == ["ok-1", "ok-1"]
+    assert len(calls) == 1
+
+
+@pytest.mark.asyncio
+async def test_failed_scan_is_not_cached_and_window_expires():
+    dedup = ScanDeduplicator(window_ms=20)
+    key = dedup.key("esp-1", "RFID")
+
+    async def failing():
+        raise RuntimeError("db down")
+
+    with pytest.raises(RuntimeError):
+        await dedup.run(key, failing)
+
+    process, calls = counting_process()
+    assert await dedup.run(key, process) == "ok-1"
+
+    await asyncio.sleep(0.03)
+    assert await dedup.run(key, process) == "ok-2"
+
+    dedup.update_window(0)
+    assert await dedup.run(key, process) == "ok-3"
+    assert await dedup.run(key, process) == "ok-4"
@@ -0,0 +1,28 @@
+from sqlalchemy import select
+from sqlalchemy.dialects import postgresql
+
+from models.db_device import DeviceDB
+from services.search import escape_like, search_condition
+
+
+def compile_where(condition):
+    return str(select(DeviceDB.id).where(condition).compile(dialect=postgresql.dialect()))
+
+
+def test_escape_like():
+    assert escape_like("50%_a\\b") == "50\\%\\_a\\\\b"
+
+
+def test_search_condition_modes():
+    contains_sql = compile_where(
+        search_condition("SKA", [DeviceDB.name], code_columns=[DeviceDB.rfid])
+    )
+    assert "devices.name ILIKE" in contains_sql
+    assert "devices.rfid ILIKE" in contains_sql
+
+    # короткий запит - префікс; коди через lower() text_pattern_ops
+    prefix_sql = compile_where(
+        search_condition("AB", [DeviceDB.name], code_columns=[DeviceDB.rfid])
+    )
+    assert "devices.name ILIKE" in prefix_sql
+    assert "lower(devices.rfid) LIKE" in prefix_sql
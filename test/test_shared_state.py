@@ -0,0 +1,244 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from managers.connection_manager import ConnectionManager
+from managers.device_manager import DeviceManager
+from managers.esp_access_manager import EspAccessManager
+from managers.registration_manager import RegistrationManager
+from managers.state_backend import InMemoryStateBackend, RedisStateBackend, SharedState
+
+
+class FakeWebSocket:
+    def __init__(self):
+        self.sent = []
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, text):
+        self.sent.append(json.loads(text))
+
+    async def close(self):
+        pass
+
+
+class Worker:
+    """Набір менеджерів одного воркера uvicorn"""
+
+    def __init__(self, backend, **shared_state_options):
+        self.devices = DeviceManager()
+        self.manager = ConnectionManager(self.devices, device_list_debounce=0.01)
+        self.registration = RegistrationManager(timeout_seconds=7)
+        self.esp_access = EspAccessManager()
+        self.shared_state = SharedState(backend, **shared_state_options)
+
+        for state_manager in (self.devices, self.manager, self.registration, self.esp_access):
+            state_manager.attach_shared_state(self.shared_state)
+
+    async def stop(self):
+        await self.manager.shutdown()
+        await self.shared_state.close()
+
+
+async def settle():
+    for _ in range(5):
+        await asyncio.sleep(0.02)
+
+
+async def check_workers_share_state(backend_a, backend_b):
+    a, b = Worker(backend_a), Worker(backend_b)
+    await a.shared_state.start()
+    await b.shared_state.start()
+
+    # браузер слухає ESP на воркері B, ESP шле дані на воркер A
+    browser = FakeWebSocket()
+    await b.manager.connect(browser)
+    b.manager.subscribe(browser, "esp-1")
+    b.esp_access.allow("esp-1", 7)
+    await settle()
+
+    assert a.manager.has_subscribers("esp-1")
+    assert a.esp_access.users("esp-1") == {7}
+
+    a.devices.update_device_data("esp-1", {"rfid": "EMP"})
+    await a.manager.broadcast_device_data("esp-1", {"type": "esp32_data", "device_id": "esp-1"})
+
+    employee = SimpleNamespace(
+        id=1, rfid="EMP", first_name="Jan", last_name="Kowalski",
+        wms_login="jkowalski", department="WMS"
+    )
+    a.registration.start_or_replace("esp-1", employee)
+    await settle()
+
+    assert b.registration.get("esp-1").employee.wms_login == "jkowalski"
+    assert "esp-1" in b.devices.devices
+
+    types = [message["type"] for message in browser.sent]
+    assert "esp32_data" in types
+    assert "device_list_delta" in types
+
+    b.registration.end("esp-1")
+    b.manager.disconnect(browser)
+    await settle()
+
+    assert a.registration.get("esp-1") is None
+    assert not a.manager.has_subscribers("esp-1")
+
+    await a.stop()
+    await b.stop()
+
+
+@pytest.mark.asyncio
+async def test_workers_share_state_in_memory():
+    backend = InMemoryStateBackend()
+    await check_workers_share_state(backend, backend)
+
+
+@pytest.mark.asyncio
+async def test_workers_share_state_over_redis_pubsub():
+    fakeredis = pytest.importorskip("fakeredis")
+    server = fakeredis.FakeServer()
+
+    await check_workers_share_state(
+        RedisStateBackend(client=fakeredis.aioredis.FakeRedis(server=server)),
+        RedisStateBackend(client=fakeredis.aioredis.FakeRedis(server=server)),
+    )
+
+
+@pytest.mark.asyncio
+async def test_new_worker_receives_snapshot_of_existing_state():
+    backend = InMemoryStateBackend()
+    a = Worker(backend)
+    await a.shared_state.start()
+
+    browser = FakeWebSocket()
+    await a.manager.connect(browser)
+    a.manager.subscribe(browser, "esp-1")
+    a.esp_access.allow("esp-1", 7)
+    a.devices.update_device_data("esp-1", {"rfid": "EMP"})
+    a.registration.start_or_replace("esp-1", SimpleNamespace(
+        id=1, rfid="EMP", first_name="Jan", last_name="Kowalski",
+        wms_login="jkowalski", department="WMS"
+    ))
+    await settle()
+
+    # воркер B стартує пізніше - живі повідомлення він пропустив
+    b = Worker(backend)
+    await b.shared_state.start()
+    await settle()
+
+    assert b.manager.has_subscribers("esp-1")
+    assert b.esp_access.users("esp-1") == {7}
+    assert b.devices.get_device("esp-1").latest_data.data == {"rfid": "EMP"}
+    assert b.registration.get("esp-1").employee.wms_login == "jkowalski"
+
+    await a.stop()
+    await b.stop()
+
+
+@pytest.mark.asyncio
+async def test_subscribers_of_crashed_worker_expire():
+    backend = InMemoryStateBackend()
+    a = Worker(backend, heartbeat_seconds=0.02, peer_ttl_seconds=0.1)
+    b = Worker(backend, heartbeat_seconds=0.02, peer_ttl_seconds=0.1)
+    await a.shared_state.start()
+    await b.shared_state.start()
+
+    browser = FakeWebSocket()
+    await b.manager.connect(browser)
+    b.manager.subscribe(browser, "esp-1")
+    await settle()
+    assert a.manager.has_subscribers("esp-1")
+
+    # kill -9: ні worker_down, ні heartbeat
+    b.shared_state._heartbeat.cancel()
+    b.shared_state._publisher.cancel()
+    await asyncio.sleep(0.2)
+
+    assert not a.manager.has_subscribers("esp-1")
+    assert b.shared_state.worker_id not in a.shared_state.peers
+
+    await a.stop()
+
+
+@pytest.mark.asyncio
+async def test_graceful_shutdown_drops_subscribers_immediately():
+    backend = InMemoryStateBackend()
+    a, b = Worker(backend), Worker(backend)
+    await a.shared_state.start()
+    await b.shared_state.start()
+
+    browser = FakeWebSocket()
+    await b.manager.connect(browser)
+    b.manager.subscribe(browser, "esp-1")
+    await settle()
+    assert a.manager.has_subscribers("esp-1")
+
+    await b.stop()
+    await settle()
+    assert not a.manager.has_subscribers("esp-1")
+
+    await a.stop()
+
+
+class FlakyPubSub:
+    """pubsub, у якого перше з'єднання обривається помилкою"""
+
+    attempts = 0
+
+    def __init__(self, queue):
+        self.queue = queue
+
+    async def subscribe(self, *channels):
+        pass
+
+    async def listen(self):
+        FlakyPubSub.attempts += 1
+        if FlakyPubSub.attempts == 1:
+            raise ConnectionError("connection reset")
+        while True:
+            yield await self.queue.get()
+
+    async def aclose(self):
+        pass
+
+
+class FlakyClient:
+    def __init__(self):
+        self.queue = asyncio.Queue()
+
+    def pubsub(self):
+        return FlakyPubSub(self.queue)
+
+    async def publish(self, channel, text):
+        await self.queue.put({"type": "message", "channel": channel, "data": text})
+
+    async def aclose(self):
+        pass
+
+
+@pytest.mark.asyncio
+async def test_redis_listener_is_restarted_after_failure(monkeypatch):
+    monkeypatch.setattr("managers.state_backend.STATE_RECONNECT_MIN_SECONDS", 0.01)
+    FlakyPubSub.attempts = 0
+
+    backend = RedisStateBackend(client=FlakyClient())
+    received = []
+    backend.subscribe("pinokio:state", received.append)
+    reconnected = []
+    backend.on_reconnect = lambda: reconnected.append(True)
+
+    await backend.start()
+    await asyncio.sleep(0.05)
+
+    await backend.publish("pinokio:state", {"origin": "x"})
+    await asyncio.sleep(0.02)
+
+    assert backend.reconnects == 1
+    assert reconnected == [True]
+    assert received == [{"origin": "x"}]
+
+    await backend.close()
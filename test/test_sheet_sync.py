@@ -0,0 +1,388 @@
+import json
+import re
+import threading
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from types import SimpleNamespace
+from urllib.parse import parse_qs, unquote, urlparse
+
+import httplib2
+import pytest
+from googleapiclient.discovery import build
+
+from models.db_device import DeviceType, SiteType
+from services.google_sheets import (
+    column_letter,
+    iter_all_sheets,
+    sheet_row_index,
+    sync_devices_to_sheets,
+)
+from services.sheet_sync import SheetSyncWorker
+
+
+# =========================
+# FAKE OUTBOX SESSION
+# =========================
+
+class FakeResult:
+    def __init__(self, rows):
+        self._rows = rows
+
+    def scalars(self):
+        return SimpleNamespace(all=lambda: self._rows)
+
+
+class FakeSession:
+    """Сесія воркера: журналює відкриття/commit/закриття і віддає рядки по черзі"""
+
+    def __init__(self, log, results):
+        self.log = log
+        self.results = results
+
+    async def __aenter__(self):
+        self.log.append("open")
+        return self
+
+    async def __aexit__(self, *exc):
+        self.log.append("close")
+
+    async def execute(self, stmt):
+        return FakeResult(self.results.pop(0))
+
+    async def commit(self):
+        self.log.append("commit")
+
+
+def make_outbox_entry(id, device_id, attempts=0):
+    return SimpleNamespace(
+        id=id, device_id=device_id, notes=f"zmiana {id}", attempts=attempts,
+        next_attempt_at=datetime.now(timezone.utc), synced_at=None, last_error=None,
+        failed_at=None
+    )
+
+
+# =========================
+# FAKE SHEETS SERVER
+# =========================
+
+HEADER = ["", "S/N", "RFID", "Nazwa", "IP", "STATUS", "SITE", "Notatka"]
+
+
+def column_number(letters):
+    number = 0
+    for char in letters:
+        number = number * 26 + ord(char) - 64
+    return number
+
+
+def slice_range(sheets, range_name):
+    """Мінімальна підтримка A1: 'S', 'S!3:3', 'S!D:D', 'S!A4:H4'"""
+    sheet_name, _, a1 = range_name.partition("!")
+    sheet_name = sheet_name.strip("'").replace("''", "'")
+    values = sheets.get(sheet_name, [])
+    if not a1:
+        return values
+
+    start, end = a1.split(":")
+    start_col, start_row = re.match(r"([A-Z]*)(\d*)", start).groups()
+    end_col, end_row = re.match(r"([A-Z]*)(\d*)", end).groups()
+
+    rows = values[int(start_row) - 1:int(end_row)] if start_row else values
+    if start_col:
+        first, last = column_number(start_col) - 1, column_number(end_col)
+        rows = [row[first:last] for row in rows]
+    return rows
+
+
+class FakeSheetsHandler(BaseHTTPRequestHandler):
+    sheets: dict = {}
+    requests: list = []
+
+    def log_message(self, *args):
+        pass
+
+    def _reply(self, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        path = unquote(url.path)
+
+        if path.endswith("values:batchGet"):
+            ranges = parse_qs(url.query)["ranges"]
+            self.requests.append(("BATCH_GET", ranges))
+            self._reply({"valueRanges": [
+                {"range": r, "values": slice_range(self.sheets, r)} for r in ranges
+            ]})
+            return
+
+        if "/values/" not in path:
+            self.requests.append(("META",))
+            self._reply({"sheets": [
+                {"properties": {"title": name}} for name in self.sheets
+            ]})
+            return
+
+        range_name = path.rsplit("/values/", 1)[1]
+        self.requests.append(("GET", range_name))
+        self._reply({"range": range_name, "values": slice_range(self.sheets, range_name)})
+
+    def do_POST(self):
+        length = int(self.headers["Content-Length"])
+        body = json.loads(self.rfile.read(length))
+        self.requests.append(("POST", urlparse(self.path).path, body))
+        self._reply({"totalUpdatedRows": len(body["data"])})
+
+
+@pytest.fixture
+def fake_sheets(monkeypatch):
+    monkeypatch.setattr("services.google_sheets.SPREADSHEET_ID", "TEST-SHEET")
+    FakeSheetsHandler.sheets = {
+        "SCANER": [
+            ["Inwentaryzacja"],
+            [],
+            HEADER,
+            ["1", "SN-1", "R-1", "S1", "", "", "EMAG", "stara notatka"],
+            ["2", "SN-2", "R-2", "S2", "", "", "EMAG", ""],
+        ],
+        "PRINTER": [
+            ["Inwentaryzacja"],
+            [],
+            HEADER,
+            ["1", "SN-9", "R-9", "P1", "", "", "XD", ""],
+        ],
+        "UWAGI": [["nie czytać"]],
+    }
+    FakeSheetsHandler.requests = []
+    sheet_row_index.invalidate()
+
+    server = HTTPServer(("127.0.0.1", 0), FakeSheetsHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    service = build(
+        "sheets",
+        "v4",
+        http=httplib2.Http(),
+        client_options={"api_endpoint": f"http://127.0.0.1:{server.server_port}"},
+        static_discovery=True,
+    )
+
+    service.factory = lambda: build(
+        "sheets",
+        "v4",
+        http=httplib2.Http(),
+        client_options={"api_endpoint": f"http://127.0.0.1:{server.server_port}"},
+        static_discovery=True,
+    )
+
+    yield service, FakeSheetsHandler.requests
+
+    server.shutdown()
+    sheet_row_index.invalidate()
+
+
+def make_device(id, name, type, site=SiteType.EMAG):
+    return SimpleNamespace(
+        id=id,
+        name=name,
+        type=type,
+        serial_number=f"SN-{id}",
+        rfid=f"R-{id}",
+        ip=None,
+        status=SimpleNamespace(name="OK"),
+        site=site,
+        ports=[],
+    )
+
+
+# =========================
+# TESTS
+# =========================
+
+def test_column_letter():
+    assert column_letter(1) == "A"
+    assert column_letter(26) == "Z"
+    assert column_letter(27) == "AA"
+    assert column_letter(702) == "ZZ"
+
+
+def test_sync_devices_pushes_one_batch_update(fake_sheets):
+    service, requests = fake_sheets
+
+    written = sync_devices_to_sheets(
+        [
+            (make_device(1, "S1", DeviceType.scanner), "nowa notatka"),
+            (make_device(9, "P1", DeviceType.printer, SiteType.XD), "zmiana"),
+            (make_device(5, "BRAK", DeviceType.scanner), "nie ma w arkuszu"),
+        ],
+        sheets_service=service,
+    )
+
+    assert written == {1, 9}
+
+    posts = [r for r in requests if r[0] == "POST"]
+    assert len(posts) == 1
+    assert posts[0][1].endswith("values:batchUpdate")
+
+    data = {item["range"]: item["values"][0] for item in posts[0][2]["data"]}
+    assert set(data) == {"SCANER!A4:H4", "PRINTER!A4:H4"}
+    assert data["SCANER!A4:H4"][3] == "S1"
+    assert data["SCANER!A4:H4"][7] == "stara notatka\nnowa notatka"
+    assert data["PRINTER!A4:H4"][6] == "XD"
+
+
+def test_sync_devices_without_matches_skips_write(fake_sheets):
+    service, requests = fake_sheets
+
+    written = sync_devices_to_sheets(
+        [(make_device(5, "BRAK", DeviceType.scanner), "x")],
+        sheets_service=service,
+    )
+
+    assert written == set()
+    assert not [r for r in requests if r[0] == "POST"]
+
+
+def test_worker_backoff_is_capped():
+    assert SheetSyncWorker._backoff(1).total_seconds() == 5
+    assert SheetSyncWorker._backoff(3).total_seconds() == 20
+    assert SheetSyncWorker._backoff(30).total_seconds() == 900
+
+
+async def run_worker_pass(monkeypatch, sheets_call):
+    log = []
+    entries = [make_outbox_entry(1, 10), make_outbox_entry(2, 10), make_outbox_entry(3, 11, attempts=2)]
+    devices = [SimpleNamespace(id=10), SimpleNamespace(id=11)]
+    results = [entries, devices, entries]
+
+    def fake_sync(devices_with_notes, sheets_service):
+        # до Google Sheets - лише з закритою транзакцією захоплення
+        log.append("sheets")
+        assert all(entry.next_attempt_at > datetime.now(timezone.utc) for entry in entries)
+        return sheets_call(devices_with_notes)
+
+    monkeypatch.setattr("services.sheet_sync.sync_devices_to_sheets", fake_sync)
+
+    worker = SheetSyncWorker(session_factory=lambda: FakeSession(log, results))
+    try:
+        assert await worker.process_pending() == 3
+    finally:
+        worker.shutdown()
+
+    assert log == ["open", "commit", "close", "sheets", "open", "commit", "close"]
+    return entries
+
+
+@pytest.mark.asyncio
+async def test_worker_calls_sheets_outside_claim_transaction(monkeypatch):
+    sent = []
+
+    def sheets_call(devices_with_notes):
+        sent.extend((device.id, notes) for device, notes in devices_with_notes)
+        return {10}
+
+    entries = await run_worker_pass(monkeypatch, sheets_call)
+
+    assert sent == [(10, "zmiana 1\nzmiana 2"), (11, "zmiana 3")]
+    assert all(entry.synced_at is not None for entry in entries)
+    assert entries[0].last_error is None
+    assert entries[2].last_error == "Device row not found in sheet"
+
+
+@pytest.mark.asyncio
+async def test_worker_failure_schedules_retry_with_backoff(monkeypatch):
+    def sheets_call(devices_with_notes):
+        raise RuntimeError("quota exceeded")
+
+    entries = await run_worker_pass(monkeypatch, sheets_call)
+
+    assert [entry.attempts for entry in entries] == [1, 1, 3]
+    assert all(entry.synced_at is None for entry in entries)
+    assert entries[2].last_error == "quota exceeded"
+    delay = entries[2].next_attempt_at - datetime.now(timezone.utc)
+    assert 15 < delay.total_seconds() <= 20
+
+
+@pytest.mark.asyncio
+async def test_worker_gives_up_after_max_attempts(monkeypatch):
+    monkeypatch.setattr("config.SHEET_SYNC_MAX_ATTEMPTS", 3)
+
+    def sheets_call(devices_with_notes):
+        raise RuntimeError("invalid row")
+
+    entries = await run_worker_pass(monkeypatch, sheets_call)
+
+    # третя невдача - запис більше не повторюється
+    assert entries[2].failed_at is not None
+    assert entries[0].failed_at is None and entries[1].failed_at is None
+    assert all(entry.synced_at is None for entry in entries)
+
+
+def test_row_index_is_cached_between_syncs(fake_sheets):
+    service, requests = fake_sheets
+
+    sync_devices_to_sheets(
+        [(make_device(1, "S1", DeviceType.scanner), "a")], sheets_service=service
+    )
+    requests.clear()
+
+    sync_devices_to_sheets(
+        [(make_device(2, "S2", DeviceType.scanner), "b")], sheets_service=service
+    )
+
+    # лише ranged-читання одного рядка і запис - без завантаження аркуша
+    assert [r[0] for r in requests] == ["BATCH_GET", "POST"]
+    assert requests[0][1] == ["SCANER!A5:H5"]
+
+
+def test_row_index_rebuilt_when_row_moved(fake_sheets):
+    service, requests = fake_sheets
+
+    sync_devices_to_sheets(
+        [(make_device(2, "S2", DeviceType.scanner), "a")], sheets_service=service
+    )
+
+    # хтось вставив рядок над пристроями
+    FakeSheetsHandler.sheets["SCANER"].insert(3, ["0", "SN-0", "R-0", "S0"])
+    requests.clear()
+
+    written = sync_devices_to_sheets(
+        [(make_device(2, "S2", DeviceType.scanner), "b")], sheets_service=service
+    )
+
+    assert written == {2}
+    posts = [r for r in requests if r[0] == "POST"]
+    assert [item["range"] for item in posts[0][2]["data"]] == ["SCANER!A6:H6"]
+
+
+def test_iter_all_sheets_reads_whole_sheets_in_order(fake_sheets):
+    service, requests = fake_sheets
+
+    sheets = list(iter_all_sheets(max_workers=2, service_factory=service.factory))
+
+    assert [name for name, _ in sheets] == ["SCANER", "PRINTER"]
+    assert sheets[0][1] == FakeSheetsHandler.sheets["SCANER"]
+
+
+def test_iter_all_sheets_projects_columns(fake_sheets):
+    service, requests = fake_sheets
+
+    sheets = dict(iter_all_sheets(
+        columns=["Nazwa", "S/N", "RFID", "BRAK"],
+        service_factory=service.factory
+    ))
+
+    assert sheets["SCANER"][2] == ["Nazwa", "S/N", "RFID", ""]
+    assert sheets["SCANER"][3] == ["S1", "SN-1", "R-1", ""]
+    assert sheets["PRINTER"][3] == ["P1", "SN-9", "R-9", ""]
+
+    # заголовки - одним batchGet, далі лише сусідні колонки B:D
+    batch_gets = [r[1] for r in requests if r[0] == "BATCH_GET"]
+    assert batch_gets[0] == ["'SCANER'!3:3", "'PRINTER'!3:3"]
+    assert sorted(batch_gets[1:]) == [["'PRINTER'!B:D"], ["'SCANER'!B:D"]]
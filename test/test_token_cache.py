@@ -0,0 +1,42 @@
+import time
+
+from managers.auth_manager import AuthManager, TokenCache
+
+
+def test_token_cache_is_bounded_and_honours_exp():
+    cache = TokenCache(max_entries=2, ttl_seconds=60)
+
+    cache.put("a", {"id": 1})
+    cache.put("b", {"id": 2})
+    assert cache.get("a") == {"id": 1}  # "a" тепер найсвіжіший
+    cache.put("c", {"id": 3})
+
+    assert cache.get("b") is None
+    assert len(cache) == 2
+
+    cache.put("old", {"id": 4}, exp=time.time() - 1)
+    assert cache.get("old") is None
+
+    stats = cache.stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 2
+    assert stats["evicted"] == 2
+    assert stats["expired"] == 1
+
+
+def test_revoke_user_drops_all_user_tokens_by_hash():
+    manager = AuthManager()
+    user = {"id": 7, "username": "jan", "role": "admin"}
+
+    tokens = [
+        manager.create_access_token({"sub": "jan", "n": n}) for n in range(3)
+    ]
+    for token in tokens:
+        manager.add_session(token, user)
+
+    assert manager.get_user_from_token(tokens[0]) == user
+    assert tokens[0] not in manager.sessions._entries
+
+    manager.revoke_user(7)
+    assert all(manager.get_user_from_token(token) is None for token in tokens)
+    assert manager.sessions.stats()["revoked"] == 3